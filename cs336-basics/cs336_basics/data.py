@@ -1,31 +1,167 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import queue
+import threading
+import time
+
 import numpy as np
 import numpy.typing as npt
 import torch
 
 
 def get_batch(
-    dataset: npt.NDArray, batch_size: int, context_length: int, device: str
+    dataset: npt.NDArray,
+    batch_size: int,
+    context_length: int,
+    device: str,
+    out: tuple[torch.Tensor, torch.Tensor] | None = None,
+    generator: torch.Generator | None = None,
 ) -> tuple[torch.Tensor, torch.Tensor]:
-    starting_idxs = torch.randint(len(dataset) - context_length, (batch_size,))
-    x = torch.stack(
-        [
-            torch.from_numpy((dataset[i : i + context_length]).astype(np.int64))
-            for i in starting_idxs
-        ]
-    )
-    y = torch.stack(
-        [
-            torch.from_numpy((dataset[i + 1 : i + 1 + context_length]).astype(np.int64))
-            for i in starting_idxs
-        ]
-    )
-    if "cuda" in device:
-        x = x.pin_memory().to(device, non_blocking=True)
-        y = y.pin_memory().to(device, non_blocking=True)
+    """
+    Sample `batch_size` random windows of `context_length` input tokens and their
+    next-token targets.
+
+    All windows are gathered from `dataset` (e.g. a memmap) with a single fancy index
+    into a (batch_size, context_length + 1) array, so every token is read once, and
+    x and y are copied out of it shifted by one token. Both are contiguous
+    (batch_size, context_length) int64 tensors.
+
+    Args:
+        out (tuple of torch.Tensor, optional): Preallocated contiguous int64 CPU
+            tensors of shape (batch_size, context_length) to write x and y into, e.g.
+            pinned buffers reused across steps. On CPU they are returned as is; with
+            CUDA they are copied to the device asynchronously, so they must not be
+            refilled until that copy has finished.
+        generator (torch.Generator, optional): Random number generator for the window
+            offsets (default: the global one).
+    """
+    starting_idxs = torch.randint(len(dataset) - context_length, (batch_size,), generator=generator)
+    windows = starting_idxs.numpy()[:, None] + np.arange(context_length + 1)
+    tokens = dataset[windows]
+    if out is None:
+        x = torch.from_numpy(np.ascontiguousarray(tokens[:, :-1], dtype=np.int64))
+        y = torch.from_numpy(np.ascontiguousarray(tokens[:, 1:], dtype=np.int64))
     else:
-        x = x.to(device)
-        y = y.to(device)
-    return x, y
+        x, y = out
+        np.copyto(x.numpy(), tokens[:, :-1])
+        np.copyto(y.numpy(), tokens[:, 1:])
+    if "cuda" in device:
+        if not x.is_pinned():
+            x, y = x.pin_memory(), y.pin_memory()
+        return x.to(device, non_blocking=True), y.to(device, non_blocking=True)
+    return x.to(device), y.to(device)
+
+
+class BatchPrefetcher:
+    """
+    Iterator over random batches (as returned by `get_batch`) that are prepared in a
+    background thread, so the training loop does not wait for memmap reads.
+
+    The thread gathers batches into a ring of `num_buffers` preallocated CPU buffers
+    (pinned with CUDA) and hands them over through a queue, keeping up to
+    `num_buffers` batches ready. With CUDA, each batch is copied to the device
+    asynchronously when it is taken, and its buffers are refilled only once that copy
+    has finished. On CPU, the returned tensors are the buffers themselves and stay
+    valid until the next batch is taken.
+
+    Usage:
+        with BatchPrefetcher(train_data, batch_size, context_length, device) as batches:
+            x, y = next(batches)
+
+    Args:
+        dataset (npt.NDArray): Token IDs (e.g. a memmap).
+        batch_size, context_length, device: See `get_batch`.
+        num_buffers (int): Number of batches prepared ahead.
+        seed (int, optional): Seed for the window offsets (default: drawn from the
+            global torch RNG, so `torch.manual_seed` still makes runs reproducible).
+
+    Attributes:
+        wait_seconds (float): Total time spent waiting for batches that were not ready.
+    """
+
+    def __init__(
+        self,
+        dataset: npt.NDArray,
+        batch_size: int,
+        context_length: int,
+        device: str,
+        num_buffers: int = 4,
+        seed: int | None = None,
+    ):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.context_length = context_length
+        self.device = device
+        self.wait_seconds = 0.0
+        self._cuda = "cuda" in device
+        self._generator = torch.Generator()
+        self._generator.manual_seed(int(torch.randint(2**62, ())) if seed is None else seed)
+        self._buffers = [
+            tuple(
+                torch.empty((batch_size, context_length), dtype=torch.int64, pin_memory=self._cuda)
+                for _ in range(2)
+            )
+            for _ in range(num_buffers)
+        ]
+        # Buffers that may be refilled, with the CUDA event marking the end of their
+        # last copy to the device, and buffers holding a batch that was not taken yet.
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for i in range(num_buffers):
+            self._free.put((i, None))
+        self._current = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self) -> None:
+        try:
+            while True:
+                item = self._free.get()
+                if item is None or self._closed:
+                    return
+                i, copied = item
+                if copied is not None:
+                    copied.synchronize()
+                get_batch(
+                    self.dataset, self.batch_size, self.context_length, "cpu",
+                    out=self._buffers[i], generator=self._generator,
+                )
+                self._ready.put(i)
+        except BaseException as e:
+            self._ready.put(e)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[torch.Tensor, torch.Tensor]:
+        if self._current is not None:
+            self._free.put((self._current, None))
+            self._current = None
+        start = time.perf_counter()
+        i = self._ready.get()
+        self.wait_seconds += time.perf_counter() - start
+        if isinstance(i, BaseException):
+            self._ready.put(i)
+            raise RuntimeError("Background batch preparation failed") from i
+        x, y = self._buffers[i]
+        if self._cuda:
+            x, y = x.to(self.device, non_blocking=True), y.to(self.device, non_blocking=True)
+            copied = torch.cuda.Event()
+            copied.record()
+            self._free.put((i, copied))
+        else:
+            self._current = i
+        return x, y
+
+    def close(self) -> None:
+        self._closed = True
+        self._free.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -29,7 +29,7 @@ import numpy.typing as npt
 import torch
 import torch.nn.functional as F
 import wandb
-from cs336_basics.data import get_batch
+from cs336_basics.data import BatchPrefetcher, get_batch
 from cs336_basics.model import TransformerLM
 from cs336_basics.optimizer import get_cosine_lr
 from torch.distributed import destroy_process_group, init_process_group
@@ -166,81 +166,75 @@ def train(
         eps=adam_eps,
     )
 
-    # Get the first batch
-    batch_x, batch_y = get_batch(
-        train_data, batch_size=batch_size, context_length=context_length, device=device
-    )
-    for i in tqdm(range(train_steps)):
-        if lr_scheduler.lower() == "cosine":
-            lr = get_cosine_lr(
-                i,
-                max_learning_rate=learning_rate,
-                min_learning_rate=learning_rate * 0.1,
-                warmup_iters=int(train_steps * warmup_ratio),
-                cosine_cycle_iters=train_steps,
-            )
-            for param_group in optimizer.param_groups:
-                param_group["lr"] = lr
-        else:
-            lr = learning_rate
-
-        for micro_step_idx in range(gradient_accumulation_steps):
-            batch_x, batch_y = get_batch(
-                train_data,
-                batch_size=batch_size,
-                context_length=context_length,
-                device=device,
-            )
-            if is_ddp:
-                # When using DDP, don't all-reduce gradients until the last step.
-                model.require_backward_grad_sync = (
-                    micro_step_idx == gradient_accumulation_steps - 1
+    # Batches are prepared in a background thread while the model trains on the
+    # previous ones. The with block stops the thread and frees its pinned buffers
+    # even if a step raises.
+    with BatchPrefetcher(
+        train_data,
+        batch_size=batch_size,
+        context_length=context_length,
+        device=device,
+        seed=seed,
+    ) as train_batches:
+        for i in tqdm(range(train_steps)):
+            if lr_scheduler.lower() == "cosine":
+                lr = get_cosine_lr(
+                    i,
+                    max_learning_rate=learning_rate,
+                    min_learning_rate=learning_rate * 0.1,
+                    warmup_iters=int(train_steps * warmup_ratio),
+                    cosine_cycle_iters=train_steps,
                 )
-            with amp_ctx:
-                logits = model(batch_x)
-                # immediately async prefetch next batch while model is doing the forward pass on the GPU
-                next_batch_x, next_batch_y = get_batch(
-                    train_data,
-                    batch_size=batch_size,
+                for param_group in optimizer.param_groups:
+                    param_group["lr"] = lr
+            else:
+                lr = learning_rate
+
+            data_wait_start = train_batches.wait_seconds
+            for micro_step_idx in range(gradient_accumulation_steps):
+                batch_x, batch_y = next(train_batches)
+                if is_ddp:
+                    # When using DDP, don't all-reduce gradients until the last step.
+                    model.require_backward_grad_sync = (
+                        micro_step_idx == gradient_accumulation_steps - 1
+                    )
+                with amp_ctx:
+                    logits = model(batch_x)
+                    # Calculate the loss with the logits
+                    loss = (
+                        F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.view(-1))
+                        / gradient_accumulation_steps
+                    )
+                scaler.scale(loss).backward()
+            # Time the training loop spent waiting for batches that were not ready yet.
+            data_wait = train_batches.wait_seconds - data_wait_start
+
+            if grad_clip:
+                scaler.unscale_(optimizer)
+                torch.nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
+
+            scaler.step(optimizer)
+            scaler.update()
+            optimizer.zero_grad(set_to_none=True)
+
+            loss_float = loss.item() * gradient_accumulation_steps
+            if is_master_process:
+                logger.info(f"Train step {i}, Loss: {loss_float}, Data wait: {data_wait:.4f}s")
+                if wandb_project:
+                    wandb.log({"train_loss": loss_float, "lr": lr, "data_wait_seconds": data_wait}, step=i)
+
+            if i != 0 and i % eval_interval == 0 and is_master_process:
+                dev_loss = estimate_dev_loss(
+                    model=model,
+                    dev_dataset=dev_data,
                     context_length=context_length,
+                    batch_size=batch_size,
+                    eval_iters=eval_iters,
                     device=device,
                 )
-                # Calculate the loss with the logits
-                loss = (
-                    F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.view(-1))
-                    / gradient_accumulation_steps
-                )
-            scaler.scale(loss).backward()
-
-            batch_x = next_batch_x
-            batch_y = next_batch_y
-
-        if grad_clip:
-            scaler.unscale_(optimizer)
-            torch.nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
-
-        scaler.step(optimizer)
-        scaler.update()
-        optimizer.zero_grad(set_to_none=True)
-
-        loss_float = loss.item() * gradient_accumulation_steps
-        if is_master_process:
-            logger.info(f"Train step {i}, Loss: {loss_float}")
-            if wandb_project:
-                wandb.log({"train_loss": loss_float, "lr": lr}, step=i)
-
-        if i != 0 and i % eval_interval == 0 and is_master_process:
-            dev_loss = estimate_dev_loss(
-                model=model,
-                dev_dataset=dev_data,
-                context_length=context_length,
-                batch_size=batch_size,
-                eval_iters=eval_iters,
-                device=device,
-            )
-            logger.info(f"Estimated validation loss: {dev_loss}")
-            if wandb_project:
-                wandb.log({"eval_loss": dev_loss}, step=i)
+                logger.info(f"Estimated validation loss: {dev_loss}")
+                if wandb_project:
+                    wandb.log({"eval_loss": dev_loss}, step=i)
 
     # Calculate final estimated dev loss
     if is_master_process:
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from cs336_basics.data import BatchPrefetcher, get_batch
+
+
+def _check_batch(dataset, x, y, batch_size, context_length):
+    assert x.shape == y.shape == (batch_size, context_length)
+    assert x.dtype == y.dtype == torch.int64
+    assert x.is_contiguous() and y.is_contiguous()
+    # Every row is a window of consecutive tokens, and y is x shifted by one.
+    for row_x, row_y in zip(x.tolist(), y.tolist()):
+        start = row_x[0]
+        assert row_x == dataset[start : start + context_length].tolist()
+        assert row_y == dataset[start + 1 : start + context_length + 1].tolist()
+
+
+def test_get_batch_out_and_generator():
+    dataset = np.arange(100, dtype=np.uint16)
+    x, y = get_batch(dataset, 4, 8, "cpu", generator=torch.Generator().manual_seed(0))
+    _check_batch(dataset, x, y, 4, 8)
+    x.view(-1), y.view(-1)
+
+    out = (torch.empty((4, 8), dtype=torch.int64), torch.empty((4, 8), dtype=torch.int64))
+    out_x, out_y = get_batch(dataset, 4, 8, "cpu", out=out, generator=torch.Generator().manual_seed(0))
+    assert out_x is out[0] and out_y is out[1]
+    assert torch.equal(out_x, x) and torch.equal(out_y, y)
+
+
+def test_batch_prefetcher_cpu_smoke():
+    dataset = np.arange(1000, dtype=np.uint16)
+    with BatchPrefetcher(dataset, 4, 16, "cpu", num_buffers=2, seed=0) as batches:
+        first = [tuple(t.clone() for t in next(batches)) for _ in range(5)]
+    for x, y in first:
+        _check_batch(dataset, x, y, 4, 16)
+
+    # The same seed gives the same batches.
+    with BatchPrefetcher(dataset, 4, 16, "cpu", num_buffers=3, seed=0) as batches:
+        for x, y in first:
+            next_x, next_y = next(batches)
+            assert torch.equal(next_x, x) and torch.equal(next_y, y)
@@ -1 +1,26 @@
 #!/usr/bin/env python3
+"""
+Filtering, deduplication and tokenization of Common Crawl data.
+
+Submodules are imported on first access (`import cs336_data; cs336_data.pipeline`),
+and heavy dependencies such as fastText, resiliparse and warcio only when they are
+first used (see cs336_data.lazy), so importing the package is cheap.
+"""
+import importlib
+
+_SUBMODULES = (
+    "annotations", "benchmark", "bloom", "checkpoint", "corpus", "create_quality_datasets",
+    "decontaminate", "deduplication", "extract_text", "identify_text", "lazy", "line_store",
+    "metrics", "pipeline", "quality_classifier", "readers", "simhash", "subsample_urls",
+    "substring_dedup", "threshold_sweep", "tokenization", "workers",
+)
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted([*globals(), *_SUBMODULES])
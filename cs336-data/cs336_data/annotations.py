@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Per-document annotation sidecars, so filter thresholds can be changed without
+re-running extraction and the classifiers.
+
+`annotate` runs extraction and every available model over each WARC once and saves
+one row per response record to a columnar sidecar (`.npz`). `filter` then applies
+any thresholds to those columns with numpy and re-extracts only the kept records,
+reading them directly at their byte offsets in the WARC.
+
+Example:
+
+```
+python -m cs336_data.annotations annotate data/*.warc.gz --output-dir data/annotations --num-workers 8
+python -m cs336_data.annotations filter data/annotations/*.npz --stages langid gopher nsfw toxicity pii \
+    --nsfw-threshold 0.9 --output data/filtered.jsonl.gz
+```
+
+Without `--output`, `filter` only prints how many documents each stage drops,
+which takes seconds even for many WARC files.
+
+Sidecar columns (aligned, one entry per response record):
+
+- `offset`, `length`: position of the record in the (possibly gzipped) WARC file.
+- `extracted`: whether extraction produced non-empty text.
+- `num_bytes`: UTF-8 size of the extracted text.
+- `language`, `language_score`: language ID label and confidence.
+- `nsfw_score`, `toxicity_score`, `quality_score`: probability that the document
+  is NSFW, toxic, or of "wiki" quality.
+- `num_words`, `mean_word_length`, `ellipsis_line_fraction`, `alpha_word_fraction`:
+  Gopher statistics (see `quality_classifier.gopher_stats`).
+
+The sidecar also records the sampling policy the language ID, NSFW and toxicity
+classifiers read documents with (`--sampling`, as in `pipeline.run_pipeline`).
+Filtering with `--sampling` checks that it matches, so the scores are those
+`run_pipeline` would compute with the same flags.
+
+Scores of models whose files were missing when annotating are NaN, and the stages
+that need them cannot be applied. Stages are applied in the given order and each
+document is counted as dropped by the first stage that rejects it, exactly as in
+`pipeline.filter_warc`.
+"""
+import argparse
+import io
+import json
+import os
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data import extract_text, identify_text, metrics, quality_classifier
+from cs336_data.checkpoint import atomic_write
+from cs336_data.corpus import JsonlCorpusWriter
+from cs336_data.lazy import lazy_import
+from cs336_data.workers import FilterPool
+
+archiveiterator = lazy_import("warcio.archiveiterator")
+
+# Stages that can be applied to annotations; "pii" transforms the kept documents.
+STAGES = ("langid", "gopher", "nsfw", "toxicity", "quality", "pii")
+# Gopher thresholds that `select` accepts in its config, and their defaults.
+GOPHER_THRESHOLDS = {
+    "min_words": quality_classifier.GOPHER_MIN_WORDS,
+    "max_words": quality_classifier.GOPHER_MAX_WORDS,
+    "min_mean_word_length": quality_classifier.GOPHER_MIN_MEAN_WORD_LENGTH,
+    "max_mean_word_length": quality_classifier.GOPHER_MAX_MEAN_WORD_LENGTH,
+    "max_ellipsis_line_fraction": quality_classifier.GOPHER_MAX_ELLIPSIS_LINE_FRACTION,
+    "min_alpha_word_fraction": quality_classifier.GOPHER_MIN_ALPHA_WORD_FRACTION,
+}
+_SCORE_COLUMNS = {"nsfw": "nsfw_score", "toxicity": "toxicity_score", "quality": "quality_score"}
+
+
+def _probability(prediction: tuple, label: str) -> float:
+    # The classifiers are binary, so the probability of `label` follows from the top label.
+    top, score = prediction
+    return score if top == label else 1.0 - score
+
+
+def _available_models() -> dict:
+    return {
+        "langid": os.path.exists(identify_text.LANGUAGE_MODEL_PATH),
+        "nsfw": os.path.exists(identify_text.NSFW_MODEL_PATH),
+        "toxicity": os.path.exists(identify_text.HATESPEECH_MODEL_PATH),
+        "quality": quality_classifier.resolve_model_path(quality_classifier.QUALITY_MODEL_PATH).exists(),
+    }
+
+
+def annotate_text(text: str, models: dict | None = None, sampling: identify_text.SamplingPolicy | None = None) -> dict:
+    """
+    Compute the annotations of one extracted document.
+
+    Args:
+        text (str): Extracted document text.
+        models (dict, optional): Which models to run, as returned by `_available_models`
+            (default: every model whose file exists).
+        sampling (SamplingPolicy, optional): Which parts of the document the language
+            ID, NSFW and toxicity classifiers read (default: the process's policy).
+
+    Returns:
+        A dict with the model columns (NaN for models that were not run) and the
+        Gopher statistics.
+    """
+    models = _available_models() if models is None else models
+    row = {"language": "", "language_score": np.nan}
+    if models["langid"]:
+        row["language"], row["language_score"] = identify_text.identify_language(text, sampling)
+    row["nsfw_score"] = _probability(identify_text.identify_nsfw(text, sampling), "nsfw") if models["nsfw"] else np.nan
+    row["toxicity_score"] = _probability(identify_text.identify_hatespeech(text, sampling), "toxic") if models["toxicity"] else np.nan
+    row["quality_score"] = _probability(quality_classifier.load_and_predict(text), "wiki") if models["quality"] else np.nan
+    row.update(quality_classifier.gopher_stats(text))
+    return row
+
+
+def _empty_row() -> dict:
+    return {
+        "language": "", "language_score": np.nan, "nsfw_score": np.nan, "toxicity_score": np.nan,
+        "quality_score": np.nan, "num_words": 0, "mean_word_length": 0.0, "ellipsis_line_fraction": 0.0,
+        "alpha_word_fraction": 0.0,
+    }
+
+
+def annotate_warc(task: tuple) -> int:
+    """
+    Annotate every response record of one WARC and save the columns to a sidecar.
+
+    Args:
+        task (tuple): (warc_path, output_path) or (warc_path, output_path, sampling),
+            with the SamplingPolicy of the classifiers (default: the process's policy).
+
+    Returns:
+        The number of annotated records.
+    """
+    warc_path, output_path = task[:2]
+    sampling = task[2] if len(task) > 2 and task[2] is not None else identify_text.get_sampling()
+    models = _available_models()
+    offsets, lengths, extracted, num_bytes, rows = [], [], [], [], []
+    # The file is read without `open_input`, so that the offsets are positions in the
+    # file itself; warcio decompresses each gzipped record on its own.
+    with metrics.timer("annotate_warc"), open(warc_path, "rb") as stream:
+        iterator = archiveiterator.ArchiveIterator(stream)
+        for record in iterator:
+            if record.rec_type != "response":
+                continue
+            text = extract_text.extract_text(record.content_stream().read())
+            iterator.read_to_end()
+            offsets.append(iterator.get_record_offset())
+            lengths.append(iterator.get_record_length())
+            extracted.append(bool(text and text.strip()))
+            num_bytes.append(len(text.encode("utf-8")) if extracted[-1] else 0)
+            rows.append(annotate_text(text, models, sampling) if extracted[-1] else _empty_row())
+    columns = {
+        "warc_path": np.array(str(warc_path)),
+        "sampling": np.array(json.dumps(sampling.to_dict())),
+        "offset": np.array(offsets, dtype=np.int64),
+        "length": np.array(lengths, dtype=np.int64),
+        "extracted": np.array(extracted, dtype=bool),
+        "num_bytes": np.array(num_bytes, dtype=np.int64),
+        "language": np.array([row["language"] for row in rows], dtype=str),
+    }
+    for name in ("language_score", "nsfw_score", "toxicity_score", "quality_score"):
+        columns[name] = np.array([row[name] for row in rows], dtype=np.float32)
+    columns["num_words"] = np.array([row["num_words"] for row in rows], dtype=np.int64)
+    for name in ("mean_word_length", "ellipsis_line_fraction", "alpha_word_fraction"):
+        columns[name] = np.array([row[name] for row in rows], dtype=np.float64)
+    with atomic_write(output_path, "wb") as f:
+        np.savez_compressed(f, **columns)
+    metrics.increment("annotated_records", len(rows))
+    return len(rows)
+
+
+def annotate_warcs(
+    warc_paths, output_dir: str | Path, num_workers: int | None = None, sampling: identify_text.SamplingPolicy | None = None,
+) -> list[Path]:
+    """
+    Annotate WARC files in a pool of worker processes, one sidecar per WARC.
+
+    Sidecars that already exist are kept if they were written with the same sampling
+    policy, so an interrupted run can be restarted.
+
+    Args:
+        sampling (SamplingPolicy, optional): See `annotate_text` (default: the
+            process's policy).
+
+    Returns:
+        The sidecar paths, in the order of `warc_paths`.
+    """
+    output_dir = Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    sampling = sampling or identify_text.get_sampling()
+    tasks = [(str(path), output_dir / f"{i:05d}.npz", sampling) for i, path in enumerate(warc_paths)]
+    pending = [task for task in tasks if not task[1].exists() or _sidecar_sampling(task[1]) != sampling.to_dict()]
+    if pending:
+        with FilterPool(num_workers, missing_ok=True) as pool:
+            for (warc_path, _, _), num_records in zip(pending, pool.imap(annotate_warc, pending, chunksize=1)):
+                print(f"Annotated {num_records} records of {warc_path}")
+    return [task[1] for task in tasks]
+
+
+def _sidecar_sampling(path: Path) -> dict | None:
+    with np.load(path) as data:
+        return json.loads(str(data["sampling"])) if "sampling" in data.files else None
+
+
+def load_annotations(path: str | Path) -> dict:
+    """
+    Load the columns of a sidecar into memory; `sampling` is the sampling policy as
+    a dict (None for sidecars written before it was recorded).
+    """
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files}
+    columns["warc_path"] = str(columns["warc_path"])
+    columns["sampling"] = json.loads(str(columns["sampling"])) if "sampling" in columns else None
+    return columns
+
+
+def select(annotations: dict, stages, config: dict) -> tuple[np.ndarray, Counter]:
+    """
+    Apply filter thresholds to the annotations of one WARC.
+
+    Args:
+        annotations (dict): Columns returned by `load_annotations`.
+        stages (list of str): Stages to apply, in order (see STAGES).
+        config (dict): `language`, `language_threshold`, `nsfw_threshold`,
+            `toxicity_threshold` and `quality_threshold` (with the meanings of
+            `pipeline.run_pipeline`), and optionally any of GOPHER_THRESHOLDS and
+            `sampling` (SamplingPolicy arguments, as in the pipeline's config), which
+            must match the policy the annotations were computed with.
+
+    Returns:
+        A boolean mask of the kept records and a Counter with the number of records,
+        extracted documents, kept documents and documents dropped by each stage.
+    """
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown annotation stages: {unknown}")
+    if config.get("sampling") is not None and any(name in stages for name in ("langid", "nsfw", "toxicity")):
+        sampling = identify_text.SamplingPolicy(**config["sampling"]).to_dict()
+        if annotations["sampling"] != sampling:
+            raise ValueError(
+                f"{annotations['warc_path']} was annotated with sampling policy {annotations['sampling']}, "
+                f"not {sampling}; annotate it again with that policy."
+            )
+    extracted = annotations["extracted"]
+    for name in stages:
+        column = "language_score" if name == "langid" else _SCORE_COLUMNS.get(name)
+        if column is not None and np.isnan(annotations[column][extracted]).any():
+            raise ValueError(f"{annotations['warc_path']} was annotated without the {name} model.")
+
+    def score(column):
+        # Compared in double precision like the classifiers' outputs in pipeline.py;
+        # numpy would otherwise round the thresholds to float32.
+        return annotations[column].astype(np.float64)
+
+    with np.errstate(invalid="ignore"):
+        passes = {"pii": np.ones(len(extracted), dtype=bool)}
+        if "langid" in stages:
+            passes["langid"] = (annotations["language"] == config["language"]) & (score("language_score") >= config["language_threshold"])
+        if "gopher" in stages:
+            gopher = {**GOPHER_THRESHOLDS, **{key: config[key] for key in GOPHER_THRESHOLDS if key in config}}
+            num_words, mean_word_length = annotations["num_words"], annotations["mean_word_length"]
+            passes["gopher"] = (
+                (num_words >= gopher["min_words"]) & (num_words <= gopher["max_words"])
+                & (mean_word_length >= gopher["min_mean_word_length"]) & (mean_word_length <= gopher["max_mean_word_length"])
+                & (annotations["ellipsis_line_fraction"] <= gopher["max_ellipsis_line_fraction"])
+                & (annotations["alpha_word_fraction"] >= gopher["min_alpha_word_fraction"])
+            )
+        # A document is labeled NSFW, toxic or "wiki" when its probability exceeds one half.
+        if "nsfw" in stages:
+            nsfw = score("nsfw_score")
+            passes["nsfw"] = ~((nsfw > 0.5) & (nsfw > config["nsfw_threshold"]))
+        if "toxicity" in stages:
+            toxicity = score("toxicity_score")
+            passes["toxicity"] = ~((toxicity > 0.5) & (toxicity > config["toxicity_threshold"]))
+        if "quality" in stages:
+            quality = score("quality_score")
+            passes["quality"] = (quality > 0.5) & (quality >= config["quality_threshold"])
+
+    stats = Counter(records=len(extracted), dropped_extract=int((~extracted).sum()), extracted=int(extracted.sum()))
+    keep = extracted.copy()
+    for name in stages:
+        dropped = keep & ~passes[name]
+        stats[f"dropped_{name}"] += int(dropped.sum())
+        keep &= passes[name]
+    stats["kept"] = int(keep.sum())
+    return keep, stats
+
+
+def read_records(warc_path: str | Path, offsets: np.ndarray, lengths: np.ndarray):
+    """
+    Yield the (url, html bytes) of the WARC records at the given offsets.
+    """
+    with open(warc_path, "rb") as f:
+        for offset, length in zip(offsets.tolist(), lengths.tolist()):
+            f.seek(offset)
+            record = next(iter(archiveiterator.ArchiveIterator(io.BytesIO(f.read(length)))))
+            yield record.rec_headers.get_header("WARC-Target-URI"), record.content_stream().read()
+
+
+def filter_annotated(
+    annotation_paths,
+    output_path: str | Path | None = None,
+    stages=("langid", "gopher", "nsfw", "toxicity", "pii"),
+    language: str = "en",
+    language_threshold: float = 0.5,
+    nsfw_threshold: float = 0.7,
+    toxicity_threshold: float = 0.7,
+    quality_threshold: float = 0.5,
+    sampling: str | None = None,
+    sampling_chars: int = 1000,
+    **gopher_thresholds,
+) -> Counter:
+    """
+    Filter annotated WARC files with new thresholds.
+
+    Args:
+        annotation_paths (list): Sidecars written by `annotate_warcs`.
+        output_path (str or Path, optional): If given, re-extract the kept documents
+            (PII-masked if "pii" is a stage) and write them with their URLs as JSON
+            lines, like the intermediate files of `pipeline.run_pipeline`.
+        stages, language, ...: See `select`.
+        sampling (str, optional): If given, the sampling policy (with `sampling_chars`)
+            the annotations must have been computed with, as in `pipeline.run_pipeline`.
+        **gopher_thresholds: Overrides for GOPHER_THRESHOLDS.
+
+    Returns:
+        A Counter with the same per-stage counts as `pipeline.filter_warc`.
+    """
+    config = {
+        "language": language,
+        "language_threshold": language_threshold,
+        "nsfw_threshold": nsfw_threshold,
+        "toxicity_threshold": toxicity_threshold,
+        "quality_threshold": quality_threshold,
+        "sampling": {"policy": sampling, "max_chars": sampling_chars} if sampling is not None else None,
+        **gopher_thresholds,
+    }
+    stats = Counter()
+    with JsonlCorpusWriter(output_path) if output_path is not None else nullcontext() as writer:
+        for path in annotation_paths:
+            annotations = load_annotations(path)
+            with metrics.timer("annotations_select"):
+                keep, warc_stats = select(annotations, stages, config)
+            stats.update(warc_stats)
+            if writer is None:
+                continue
+            records = read_records(annotations["warc_path"], annotations["offset"][keep], annotations["length"][keep])
+            for url, html in records:
+                text = extract_text.extract_text(html)
+                if "pii" in stages:
+                    text, _ = identify_text.mask_email(text)
+                    text, _ = identify_text.mask_phone_num(text)
+                    text, _ = identify_text.mask_ip(text)
+                writer.add(text, url=url)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    annotate = subparsers.add_parser("annotate", help="Annotate WARC files, one sidecar per file.")
+    annotate.add_argument("warc_paths", nargs="+")
+    annotate.add_argument("--output-dir", required=True)
+    annotate.add_argument("--num-workers", type=int, default=os.cpu_count())
+    annotate.add_argument("--sampling", default="full", choices=identify_text.SAMPLING_POLICIES)
+    annotate.add_argument("--sampling-chars", type=int, default=1000)
+    filter_ = subparsers.add_parser("filter", help="Apply thresholds to annotated WARC files.")
+    filter_.add_argument("annotation_paths", nargs="+")
+    filter_.add_argument("--output", help="Write the kept documents to this .jsonl(.gz) file.")
+    filter_.add_argument("--stages", nargs="+", default=["langid", "gopher", "nsfw", "toxicity", "pii"], choices=STAGES)
+    filter_.add_argument("--language", default="en")
+    filter_.add_argument("--language-threshold", type=float, default=0.5)
+    filter_.add_argument("--nsfw-threshold", type=float, default=0.7)
+    filter_.add_argument("--toxicity-threshold", type=float, default=0.7)
+    filter_.add_argument("--quality-threshold", type=float, default=0.5)
+    filter_.add_argument("--sampling", choices=identify_text.SAMPLING_POLICIES, help="Check the sidecars were annotated with this policy.")
+    filter_.add_argument("--sampling-chars", type=int, default=1000)
+    for name, default in GOPHER_THRESHOLDS.items():
+        filter_.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    if args.command == "annotate":
+        sampling = identify_text.SamplingPolicy(args.sampling, max_chars=args.sampling_chars)
+        annotate_warcs(args.warc_paths, args.output_dir, args.num_workers, sampling)
+    else:
+        kwargs = vars(args)
+        del kwargs["command"]
+        print(json.dumps(filter_annotated(kwargs.pop("annotation_paths"), kwargs.pop("output"), **kwargs)))
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmarks for the cs336_data stages on synthetic corpora.
+
+Example:
+
+```
+python -m cs336_data.benchmark --num-docs 2000 --workers 1 2 4 --output bench.json
+python -m cs336_data.benchmark --num-docs 2000 --workers 1 2 4 --compare bench.json
+python -m cs336_data.benchmark --stages minhash_dedup simhash_dedup --near-duplicates
+python -m cs336_data.benchmark --stages langid --sampling
+python -m cs336_data.benchmark --stages gopher --import-time
+```
+
+Stages that need a model that has not been downloaded are skipped.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cs336_data import corpus, decontaminate, deduplication, extract_text, identify_text, quality_classifier, simhash, substring_dedup
+from cs336_data.workers import FilterPool
+
+BOILERPLATE_LINES = [
+    "Copyright 2024 Example Media Group. All rights reserved.",
+    "Subscribe to our newsletter for the latest updates.",
+    "Share this article on social media.",
+    "Click here to read our privacy policy and terms of service.",
+]
+
+
+def _make_vocabulary(rng: random.Random, size: int) -> list[str]:
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))))
+    return sorted(vocabulary)
+
+
+def generate_documents(
+    num_docs: int,
+    words_per_doc: int = 500,
+    duplicate_rate: float = 0.1,
+    near_duplicate_rate: float = 0.1,
+    boilerplate_rate: float = 0.5,
+    seed: int = 0,
+) -> list[str]:
+    """
+    Generate a synthetic corpus with a controlled amount of duplication.
+
+    Words are drawn from a Zipf-like distribution over a random vocabulary and grouped
+    into sentences and lines. Some documents contain email addresses, phone numbers
+    and IP addresses so PII masking has work to do.
+
+    Args:
+        num_docs (int): Number of documents to generate.
+        words_per_doc (int): Approximate number of words per document.
+        duplicate_rate (float): Fraction of documents that are exact copies of an earlier one.
+        near_duplicate_rate (float): Fraction of documents that are copies of an earlier one
+            with about 5% of the words replaced.
+        boilerplate_rate (float): Probability that each boilerplate line is appended to a document.
+        seed (int): Random seed.
+
+    Returns:
+        A list of document texts.
+    """
+    rng = random.Random(seed)
+    vocabulary = _make_vocabulary(rng, 5000)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    documents = []
+    for _ in range(num_docs):
+        r = rng.random()
+        if documents and r < duplicate_rate:
+            documents.append(rng.choice(documents))
+            continue
+        if documents and r < duplicate_rate + near_duplicate_rate:
+            words = rng.choice(documents).split(" ")
+            for _ in range(max(1, len(words) // 20)):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            documents.append(" ".join(words))
+            continue
+
+        words = rng.choices(vocabulary, weights=weights, k=words_per_doc)
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = f"{rng.choice(vocabulary)}@{rng.choice(vocabulary)}.com"
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = ".".join(str(rng.randint(0, 255)) for _ in range(4))
+        lines = []
+        for start in range(0, len(words), 12):
+            line = " ".join(words[start:start + 12])
+            lines.append(line[0].upper() + line[1:] + ".")
+        lines.extend(line for line in BOILERPLATE_LINES if rng.random() < boilerplate_rate)
+        documents.append("\n".join(lines))
+    return documents
+
+
+def to_html(text: str) -> bytes:
+    """
+    Wrap a document in an HTML page with navigation and footer boilerplate.
+    """
+    paragraphs = "\n".join(f"<p>{line}</p>" for line in text.split("\n"))
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Synthetic page</title>"
+        "<script>var tracking = {id: 42};</script></head><body>"
+        "<nav><ul><li><a href=\"/\">Home</a></li><li><a href=\"/about\">About</a></li></ul></nav>"
+        f"<main><article>{paragraphs}</article></main>"
+        "<footer>Contact us | Privacy | Terms</footer></body></html>"
+    ).encode("utf-8")
+
+
+def mask_pii(text: str) -> str:
+    text, _ = identify_text.mask_email(text)
+    text, _ = identify_text.mask_phone_num(text)
+    text, _ = identify_text.mask_ip(text)
+    return text
+
+
+# Per-document stages: name -> (input kind, function, model path or None).
+DOCUMENT_STAGES = {
+    "extract": ("html", extract_text.extract_text, None),
+    "langid": ("text", identify_text.identify_language, identify_text.LANGUAGE_MODEL_PATH),
+    "nsfw": ("text", identify_text.identify_nsfw, identify_text.NSFW_MODEL_PATH),
+    "toxicity": ("text", identify_text.identify_hatespeech, identify_text.HATESPEECH_MODEL_PATH),
+    "quality": ("text", quality_classifier.load_and_predict, quality_classifier.QUALITY_MODEL_PATH),
+    "gopher": ("text", quality_classifier.gopher_quality_filters, None),
+    "pii": ("text", mask_pii, None),
+}
+
+
+def _write_documents(documents: list[str], directory: str) -> list[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, document in enumerate(documents):
+        path = os.path.join(directory, f"doc{i:08d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(document)
+        paths.append(path)
+    return paths
+
+
+def _run_exact_dedup(paths: list[str], output_dir: str) -> None:
+    deduplication.exact_deduplication(paths, output_dir)
+
+
+def _run_exact_dedup_serial_io(paths: list[str], output_dir: str) -> None:
+    # Baseline for the prefetching file I/O: one file read or written at a time.
+    deduplication.exact_deduplication(paths, output_dir, io_concurrency=1)
+
+
+def _run_exact_dedup_approximate(paths: list[str], output_dir: str) -> None:
+    deduplication.exact_deduplication(paths, output_dir, memory_budget=1 << 20)
+
+
+def _run_minhash_dedup(paths: list[str], output_dir: str) -> None:
+    deduplication.run_minhash_deduplication(paths, 100, 10, 5, output_dir)
+
+
+def _run_simhash_dedup(paths: list[str], output_dir: str) -> None:
+    simhash.run_simhash_deduplication(paths, output_dir)
+
+
+def _run_substring_dedup(paths: list[str], output_dir: str) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    substring_dedup.substring_deduplicate(
+        corpus.read_corpus(paths), os.path.join(output_dir, "deduplicated.docs"), work_dir=os.path.join(output_dir, "work")
+    )
+
+
+def _run_decontaminate(paths: list[str], output_dir: str) -> None:
+    # Every 100th document stands in for an evaluation set.
+    os.makedirs(output_dir, exist_ok=True)
+    documents = list(corpus.read_corpus(paths))
+    index = decontaminate.build_index(documents[::100])
+    corpus.write_corpus(os.path.join(output_dir, "decontaminated.docs"), decontaminate.decontaminate(documents, index))
+
+
+# Whole-corpus stages over one file per document: name -> function(paths, output_dir).
+CORPUS_STAGES = {
+    "exact_dedup": _run_exact_dedup,
+    "exact_dedup_serial_io": _run_exact_dedup_serial_io,
+    "exact_dedup_approximate": _run_exact_dedup_approximate,
+    "minhash_dedup": _run_minhash_dedup,
+    "simhash_dedup": _run_simhash_dedup,
+    "substring_dedup": _run_substring_dedup,
+    "decontaminate": _run_decontaminate,
+}
+
+FUZZY_FIXTURES = Path(__file__).resolve().parents[1] / "tests" / "fixtures" / "documents_with_fuzzy_duplicates"
+
+# Near-duplicate engines: name -> (function(texts) -> kept indices, signature bytes per document).
+NEAR_DUPLICATE_ENGINES = {
+    "minhash": (lambda texts: deduplication.minhash_deduplicate(texts, 100, 10, 5, 0.8), 100 * 16),
+    "simhash": (simhash.simhash_deduplicate, 8),
+}
+
+
+def make_near_duplicate_corpus(
+    fixture_dir: str | Path = FUZZY_FIXTURES,
+    variants_per_document: int = 10,
+    num_distinct: int = 200,
+    edit_rate: float = 0.01,
+    seed: int = 0,
+) -> tuple[list[str], list[int]]:
+    """
+    Build a labeled corpus for near-duplicate detection from the fuzzy-duplicate fixtures.
+
+    Fixture documents with a 5-gram Jaccard similarity of at least 0.8 share a cluster.
+    Each fixture gets `variants_per_document` copies with reflowed whitespace and about
+    `edit_rate` of the words replaced, and `num_distinct` unrelated synthetic documents
+    are added as negatives.
+
+    Returns:
+        The documents and the ground-truth cluster id of each.
+    """
+    rng = random.Random(seed)
+    fixtures = [path.read_text(encoding="utf-8") for path in sorted(Path(fixture_dir).glob("*.txt"))]
+    ngram_sets = [deduplication.get_ngrams(deduplication.normalize_text(text), 5) for text in fixtures]
+    uf = deduplication.UnionFind(len(fixtures))
+    for i in range(len(fixtures)):
+        for j in range(i + 1, len(fixtures)):
+            if deduplication.jaccard_similarity(ngram_sets[i], ngram_sets[j]) >= 0.8:
+                uf.union(i, j)
+
+    vocabulary = _make_vocabulary(rng, 1000)
+    documents, clusters = [], []
+    for i, text in enumerate(fixtures):
+        documents.append(text)
+        clusters.append(uf.find(i))
+        for _ in range(variants_per_document):
+            words = [rng.choice(vocabulary) if rng.random() < edit_rate else word for word in text.split()]
+            documents.append("".join(word + rng.choice([" ", " ", "  ", "\n"]) for word in words))
+            clusters.append(uf.find(i))
+    for document in generate_documents(num_distinct, words_per_doc=200, duplicate_rate=0.0, near_duplicate_rate=0.0, seed=seed):
+        documents.append(document)
+        clusters.append(len(fixtures) + len(clusters))
+    return documents, clusters
+
+
+def _measure_near_duplicate_engine(name: str, documents: list[str], clusters: list[int]) -> dict:
+    func, signature_bytes = NEAR_DUPLICATE_ENGINES[name]
+    random.seed(0)
+    start = time.perf_counter()
+    kept = func(documents)
+    seconds = time.perf_counter() - start
+
+    # A removed document is correct if another member of its true cluster is kept.
+    kept_clusters = {clusters[i] for i in kept}
+    removed = [i for i in range(len(documents)) if i not in kept]
+    correct = sum(clusters[i] in kept_clusters for i in removed)
+    redundant = len(documents) - len(set(clusters))
+    return {
+        "engine": name,
+        "docs": len(documents),
+        "removed": len(removed),
+        "precision": correct / len(removed) if removed else 1.0,
+        "recall": correct / redundant if redundant else 1.0,
+        "seconds": seconds,
+        "docs_per_second": len(documents) / seconds,
+        "signature_bytes_per_doc": signature_bytes,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+
+
+def evaluate_near_duplicates(engines: list[str] | None = None, **corpus_kwargs) -> list[dict]:
+    """
+    Compare the precision, recall and throughput of the near-duplicate engines on
+    the corpus from `make_near_duplicate_corpus`.
+    """
+    documents, clusters = make_near_duplicate_corpus(**corpus_kwargs)
+    results = []
+    for name in engines or NEAR_DUPLICATE_ENGINES:
+        result = _isolated(_measure_near_duplicate_engine, name, documents, clusters)
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+# Sampling policies compared by `evaluate_sampling`; name -> policy.
+SAMPLING_POLICIES = {
+    "full": identify_text.SamplingPolicy("full"),
+    "head": identify_text.SamplingPolicy("head"),
+    "head_tail": identify_text.SamplingPolicy("head_tail"),
+    "windows": identify_text.SamplingPolicy("windows"),
+    "windows_mean": identify_text.SamplingPolicy("windows", aggregate="mean"),
+}
+# Classifiers evaluated with each sampling policy: name -> (function, model path).
+SAMPLING_MODELS = {
+    "langid": (identify_text.identify_language, identify_text.LANGUAGE_MODEL_PATH),
+    "nsfw": (identify_text.identify_nsfw, identify_text.NSFW_MODEL_PATH),
+    "toxicity": (identify_text.identify_hatespeech, identify_text.HATESPEECH_MODEL_PATH),
+}
+FIXTURES = Path(__file__).resolve().parents[1] / "tests" / "fixtures"
+
+
+def make_long_documents(lengths=(1000, 10000, 100000, 1000000)) -> list[str]:
+    """
+    The text fixtures, plus documents of the given lengths (in characters) that
+    concatenate fixtures in random order, so their content changes along the way.
+    """
+    rng = random.Random(0)
+    fixtures = [path.read_text() for path in sorted(FIXTURES.rglob("*.txt"))]
+    documents = list(fixtures)
+    for length in lengths:
+        for _ in range(4):
+            parts, size = [], 0
+            while size < length:
+                parts.append(rng.choice(fixtures))
+                size += len(parts[-1]) + 1
+            documents.append("\n".join(parts)[:length])
+    return documents
+
+
+def evaluate_sampling(models: list[str] | None = None, policies: list[str] | None = None, documents: list[str] | None = None) -> list[dict]:
+    """
+    Compare each sampling policy with classifying whole documents: how often the label
+    is unchanged, how much the score moves, and how much faster it is.
+
+    Classifiers whose model has not been downloaded are skipped.
+    """
+    documents = documents if documents is not None else make_long_documents()
+    results = []
+    for model in models or SAMPLING_MODELS:
+        func, model_path = SAMPLING_MODELS[model]
+        if model_path is not None and not os.path.exists(model_path):
+            print(f"Skipping {model}: model not found")
+            continue
+        func(documents[0])  # Load the model outside of the timed region.
+        reference, full_seconds = None, None
+        for name in ["full", *(p for p in policies or SAMPLING_POLICIES if p != "full")]:
+            start = time.perf_counter()
+            predictions = [func(document, SAMPLING_POLICIES[name]) for document in documents]
+            seconds = time.perf_counter() - start
+            if reference is None:
+                reference, full_seconds = predictions, seconds
+            agree = [abs(p[1] - r[1]) for p, r in zip(predictions, reference) if p[0] == r[0]]
+            result = {
+                "model": model,
+                "policy": name,
+                "docs": len(documents),
+                "agreement": len(agree) / len(documents),
+                # Over the documents whose label is unchanged.
+                "mean_score_difference": sum(agree) / len(agree) if agree else None,
+                "seconds": seconds,
+                "docs_per_second": len(documents) / seconds,
+                "speedup": full_seconds / seconds,
+            }
+            print(json.dumps(result))
+            results.append(result)
+    return results
+
+
+# Modules timed by `measure_import_times`, and the dependencies it reports them importing.
+IMPORT_TIME_MODULES = (
+    "cs336_data",
+    "cs336_data.extract_text",
+    "cs336_data.identify_text",
+    "cs336_data.quality_classifier",
+    "cs336_data.create_quality_datasets",
+    "cs336_data.pipeline",
+)
+HEAVY_DEPENDENCIES = ("fasttext", "numpy", "regex", "resiliparse", "warcio")
+
+
+def measure_import_times(modules=IMPORT_TIME_MODULES, repeats: int = 5) -> list[dict]:
+    """
+    Time importing each module in a fresh interpreter with `python -X importtime`
+    (the fastest of `repeats` runs) and list the heavy dependencies it imports.
+    """
+    results = []
+    for module in modules:
+        seconds = []
+        for _ in range(repeats):
+            stderr = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                capture_output=True, text=True, check=True,
+            ).stderr
+            # Lines are "import time: <self us> | <cumulative us> | <indented module name>".
+            rows = [line.split("|") for line in stderr.splitlines() if line.startswith("import time:")]
+            cumulative = {name.strip(): value for _, value, name in rows[1:]}
+            seconds.append(int(cumulative[module]) / 1e6)
+        result = {
+            "module": module,
+            "import_seconds": min(seconds),
+            "heavy_imports": [name for name in HEAVY_DEPENDENCIES if name in cumulative],
+        }
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux. Children are the pool workers, if any.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * 1024
+
+
+def _measure_document_stage(name: str, inputs: list, num_workers: int) -> dict:
+    func = DOCUMENT_STAGES[name][1]
+    if num_workers == 1:
+        func(inputs[0])  # Load models outside of the timed region.
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        seconds = time.perf_counter() - start
+    else:
+        with FilterPool(num_workers, missing_ok=True) as pool:
+            start = time.perf_counter()
+            pool.map(func, inputs)
+            seconds = time.perf_counter() - start
+    return {"seconds": seconds, "peak_rss_bytes": _peak_rss_bytes()}
+
+
+def _measure_corpus_stage(name: str, documents: list[str], num_workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_documents(documents, os.path.join(tmp, "input"))
+        start = time.perf_counter()
+        CORPUS_STAGES[name](paths, os.path.join(tmp, "output"))
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "peak_rss_bytes": _peak_rss_bytes()}
+
+
+def _run_in_child(queue, measure, args):
+    try:
+        queue.put(measure(*args))
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def _isolated(measure, *args, poll_interval: float = 1.0) -> dict:
+    # Each measurement runs in a fresh forked process so that peak RSS is per stage.
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(results, measure, args))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=poll_interval)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The child exited; give a result it put just before exiting time to arrive.
+        try:
+            result = results.get(timeout=poll_interval)
+        except queue.Empty:
+            # Killed without reporting (e.g. by the OOM killer or a crash in an extension).
+            result = {"error": f"Measurement process exited with code {process.exitcode}"}
+        break
+    process.join()
+    return result
+
+
+def stage_available(name: str) -> bool:
+    if name in CORPUS_STAGES:
+        return True
+    model_path = DOCUMENT_STAGES[name][2]
+    return model_path is None or quality_classifier.resolve_model_path(model_path).exists()
+
+
+def run_benchmarks(
+    stages: list[str] | None = None,
+    num_docs: int = 1000,
+    words_per_doc: int = 500,
+    duplicate_rate: float = 0.1,
+    near_duplicate_rate: float = 0.1,
+    workers: list[int] = (1,),
+    seed: int = 0,
+) -> dict:
+    """
+    Run each stage on a synthetic corpus and report its throughput.
+
+    Per-document stages are run once per entry in `workers` to measure scaling; corpus
+    stages (deduplication) run in a single process.
+
+    Returns:
+        A JSON-serializable dict with the corpus configuration, the git commit, and one
+        result per (stage, workers) with docs/sec, MB/sec and peak RSS.
+    """
+    documents = generate_documents(num_docs, words_per_doc, duplicate_rate, near_duplicate_rate, seed=seed)
+    inputs = {"text": documents, "html": [to_html(document) for document in documents]}
+    sizes = {kind: sum(len(x.encode("utf-8") if isinstance(x, str) else x) for x in items) for kind, items in inputs.items()}
+
+    results = []
+    for name in stages or [*DOCUMENT_STAGES, *CORPUS_STAGES]:
+        if not stage_available(name):
+            print(f"Skipping {name}: model not found")
+            continue
+        if name in CORPUS_STAGES:
+            runs = [(1, _isolated(_measure_corpus_stage, name, documents, 1))]
+            num_bytes = sizes["text"]
+        else:
+            kind = DOCUMENT_STAGES[name][0]
+            runs = [(n, _isolated(_measure_document_stage, name, inputs[kind], n)) for n in workers]
+            num_bytes = sizes[kind]
+        for num_workers, measurement in runs:
+            result = {"stage": name, "workers": num_workers, "docs": num_docs, "bytes": num_bytes, **measurement}
+            if "seconds" in measurement:
+                result["docs_per_second"] = num_docs / measurement["seconds"]
+                result["mb_per_second"] = num_bytes / 1e6 / measurement["seconds"]
+            print(json.dumps(result))
+            results.append(result)
+
+    return {
+        "commit": _git_commit(),
+        "config": {
+            "num_docs": num_docs,
+            "words_per_doc": words_per_doc,
+            "duplicate_rate": duplicate_rate,
+            "near_duplicate_rate": near_duplicate_rate,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: dict, current: dict) -> list[dict]:
+    """
+    Match results by (stage, workers) and report the speedup of `current` over `baseline`.
+    """
+    old = {(r["stage"], r["workers"]): r for r in baseline["results"] if "docs_per_second" in r}
+    rows = []
+    for r in current["results"]:
+        key = (r["stage"], r["workers"])
+        if key in old and "docs_per_second" in r:
+            rows.append({
+                "stage": r["stage"],
+                "workers": r["workers"],
+                "baseline_docs_per_second": old[key]["docs_per_second"],
+                "docs_per_second": r["docs_per_second"],
+                "speedup": r["docs_per_second"] / old[key]["docs_per_second"],
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=[*DOCUMENT_STAGES, *CORPUS_STAGES])
+    parser.add_argument("--num-docs", type=int, default=1000)
+    parser.add_argument("--words-per-doc", type=int, default=500)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--near-duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Print speedups against a previous JSON output.")
+    parser.add_argument(
+        "--near-duplicates", action="store_true",
+        help="Also compare near-duplicate engines on the fuzzy-duplicate fixtures.",
+    )
+    parser.add_argument(
+        "--sampling", action="store_true",
+        help="Also compare the classifiers' sampling policies on long documents built from the fixtures.",
+    )
+    parser.add_argument("--import-time", action="store_true", help="Also time importing the cs336_data modules.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        args.stages,
+        num_docs=args.num_docs,
+        words_per_doc=args.words_per_doc,
+        duplicate_rate=args.duplicate_rate,
+        near_duplicate_rate=args.near_duplicate_rate,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    if args.near_duplicates:
+        report["near_duplicates"] = evaluate_near_duplicates(seed=args.seed)
+    if args.sampling:
+        report["sampling"] = evaluate_sampling()
+    if args.import_time:
+        report["import_times"] = measure_import_times()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            for row in compare_results(json.load(f), report):
+                print(json.dumps(row))
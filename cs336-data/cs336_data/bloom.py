@@ -0,0 +1,105 @@
+"""
+Bloom filters over 64-bit hashes, stored as numpy bit arrays.
+
+Items are added and looked up in batches, so callers hash whole documents or
+files with numpy and never loop over items in Python.
+"""
+import math
+
+import numpy as np
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives.
+
+    Each hash sets `num_hashes` bits, derived from its two 32-bit halves by enhanced
+    double hashing (Dillinger and Manolios, 2004). Use `for_capacity` to size the
+    filter for a target false positive rate, or `for_memory` for a memory budget.
+
+    Args:
+        num_bits (int): Size of the bit array (rounded up to a multiple of 64).
+        num_hashes (int): Bits set per item.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int):
+        self.num_bits = max(64, -(-num_bits // 64) * 64)
+        self.num_hashes = num_hashes
+        self.bits = np.zeros(self.num_bits // 64, dtype=np.uint64)
+        self.num_items = 0
+
+    @classmethod
+    def for_capacity(cls, num_items: int, false_positive_rate: float, **kwargs):
+        """
+        Create a filter holding `num_items` hashes at the given false positive rate.
+        """
+        num_bits = math.ceil(-max(num_items, 1) * math.log(false_positive_rate) / math.log(2) ** 2)
+        num_hashes = max(1, round(max(num_bits, 64) / max(num_items, 1) * math.log(2)))
+        return cls(num_bits, num_hashes, **kwargs)
+
+    @classmethod
+    def for_memory(cls, num_bytes: int, num_hashes: int, **kwargs):
+        """
+        Create a filter using `num_bytes` of memory.
+        """
+        return cls(8 * num_bytes, num_hashes, **kwargs)
+
+    def _position(self, low: np.ndarray, high: np.ndarray, i: int) -> np.ndarray:
+        return (low + np.uint64(i) * high + np.uint64((i ** 3 - i) // 6)) % np.uint64(self.num_bits)
+
+    def _split(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return hashes & np.uint64(0xFFFFFFFF), (hashes >> np.uint64(32)) | np.uint64(1)
+
+    def add(self, hashes: np.ndarray) -> None:
+        low, high = self._split(hashes)
+        for i in range(self.num_hashes):
+            positions = self._position(low, high, i)
+            np.bitwise_or.at(self.bits, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+        self.num_items += len(low)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Boolean array, True for each hash that may be in the filter.
+        """
+        low, high = self._split(hashes)
+        # Most hashes are absent and fail one of the first probes, so only the
+        # remaining candidates are probed further.
+        candidates = np.arange(len(low))
+        for i in range(self.num_hashes):
+            if len(candidates) == 0:
+                break
+            positions = self._position(low[candidates], high[candidates], i)
+            hit = (self.bits[positions >> np.uint64(6)] >> (positions & np.uint64(63))) & np.uint64(1)
+            candidates = candidates[hit.astype(bool)]
+        found = np.zeros(len(low), dtype=bool)
+        found[candidates] = True
+        return found
+
+    def fill_ratio(self) -> float:
+        """
+        The fraction of bits set.
+        """
+        return float(np.unpackbits(self.bits.view(np.uint8)).mean())
+
+    def false_positive_rate(self) -> float:
+        """
+        The expected false positive rate, from the fraction of bits set.
+        """
+        return self.fill_ratio() ** self.num_hashes
+
+    def _metadata(self) -> dict:
+        return {"num_hashes": self.num_hashes, "num_items": self.num_items}
+
+    def save(self, path) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, bits=self.bits, **self._metadata())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            metadata = {key: int(data[key]) for key in data.files if key not in ("bits", "num_items")}
+            bloom = cls(64 * len(data["bits"]), **metadata)
+            bloom.bits = data["bits"]
+            bloom.num_items = int(data["num_items"])
+        return bloom
@@ -0,0 +1,185 @@
+"""
+Atomic output writes and shard-level progress manifests for resumable jobs.
+
+A job processes its inputs shard by shard and commits each finished shard to a
+`ProgressManifest`, optionally together with a picklable snapshot of its partial
+state (reservoir contents, signatures, counts). When the job is rerun with the same
+configuration after a crash or preemption, it skips the committed shards and picks
+up from the saved state:
+
+```
+progress = ProgressManifest("checkpoints/job", config={"num_hashes": 100})
+for path in input_paths:
+    key = shard_key(path)
+    if progress.done(key):
+        continue
+    ...
+    progress.commit(key, info={"documents": n}, state=partial_state)
+```
+
+Outputs and state files are written to a temporary name and renamed into place,
+so a crash never leaves a truncated one behind. Committed shards are appended to a
+log (a partial last line, from a crash during the append, is discarded), so a
+commit costs the same however many shards came before it; the fsync of the
+appended line is the commit point of a shard.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+
+@contextlib.contextmanager
+def atomic_write(path: str | Path, mode: str = "w", **kwargs):
+    """
+    Open a temporary file next to `path` for writing and rename it to `path` once the
+    block completes; if the block raises, the temporary file is removed and `path`
+    is left untouched.
+
+    Args:
+        path (str or Path): Final output path.
+        mode (str): "w" or "wb".
+        **kwargs: Passed to `open` (e.g. encoding).
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp.{os.getpid()}")
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def shard_key(path: str | Path) -> str:
+    """
+    Identify an input shard by its absolute path, size and modification time, so a
+    shard that was rewritten since it was committed is processed again.
+    """
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def hash_paths(paths) -> str:
+    """
+    Identify a list of inputs by a hash of their absolute paths, for job configurations.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.abspath(path).encode("utf-8", "surrogateescape") + b"\0")
+    return digest.hexdigest()
+
+
+class ProgressManifest:
+    """
+    Record of the completed shards of a job, stored in `directory` as the job
+    configuration (`progress.json`, written once), a log of committed shards
+    (`progress.log`, one JSON line per commit) and one `state-<key hash>.pkl` file per
+    committed shard that saved state.
+
+    Args:
+        directory (str or Path): Checkpoint directory (created if missing).
+        config (dict, optional): JSON-serializable job configuration. Resuming with
+            a different configuration raises ValueError rather than mixing results.
+            Keep it small (e.g. hash long input lists; see `hash_paths`).
+    """
+
+    def __init__(self, directory: str | Path, config: dict | None = None):
+        self.directory = Path(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = self.directory / "progress.json"
+        self.log_path = self.directory / "progress.log"
+        self.config = json.loads(json.dumps(config or {}))
+        self.completed = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved["config"] != self.config:
+                raise ValueError(
+                    f"Checkpoint in {self.directory} was written with a different configuration "
+                    f"({saved['config']}); remove it to start over."
+                )
+            # Manifests written before the log existed list the shards inline.
+            self.completed = saved.get("completed", {})
+            self._read_log()
+        else:
+            # A log without its configuration belongs to an abandoned checkpoint.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.log_path)
+            with atomic_write(self.path) as f:
+                json.dump({"config": self.config}, f, indent=2)
+
+    def _read_log(self) -> None:
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Drop a line left partial by a crash during the append.
+            with open(self.log_path, "r+b") as f:
+                f.truncate(end)
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            self.completed[entry["key"]] = {"info": entry["info"], "state": entry["state"]}
+
+    def _append(self, key: str) -> None:
+        entry = {"key": key, **self.completed[key]}
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def info(self, key: str) -> dict:
+        return self.completed[key]["info"]
+
+    def last_key(self) -> str | None:
+        """
+        The most recently committed shard, if any.
+        """
+        return next(reversed(self.completed), None)
+
+    def commit(self, key: str, info: dict | None = None, state=None) -> None:
+        """
+        Mark a shard as completed, saving `info` (JSON-serializable) in the manifest
+        and `state` (picklable, optional) in its own file.
+        """
+        state_file = None
+        if state is not None:
+            # Named after the key, so committing a key again replaces only its own state.
+            state_file = f"state-{hashlib.sha256(key.encode('utf-8', 'surrogateescape')).hexdigest()[:16]}.pkl"
+            with atomic_write(self.directory / state_file, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.completed[key] = {"info": info or {}, "state": state_file}
+        self._append(key)
+
+    def load_state(self, key: str):
+        """
+        Load the state saved with a committed shard (None if it saved none).
+        """
+        state_file = self.completed[key]["state"]
+        if state_file is None:
+            return None
+        with open(self.directory / state_file, "rb") as f:
+            return pickle.load(f)
+
+    def discard_state(self, key: str) -> None:
+        """
+        Delete the state file of a committed shard that is no longer needed, e.g.
+        because a later shard saved a cumulative snapshot.
+        """
+        state_file = self.completed[key]["state"]
+        if state_file is not None:
+            self.completed[key]["state"] = None
+            self._append(key)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.directory / state_file)
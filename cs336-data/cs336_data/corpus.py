@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Multi-document corpus files, so millions of documents live in a few large files
+instead of one file each.
+
+Two formats are supported, chosen by file suffix:
+
+- `.docs`: a packed binary container. After an 8-byte magic header, each document
+  is stored as a little-endian uint32 byte length followed by its UTF-8 bytes. The
+  `<path>.idx` file next to it holds the uint64 offset of every record plus the end
+  of the last one, so document `i` is read from a memory map in O(1).
+- `.jsonl` / `.jsonl.gz`: one JSON object with a "text" field per line. Sequential
+  access only, but easy to inspect and to produce with other tools.
+
+Example:
+
+```
+python -m cs336_data.corpus pack data/docs/*.txt --output data/docs.docs
+python -m cs336_data.corpus info data/docs.docs
+python -m cs336_data.corpus unpack data/docs.docs --output-dir data/docs
+```
+"""
+import argparse
+import gzip
+import json
+import os
+import struct
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data.checkpoint import atomic_write
+from cs336_data.readers import open_input, read_files
+
+MAGIC = b"CS336DOC"
+_LENGTH = struct.Struct("<I")
+
+
+def index_path(path: str | Path) -> Path:
+    return Path(f"{path}.idx")
+
+
+def is_packed(path: str | Path) -> bool:
+    return str(path).endswith(".docs")
+
+
+def is_jsonl(path: str | Path) -> bool:
+    return str(path).endswith((".jsonl", ".jsonl.gz"))
+
+
+class PackedCorpus:
+    """
+    Random access to the documents of a `.docs` file through a memory map.
+
+    Args:
+        path (str or Path): Path to the `.docs` file (its `.idx` must exist).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Not a packed corpus file: {self.path}")
+        self.offsets = np.fromfile(index_path(self.path), dtype=np.uint64)
+        if len(self.offsets) == 0 or int(self.offsets[-1]) != len(self.data):
+            raise ValueError(f"Index does not match corpus file: {index_path(self.path)}")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get_bytes(self, i: int) -> memoryview:
+        """
+        The UTF-8 bytes of document `i`, without copying them out of the map.
+        """
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Document {i} out of range for corpus of {len(self)} documents")
+        i %= len(self)
+        start = int(self.offsets[i]) + _LENGTH.size
+        return memoryview(self.data[start:int(self.offsets[i + 1])])
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.get_bytes(i), "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class PackedCorpusWriter:
+    """
+    Append documents to a new `.docs` file and its index.
+
+    Both files are written under temporary names and renamed into place by `close`,
+    so readers never see a partially written corpus.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._data = atomic_write(self.path, "wb")
+        self._file = self._data.__enter__()
+        self._file.write(MAGIC)
+        self._offsets = array("Q", [len(MAGIC)])
+
+    def add(self, text: str) -> int:
+        """
+        Append a document, returning its id.
+        """
+        data = text.encode("utf-8")
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + _LENGTH.size + len(data))
+        return len(self._offsets) - 2
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        with atomic_write(index_path(self.path), "wb") as f:
+            self._offsets.tofile(f)
+        self._data.__exit__(None, None, None)
+        self._file = None
+
+    def abort(self) -> None:
+        """
+        Discard the documents written so far.
+        """
+        if self._file is not None:
+            self._data.__exit__(RuntimeError, RuntimeError("aborted"), None)
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonlCorpusWriter:
+    """
+    Write documents as `{"text": ...}` lines to a (gzipped, for `.gz`) JSONL file,
+    which is renamed into place by `close`.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._raw = atomic_write(self.path, "wb")
+        raw_file = self._raw.__enter__()
+        if str(path).endswith(".gz"):
+            self._file = gzip.open(raw_file, "wt", encoding="utf-8")
+        else:
+            self._file = open(raw_file.fileno(), "w", encoding="utf-8", closefd=False)
+        self._count = 0
+
+    def add(self, text: str, **fields) -> int:
+        self._file.write(json.dumps({**fields, "text": text}) + "\n")
+        self._count += 1
+        return self._count - 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._raw.__exit__(None, None, None)
+        self._file = None
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._raw.__exit__(RuntimeError, RuntimeError("aborted"), None)
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_corpus_writer(path: str | Path):
+    """
+    Open a writer for a `.docs` or `.jsonl(.gz)` corpus; both have `add(text)`,
+    `close()` and context manager support.
+    """
+    if is_packed(path):
+        return PackedCorpusWriter(path)
+    if is_jsonl(path):
+        return JsonlCorpusWriter(path)
+    raise ValueError(f"Unknown corpus format (expected .docs, .jsonl or .jsonl.gz): {path}")
+
+
+def read_corpus(paths, io_concurrency: int | None = None):
+    """
+    Yield the documents of one or more corpus files in order.
+
+    `.docs` and `.jsonl(.gz)` files contribute all their documents; any other file is
+    read as a single document (so a list of one-document-per-file paths also works).
+
+    Args:
+        paths (str, Path or list): Corpus file path(s).
+        io_concurrency (int, optional): Prefetch concurrency for single-document files.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    plain = []
+    for path in paths:
+        if not is_packed(path) and not is_jsonl(path):
+            plain.append(path)
+            continue
+        if plain:
+            yield from _read_plain(plain, io_concurrency)
+            plain = []
+        if is_packed(path):
+            yield from PackedCorpus(path)
+        else:
+            with open_input(path, "rt") as f:
+                for line in f:
+                    yield json.loads(line)["text"]
+    if plain:
+        yield from _read_plain(plain, io_concurrency)
+
+
+def _read_plain(paths, io_concurrency: int | None):
+    kwargs = {} if io_concurrency is None else {"io_concurrency": io_concurrency}
+    for _, document in read_files(paths, **kwargs):
+        yield document
+
+
+def write_corpus(path: str | Path, documents) -> int:
+    """
+    Write documents to a new corpus file, returning the number written.
+    """
+    with open_corpus_writer(path) as writer:
+        count = 0
+        for document in documents:
+            writer.add(document)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack = subparsers.add_parser("pack", help="Pack documents or corpora into one corpus file.")
+    pack.add_argument("inputs", nargs="+")
+    pack.add_argument("--output", required=True, help="Output .docs or .jsonl(.gz) file.")
+    unpack = subparsers.add_parser("unpack", help="Write each document of a corpus to its own file.")
+    unpack.add_argument("input")
+    unpack.add_argument("--output-dir", required=True)
+    info = subparsers.add_parser("info", help="Print the number of documents and bytes of a corpus.")
+    info.add_argument("input")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(f"Wrote {write_corpus(args.output, read_corpus(args.inputs))} documents to {args.output}")
+    elif args.command == "unpack":
+        os.makedirs(args.output_dir, exist_ok=True)
+        for i, document in enumerate(read_corpus(args.input)):
+            with open(os.path.join(args.output_dir, f"doc{i:08d}.txt"), "w", encoding="utf-8") as f:
+                f.write(document)
+    else:
+        num_docs = num_bytes = 0
+        for document in read_corpus(args.input):
+            num_docs += 1
+            num_bytes += len(document.encode("utf-8"))
+        print(json.dumps({"documents": num_docs, "bytes": num_bytes}))
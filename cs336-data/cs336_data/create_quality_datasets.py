@@ -1,115 +1,233 @@
+#!/usr/bin/env python3
 from pathlib import Path
-from warcio.archiveiterator import ArchiveIterator
-import gzip
 import random
-from cs336_data import extract_text, quality_classifier
+from cs336_data import extract_text, identify_text, metrics, quality_classifier
+from cs336_data.checkpoint import ProgressManifest, atomic_write, hash_paths, shard_key
+from cs336_data.lazy import lazy_import
+from cs336_data.readers import open_input
+
+archiveiterator = lazy_import("warcio.archiveiterator")
+
+
+class Reservoir:
+    """
+    Uniform fixed-size sample of a stream of unknown length (Vitter's Algorithm R).
+
+    Memory use is bounded by `capacity` items no matter how many are offered.
+    """
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def add(self, item) -> None:
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.capacity:
+            self.items[j] = item
+
 
 def create_quality_dataset(
-    positive_warc: str | Path,
-    negative_warc: str | Path,
+    positive_warc: str | Path | list,
+    negative_warc: str | Path | list,
     output_file: str | Path,
     min_word_count: int = 50,
-    language: str = "en"
+    language: str = "en",
+    target_size: int = 1200,
+    validation_file: str | Path | None = None,
+    validation_fraction: float = 0.1,
+    seed: int | None = None,
+    max_records: int | None = None,
+    checkpoint_dir: str | Path | None = None,
+    sampling: identify_text.SamplingPolicy | None = None,
 ) -> None:
     """
     Create a balanced fastText training dataset from two WARC files with enhanced filtering.
-    
+
     Positive examples (high quality) are labeled as __label__high.
     Negative examples (low quality) are labeled as __label__low.
-    
+
+    Each WARC is streamed into a fixed-size reservoir per label, so memory is bounded
+    by `target_size` documents per class regardless of the size of the inputs.
+
+    With `checkpoint_dir`, the reservoirs are checkpointed after every WARC file, and
+    a rerun after a crash skips the WARC files that were already processed.
+
     Args:
-        positive_warc (str or Path): Path to the high-quality WARC file.
-        negative_warc (str or Path): Path to the low-quality WARC file.
+        positive_warc (str, Path or list): Path(s) to the high-quality WARC file(s).
+        negative_warc (str, Path or list): Path(s) to the low-quality WARC file(s).
         output_file (str or Path): Path to write the combined training dataset.
         min_word_count (int): Minimum number of words a document must have to be included.
         language (str): ISO language code to filter for (default: "en").
+        target_size (int): Number of examples to keep per class.
+        validation_file (str or Path, optional): If given, hold out `validation_fraction`
+            of the shuffled examples and write them to this file.
+        validation_fraction (float): Fraction of examples written to `validation_file`.
+        seed (int, optional): Seed for sampling, balancing and shuffling.
+        max_records (int, optional): Stop reading each WARC after this many records.
+        checkpoint_dir (str or Path, optional): Directory for the progress manifest and
+            reservoir snapshots used to resume an interrupted run.
+        sampling (SamplingPolicy, optional): Which parts of each document the language,
+            NSFW and toxicity classifiers read (default: the first 1000 characters, cut
+            at whitespace, so unlike a plain `text[:1000]` no partial last word).
     """
-    import identify_text
-    
-    # Store processed examples for balancing later
-    positive_examples = []
-    negative_examples = []
-    
-    def process_warc(warc_path: str | Path, label: str, examples_list, apply_quality_filters=True) -> None:
+    rng = random.Random(seed)
+    sampling = sampling or identify_text.SamplingPolicy("head", max_chars=1000)
+
+    def process_warc(warc_path: str | Path, label: str, reservoir: Reservoir, apply_quality_filters=True) -> None:
         count = 0
-        with gzip.open(str(warc_path), "rb") as stream:
-            for record in ArchiveIterator(stream):
+        # Metric names, built once rather than per record.
+        names = {
+            event: f"quality_dataset_{label}_{event}"
+            for event in ("records", "rejected_short", "rejected_gopher", "rejected_language", "rejected_nsfw", "rejected_toxic", "accepted")
+        }
+        with open_input(warc_path, "rb") as stream:
+            for num_records, record in enumerate(archiveiterator.ArchiveIterator(stream)):
+                if max_records is not None and num_records >= max_records:
+                    break
+                metrics.increment(names["records"])
                 # Extract text from the record
                 html_bytes = record.content_stream().read()
-                text = extract_text(html_bytes)
+                text = extract_text.extract_text(html_bytes)
                 if not text:
                     continue
-                    
+
                 # Clean the text (remove extra whitespace/newlines)
                 clean_text = " ".join(text.split())
-                
+
                 # Only include documents with a sufficient number of words
                 if len(clean_text.split()) < min_word_count:
+                    metrics.increment(names["rejected_short"])
                     continue
                 if apply_quality_filters:
                     # Apply Gopher quality filters ONLY for positive examples
                     if not quality_classifier.gopher_quality_filters(clean_text):
+                        metrics.increment(names["rejected_gopher"])
                         continue
-                    
+
                     # Check language (if specified) - apply to both positive and negative
                     if language:
-                        detected_lang, confidence = identify_text.identify_language(clean_text[:1000])
+                        detected_lang, confidence = identify_text.identify_language(clean_text, sampling)
                         if detected_lang != language or confidence < 0.5:
+                            metrics.increment(names["rejected_language"])
                             continue
-                    
+
                     # Filter out NSFW content - apply to both positive and negative
-                    nsfw_label, nsfw_conf = identify_text.identify_nsfw(clean_text[:1000])
+                    nsfw_label, nsfw_conf = identify_text.identify_nsfw(clean_text, sampling)
                     if nsfw_label == "nsfw" and nsfw_conf > 0.7:
+                        metrics.increment(names["rejected_nsfw"])
                         continue
-                    
+
                     # Filter out toxic content - apply to both positive and negative
-                    toxic_label, toxic_conf = identify_text.identify_hatespeech(clean_text[:1000])
+                    toxic_label, toxic_conf = identify_text.identify_hatespeech(clean_text, sampling)
                     if toxic_label == "toxic" and toxic_conf > 0.7:
+                        metrics.increment(names["rejected_toxic"])
                         continue
-                    
-                # Store valid examples
-                examples_list.append(clean_text)
+
+                # Offer the valid example to the reservoir
+                reservoir.add(clean_text)
+                metrics.increment(names["accepted"])
                 count += 1
-                
+
                 # Print progress periodically
                 if count % 100 == 0:
                     print(f"Processed {count} valid {label} examples")
-                if count == 1200:
-                    break
-        
-    
-    print("Processing positive (high quality) examples...")
-    process_warc(positive_warc, "high", positive_examples, apply_quality_filters=True)
-    
-    print("Processing negative (low quality) examples...")
-    process_warc(negative_warc, "low", negative_examples, apply_quality_filters=False)
-    
-    # Balance the datasets by sampling
-    print(f"Found {len(positive_examples)} positive and {len(negative_examples)} negative examples")
-    target_size = min(len(positive_examples), len(negative_examples))
-    
-    if len(positive_examples) > target_size:
-        positive_examples = random.sample(positive_examples, target_size)
-    if len(negative_examples) > target_size:
-        negative_examples = random.sample(negative_examples, target_size)
-    
-    print(f"Balanced to {target_size} examples per class")
-    
-    # Write the balanced dataset
-    with open(output_file, "w", encoding="utf-8") as out_f:
-        for example in positive_examples:
-            out_f.write(f"__label__high {example}\n")
-        for example in negative_examples:
-            out_f.write(f"__label__low {example}\n")
-    
-    print(f"Quality dataset created at: {output_file}")
-    print(f"Total examples: {len(positive_examples) + len(negative_examples)}")
+
+    positive_examples = Reservoir(target_size, rng)
+    negative_examples = Reservoir(target_size, rng)
+    reservoirs = {"high": positive_examples, "low": negative_examples}
+
+    def as_list(paths):
+        return [paths] if isinstance(paths, (str, Path)) else list(paths)
+
+    progress = None
+    if checkpoint_dir is not None:
+        # Resuming with other inputs or another sampling policy would mix examples
+        # chosen under different settings in the reservoirs, so it raises instead.
+        progress = ProgressManifest(checkpoint_dir, config={
+            "min_word_count": min_word_count,
+            "language": language,
+            "target_size": target_size,
+            "seed": seed,
+            "max_records": max_records,
+            "sampling": sampling.to_dict(),
+            "positive_inputs": hash_paths(as_list(positive_warc)),
+            "negative_inputs": hash_paths(as_list(negative_warc)),
+        })
+        last = progress.last_key()
+        if last is not None:
+            state = progress.load_state(last)
+            rng.setstate(state["rng"])
+            for label, (items, seen) in state["reservoirs"].items():
+                reservoirs[label].items, reservoirs[label].seen = items, seen
+            print(f"Resuming after {len(progress.completed)} completed WARC files")
+
+    # Positive examples (high quality) get the quality filters, negatives do not.
+    shards = [("high", path, True) for path in as_list(positive_warc)]
+    shards += [("low", path, False) for path in as_list(negative_warc)]
+    for label, path, apply_quality_filters in shards:
+        key = f"{label}:{shard_key(path)}"
+        if progress is not None and progress.done(key):
+            continue
+        print(f"Processing {label} quality examples from {path}...")
+        process_warc(path, label, reservoirs[label], apply_quality_filters=apply_quality_filters)
+        if progress is not None:
+            # Each snapshot is cumulative, so only the latest one is kept.
+            previous = progress.last_key()
+            progress.commit(key, info={"seen": reservoirs[label].seen}, state={
+                "rng": rng.getstate(),
+                "reservoirs": {name: (r.items, r.seen) for name, r in reservoirs.items()},
+            })
+            if previous is not None:
+                progress.discard_state(previous)
+
+    # Balance the datasets. Reservoir contents are already a uniform sample, so a
+    # shuffled prefix of the larger one is a uniform sample of the smaller size.
+    print(f"Found {positive_examples.seen} positive and {negative_examples.seen} negative examples")
+    class_size = min(len(positive_examples.items), len(negative_examples.items))
+    rng.shuffle(positive_examples.items)
+    rng.shuffle(negative_examples.items)
+    del positive_examples.items[class_size:]
+    del negative_examples.items[class_size:]
+    print(f"Balanced to {class_size} examples per class")
+
+    # Shuffle (label, index) pairs rather than formatted lines, so the texts are
+    # never copied and are written straight from the reservoirs.
+    order = [("high", i) for i in range(class_size)] + [("low", i) for i in range(class_size)]
+    rng.shuffle(order)
+    num_validation = int(len(order) * validation_fraction) if validation_file is not None else 0
+    splits = [(output_file, order[num_validation:])]
+    if validation_file is not None:
+        splits.append((validation_file, order[:num_validation]))
+
+    for path, split in splits:
+        with atomic_write(path, "w", encoding="utf-8") as out_f:
+            for label, i in split:
+                examples = positive_examples if label == "high" else negative_examples
+                out_f.write(f"__label__{label} {examples.items[i]}\n")
+        print(f"Quality dataset created at: {path} ({len(split)} examples)")
+
+    print(f"Total examples: {len(order)}")
 
 if __name__ == '__main__':
     # Define file paths.
     positive_warc_file = "data/subsampled_positive_urls.warc.warc.gz"
     negative_warc_file = "data/CC-MAIN-20180420081400-20180420101400-00118.warc.gz"
     training_dataset = "data/quality-dataset-train.txt"
-    
+    validation_dataset = "data/quality-dataset-valid.txt"
+
     # Step 1: Create the training dataset.
-    create_quality_dataset(positive_warc_file, negative_warc_file, training_dataset, min_word_count=50)
+    create_quality_dataset(
+        positive_warc_file,
+        negative_warc_file,
+        training_dataset,
+        min_word_count=50,
+        validation_file=validation_dataset,
+        seed=0,
+        checkpoint_dir="data/quality-dataset-checkpoint",
+    )
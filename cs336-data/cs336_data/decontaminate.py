@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Remove training documents that overlap evaluation sets.
+
+An index of the 13-gram hashes of local evaluation files is stored in a Bloom
+filter; corpus documents are then streamed through a vectorized lookup and either
+dropped or have their overlapping spans cut out.
+
+Example:
+
+```
+python -m cs336_data.decontaminate build eval/*.jsonl --output data/eval-13grams.npz
+python -m cs336_data.decontaminate filter data/filtered.docs --index data/eval-13grams.npz \
+    --output data/decontaminated.docs --mode drop
+```
+
+Words are the `\\w+` runs of a document, lowercased (so punctuation and whitespace
+differences do not matter), and each n-gram hash is computed from the words' hashes
+with numpy, so no per-n-gram Python strings are built. Documents shorter than
+`ngram_length` words have no n-grams and are never flagged.
+
+The Bloom filter flags an n-gram that is not in the evaluation sets with
+probability about `false_positive_rate`, so with the default 1e-6 a 10,000-word
+document is wrongly flagged with probability about 1%.
+"""
+import argparse
+import itertools
+import json
+import re
+
+import numpy as np
+
+from cs336_data import corpus, metrics
+from cs336_data.bloom import BloomFilter
+from cs336_data.readers import open_input
+
+DEFAULT_NGRAM_LENGTH = 13
+DEFAULT_FALSE_POSITIVE_RATE = 1e-6
+
+_WORD_RE = re.compile(r"\w+")
+# Odd multipliers of the polynomial hashes of words (over bytes) and n-grams (over words).
+_BYTE_BASE = 0x100000001B3
+_WORD_BASE = 0x9E3779B97F4A7C15
+_powers = np.ones(1, dtype=np.uint64)
+_inverse_powers = np.ones(1, dtype=np.uint64)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer, so that similar inputs get unrelated hashes.
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _byte_powers(n: int) -> tuple[np.ndarray, np.ndarray]:
+    # _BYTE_BASE**i and its inverse modulo 2**64, cached and grown by doubling.
+    global _powers, _inverse_powers
+    if len(_powers) < n:
+        size = max(n, 2 * len(_powers))
+        one = np.ones(1, dtype=np.uint64)
+        _powers = np.cumprod(np.concatenate([one, np.full(size - 1, _BYTE_BASE, dtype=np.uint64)]), dtype=np.uint64)
+        inverse = pow(_BYTE_BASE, -1, 1 << 64)
+        _inverse_powers = np.cumprod(np.concatenate([one, np.full(size - 1, inverse, dtype=np.uint64)]), dtype=np.uint64)
+    return _powers[:n], _inverse_powers[:n]
+
+
+def word_hashes(words: str) -> np.ndarray:
+    """
+    Hash each word of a string of words separated by single spaces to 64 bits.
+    """
+    data = np.frombuffer(words.encode("utf-8"), dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    powers, inverse_powers = _byte_powers(len(data))
+    spaces = np.flatnonzero(data == ord(" "))
+    starts = np.r_[0, spaces + 1]
+    ends = np.r_[spaces, len(data)]
+    # Polynomial hash of each word from prefix sums, shifted back to start at power 0.
+    prefix = np.r_[np.uint64(0), np.cumsum(data.astype(np.uint64) * powers, dtype=np.uint64)]
+    return _mix((prefix[ends] - prefix[starts]) * inverse_powers[starts] + (ends - starts).astype(np.uint64))
+
+
+def ngram_hashes(text: str, ngram_length: int = DEFAULT_NGRAM_LENGTH) -> np.ndarray:
+    """
+    Hash every word n-gram of a document to 64 bits, in order of position.
+    """
+    return _combine(word_hashes(" ".join(_WORD_RE.findall(text)).lower()), ngram_length)
+
+
+def _combine(hashes: np.ndarray, ngram_length: int) -> np.ndarray:
+    num_ngrams = len(hashes) - ngram_length + 1
+    if num_ngrams <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    combined = np.zeros(num_ngrams, dtype=np.uint64)
+    for i in range(ngram_length):
+        combined = combined * np.uint64(_WORD_BASE) + hashes[i:i + num_ngrams]
+    return _mix(combined)
+
+
+class NgramBloomFilter(BloomFilter):
+    """
+    Bloom filter of the hashes of word n-grams (see `bloom.BloomFilter`).
+
+    Args:
+        num_bits (int): Size of the bit array (rounded up to a multiple of 64).
+        num_hashes (int): Bits set per item.
+        ngram_length (int): Length in words of the indexed n-grams.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, ngram_length: int = DEFAULT_NGRAM_LENGTH):
+        super().__init__(num_bits, num_hashes)
+        self.ngram_length = ngram_length
+
+    def _metadata(self) -> dict:
+        return {**super()._metadata(), "ngram_length": self.ngram_length}
+
+
+def read_eval_texts(paths):
+    """
+    Yield the texts of evaluation files. Every string field of each JSONL record is
+    joined into one text (so n-grams spanning a question and its answer are indexed);
+    other files are read with `corpus.read_corpus`.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if not corpus.is_jsonl(path):
+            yield from corpus.read_corpus([path])
+            continue
+        with open_input(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield "\n".join(_strings(json.loads(line)))
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def build_index(
+    texts,
+    ngram_length: int = DEFAULT_NGRAM_LENGTH,
+    false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+) -> NgramBloomFilter:
+    """
+    Build a Bloom filter of the n-gram hashes of the given evaluation texts.
+    """
+    with metrics.timer("decontaminate_build_index"):
+        hashes = [ngram_hashes(text, ngram_length) for text in texts]
+        hashes = np.unique(np.concatenate(hashes)) if hashes else np.zeros(0, dtype=np.uint64)
+        bloom = NgramBloomFilter.for_capacity(len(hashes), false_positive_rate, ngram_length=ngram_length)
+        bloom.add(hashes)
+    return bloom
+
+
+def contaminated_spans(text: str, index: NgramBloomFilter) -> list[tuple[int, int]]:
+    """
+    Find the character spans of a document covered by n-grams found in the index,
+    with overlapping and adjacent matches merged.
+    """
+    matches = list(_WORD_RE.finditer(text))
+    hashes = word_hashes(" ".join(match.group() for match in matches).lower())
+    found = index.contains(_combine(hashes, index.ngram_length))
+    if not found.any():
+        return []
+    # Count the matched n-grams covering each word.
+    counts = np.zeros(len(matches) + 1, dtype=np.int64)
+    starts = np.flatnonzero(found)
+    np.add.at(counts, starts, 1)
+    np.add.at(counts, starts + index.ngram_length, -1)
+    covered = np.r_[False, np.cumsum(counts[:-1]) > 0, False]
+    edges = np.flatnonzero(covered[1:] != covered[:-1])
+    return [(matches[first].start(), matches[last - 1].end()) for first, last in zip(edges[::2], edges[1::2])]
+
+
+def _contaminated(texts: list[str], index: NgramBloomFilter) -> np.ndarray:
+    # Hash the words of a batch of documents at once, skipping n-grams that span two
+    # documents, and flag the documents with an n-gram in the index.
+    words = [_WORD_RE.findall(text) for text in texts]
+    counts = np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words))
+    hashes = word_hashes(" ".join(" ".join(w) for w in words if w).lower())
+    document = np.repeat(np.arange(len(texts)), counts)
+    combined = _combine(hashes, index.ngram_length)
+    starts = np.flatnonzero(document[:len(combined)] == document[index.ngram_length - 1:])
+    flagged = np.zeros(len(texts), dtype=bool)
+    flagged[document[starts[index.contains(combined[starts])]]] = True
+    return flagged
+
+
+def decontaminate(documents, index: NgramBloomFilter, mode: str = "drop", stats: dict | None = None, batch_size: int = 256):
+    """
+    Yield the documents that do not overlap the evaluation sets.
+
+    Args:
+        documents (iterable of str): Documents to check.
+        index (NgramBloomFilter): Evaluation n-gram index (see `build_index`).
+        mode (str): "drop" removes overlapping documents; "mask" cuts the overlapping
+            spans out of them (and drops documents left empty).
+        stats (dict, optional): Updated with the numbers of documents, contaminated
+            documents and removed characters.
+        batch_size (int): Documents checked per vectorized lookup.
+    """
+    if mode not in ("drop", "mask"):
+        raise ValueError(f"Unknown decontamination mode: {mode}")
+    stats = {} if stats is None else stats
+    for key in ("documents", "contaminated", "removed_chars"):
+        stats.setdefault(key, 0)
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        flagged = _contaminated(batch, index)
+        stats["documents"] += len(batch)
+        stats["contaminated"] += int(flagged.sum())
+        metrics.increment("decontaminate_contaminated_docs", int(flagged.sum()))
+        for text, is_contaminated in zip(batch, flagged.tolist()):
+            if not is_contaminated:
+                yield text
+                continue
+            if mode == "drop":
+                stats["removed_chars"] += len(text)
+                continue
+            pieces, position = [], 0
+            for start, end in contaminated_spans(text, index):
+                pieces.append(text[position:start])
+                stats["removed_chars"] += end - start
+                position = end
+            text = "".join(pieces) + text[position:]
+            if text.strip():
+                yield text
+
+
+def run_decontamination(input_paths, output_path, index_path, mode: str = "drop") -> dict:
+    """
+    Decontaminate corpus files against a saved index and write the result to a
+    corpus file (.docs or .jsonl(.gz)).
+
+    Returns:
+        The numbers of documents, contaminated documents and removed characters.
+    """
+    index = NgramBloomFilter.load(index_path)
+    stats = {}
+    with metrics.timer("decontaminate"):
+        corpus.write_corpus(output_path, decontaminate(corpus.read_corpus(input_paths), index, mode, stats))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Index the n-grams of evaluation files.")
+    build.add_argument("inputs", nargs="+", help="Evaluation files (JSONL records, corpora or plain text).")
+    build.add_argument("--output", required=True, help="Output index (.npz).")
+    build.add_argument("--ngram-length", type=int, default=DEFAULT_NGRAM_LENGTH)
+    build.add_argument("--false-positive-rate", type=float, default=DEFAULT_FALSE_POSITIVE_RATE)
+    filter_ = subparsers.add_parser("filter", help="Remove documents or spans that overlap the index.")
+    filter_.add_argument("inputs", nargs="+", help="Corpus files (see cs336_data.corpus).")
+    filter_.add_argument("--index", required=True)
+    filter_.add_argument("--output", required=True, help="Output .docs or .jsonl(.gz) file.")
+    filter_.add_argument("--mode", choices=["drop", "mask"], default="drop")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        bloom = build_index(read_eval_texts(args.inputs), args.ngram_length, args.false_positive_rate)
+        bloom.save(args.output)
+        print(json.dumps({
+            "ngrams": bloom.num_items,
+            "bytes": bloom.bits.nbytes,
+            "num_hashes": bloom.num_hashes,
+            "false_positive_rate": bloom.false_positive_rate(),
+        }))
+    else:
+        print(json.dumps(run_decontamination(args.inputs, args.output, args.index, args.mode)))
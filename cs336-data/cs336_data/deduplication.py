@@ -1,49 +1,301 @@
 import os
 import hashlib
+import logging
 import string
 import random
 import hashlib
 import unicodedata
 from collections import defaultdict
 from itertools import combinations
+import numpy as np
+from cs336_data import corpus, metrics
+from cs336_data.bloom import BloomFilter
+from cs336_data.checkpoint import ProgressManifest, hash_paths
+from cs336_data.readers import DEFAULT_IO_CONCURRENCY, FileWriter, map_files, read_files
 
-def exact_deduplication(input_paths, output_dir):
+logger = logging.getLogger(__name__)
+
+def exact_deduplication(
+    input_paths, output_dir, io_concurrency=DEFAULT_IO_CONCURRENCY, store=None, batch_id=None, memory_budget=None,
+):
     """
     Performs exact line deduplication across multiple input files.
+
+    Files are memory-mapped and processed as bytes: lines are split, stripped and
+    hashed without decoding, and kept lines are written from the bytes taken out of
+    the map. Lines, stripping and hashes are the same as for the decoded text.
     
     Args:
         input_paths (list): List of file paths to process.
         output_dir (str): Directory to save deduplicated files.
+        io_concurrency (int): Number of files mapped ahead or written concurrently.
+        store (LineHashStore, optional): Line counts of earlier batches (see
+            cs336_data.line_store). Lines seen before are removed too, and the
+            counts of this batch are added to the store once its files are written.
+        batch_id (str, optional): Recorded in `store`; a batch that was already
+            added raises ValueError instead of removing all of its lines.
+        memory_budget (int, optional): Count lines approximately in this many bytes
+            instead of exactly (see `approximate_line_deduplication`).
     
     Output:
         Writes deduplicated versions of input files into the output directory.
+
+    Returns:
+        A dict with the number of non-empty lines read (`lines`) and kept (`kept_lines`),
+        and `estimate`: None when counting exactly, and in approximate mode the
+        estimated false positive rates (see `approximate_line_deduplication`).
     """
+    if memory_budget is not None:
+        if store is not None:
+            raise ValueError("A line store cannot be used with approximate deduplication.")
+        return approximate_line_deduplication(input_paths, output_dir, memory_budget, io_concurrency)
+    if store is not None and batch_id is not None and store.has_batch(batch_id):
+        raise ValueError(f"Batch {batch_id} was already added to the line store.")
+
     # Dictionary to store hash counts
     line_counts = {}
 
     # First Pass: Count occurrences of each line using a hash
-    for file_path in input_paths:
-        with open(file_path, "r", encoding="utf-8") as file:
-            for line in file:
-                line = line.strip()
-                if line:  # Ignore empty lines
-                    line_hash = hashlib.md5(line.encode()).hexdigest()  # Fixed-size hash
-                    line_counts[line_hash] = line_counts.get(line_hash, 0) + 1
+    with metrics.timer("exact_dedup_count_pass"):
+        for _, buffer in map_files(input_paths, io_concurrency):
+            for line in stripped_lines(buffer):
+                h = line_hash(line)
+                line_counts[h] = line_counts.get(h, 0) + 1
+    metrics.increment("exact_dedup_files", len(input_paths))
+    metrics.increment("exact_dedup_unique_hashes", len(line_counts))
+    num_lines = sum(line_counts.values())
+
+    if store is not None:
+        hashes = list(line_counts)
+        keys = np.array(hashes, dtype="S16")
+        batch_counts = np.fromiter(line_counts.values(), dtype=np.int64, count=len(hashes))
+        # Only lines that occur once in the batch can be kept, so only those need a lookup.
+        single = np.flatnonzero(batch_counts == 1)
+        seen = single[store.counts(keys[single]) > 0]
+        for i in seen.tolist():
+            line_counts[hashes[i]] += 1
+        metrics.increment("exact_dedup_seen_in_store", len(seen))
 
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
     # Second Pass: Rewrite files, keeping only unique lines
-    for file_path in input_paths:
-        output_file = os.path.join(output_dir, os.path.basename(file_path))
-        
-        with open(file_path, "r", encoding="utf-8") as file, open(output_file, "w", encoding="utf-8") as out_file:
-            for line in file:
-                line = line.strip()
-                if line:
-                    line_hash = hashlib.md5(line.encode()).hexdigest()
-                    if line_counts[line_hash] == 1:  # Only write unique lines
-                        out_file.write(line + "\n")
+    num_kept = 0
+    with metrics.timer("exact_dedup_write_pass"), FileWriter(io_concurrency) as writer:
+        for file_path, buffer in map_files(input_paths, io_concurrency):
+            output_file = os.path.join(output_dir, os.path.basename(file_path))
+            kept = [line for line in stripped_lines(buffer) if line_counts[line_hash(line)] == 1]
+            num_kept += len(kept)
+            writer.write(output_file, b"".join(line + b"\n" for line in kept))
+
+    if store is not None:
+        store.add(keys, batch_counts, batch_id)
+    return {"lines": num_lines, "kept_lines": num_kept, "estimate": None}
+
+# Bits set per line in the approximate mode's Bloom filters, and the share of the
+# memory budget for the filter of lines seen at least once (most distinct lines
+# occur once, so the filter of repeated lines needs fewer bits).
+APPROXIMATE_NUM_HASHES = 4
+APPROXIMATE_SEEN_SHARE = 0.75
+# Line hashes added to the approximate filters at a time.
+APPROXIMATE_BATCH_LINES = 1 << 16
+
+def _line_hashes(lines):
+    # The first 8 bytes of each line's md5 digest, as uint64.
+    digests = b"".join(map(line_hash, lines))
+    return np.frombuffer(digests, dtype="<u8")[::2]
+
+def approximate_line_deduplication(input_paths, output_dir, memory_budget, io_concurrency=DEFAULT_IO_CONCURRENCY):
+    """
+    Line deduplication in constant memory: like `exact_deduplication`, but lines
+    seen more than once are tracked with a pair of Bloom filters (lines seen at
+    least once, and lines seen again) that together use `memory_budget` bytes.
+
+    Duplicated lines are always removed. A unique line is also removed, wrongly,
+    when either filter reports a false positive for it; the estimated rate of that
+    is returned and grows as the filters fill up, so size the budget at about 1-2
+    bytes per distinct line.
+
+    Args:
+        input_paths (list): List of file paths to process.
+        output_dir (str): Directory to save deduplicated files.
+        memory_budget (int): Total size in bytes of the two filters.
+        io_concurrency (int): Number of files mapped ahead or written concurrently.
+
+    Returns:
+        A dict like `exact_deduplication`'s, whose `estimate` holds the estimated
+        false positive rate of each filter and the estimated fraction of unique
+        lines that were removed (`unique_lines_removed`).
+    """
+    seen = BloomFilter.for_memory(int(memory_budget * APPROXIMATE_SEEN_SHARE), APPROXIMATE_NUM_HASHES)
+    repeated = BloomFilter.for_memory(int(memory_budget * (1 - APPROXIMATE_SEEN_SHARE)), APPROXIMATE_NUM_HASHES)
+
+    total_lines = total_kept = 0
+
+    def add_lines(lines):
+        hashes, counts = np.unique(_line_hashes(lines), return_counts=True)
+        found = seen.contains(hashes)
+        repeated.add(hashes[found | (counts > 1)])
+        seen.add(hashes[~found])
+
+    with metrics.timer("exact_dedup_count_pass"):
+        pending = []
+        for _, buffer in map_files(input_paths, io_concurrency):
+            for line in stripped_lines(buffer):
+                pending.append(line)
+                if len(pending) == APPROXIMATE_BATCH_LINES:
+                    add_lines(pending)
+                    pending = []
+        if pending:
+            add_lines(pending)
+    metrics.increment("exact_dedup_files", len(input_paths))
+
+    os.makedirs(output_dir, exist_ok=True)
+    def write_files(files):
+        nonlocal total_lines, total_kept
+        lines = [line for _, file_lines in files for line in file_lines]
+        keep = (~repeated.contains(_line_hashes(lines))).tolist()
+        total_lines += len(keep)
+        total_kept += sum(keep)
+        start = 0
+        for file_path, file_lines in files:
+            end = start + len(file_lines)
+            kept = (line + b"\n" for line, k in zip(file_lines, keep[start:end]) if k)
+            writer.write(os.path.join(output_dir, os.path.basename(file_path)), b"".join(kept))
+            start = end
+
+    with metrics.timer("exact_dedup_write_pass"), FileWriter(io_concurrency) as writer:
+        # Look up the lines of several files at once; a single larger file is
+        # looked up on its own.
+        pending, num_lines = [], 0
+        for file_path, buffer in map_files(input_paths, io_concurrency):
+            pending.append((file_path, list(stripped_lines(buffer))))
+            num_lines += len(pending[-1][1])
+            if num_lines >= APPROXIMATE_BATCH_LINES:
+                write_files(pending)
+                pending, num_lines = [], 0
+        if pending:
+            write_files(pending)
+
+    seen_rate, repeated_rate = seen.false_positive_rate(), repeated.false_positive_rate()
+    estimate = {
+        "seen_false_positive_rate": seen_rate,
+        "repeated_false_positive_rate": repeated_rate,
+        "unique_lines_removed": 1 - (1 - seen_rate) * (1 - repeated_rate),
+    }
+    return {"lines": total_lines, "kept_lines": total_kept, "estimate": estimate}
+
+# Bytes scanned at a time from a memory-mapped file.
+LINE_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Whitespace to str.strip but not to bytes.strip, besides non-ASCII characters.
+_TEXT_ONLY_WHITESPACE = frozenset(b"\x1c\x1d\x1e\x1f")
+
+def _line_chunks(buffer):
+    # Slice the buffer at newlines into chunks of about LINE_CHUNK_SIZE bytes. A \r\n
+    # cut in two only adds an empty line, which is skipped anyway.
+    chunk_size = LINE_CHUNK_SIZE
+    start = 0
+    while len(buffer) - start > chunk_size:
+        end = max(buffer.rfind(b"\n", start, start + chunk_size), buffer.rfind(b"\r", start, start + chunk_size)) + 1
+        if end <= start:
+            # A line longer than a chunk: extend the chunk to the end of the line.
+            ends = [i for i in (buffer.find(b"\n", start), buffer.find(b"\r", start)) if i >= 0]
+            end = min(ends) + 1 if ends else len(buffer)
+        yield buffer[start:end]
+        start = end
+    yield buffer[start:]
+
+def stripped_lines(buffer):
+    """
+    Yield the non-empty lines of a UTF-8 byte buffer (e.g. a memory map), stripped
+    exactly as `str.strip` strips the decoded lines.
+
+    Lines are split on universal newlines (\n, \r and \r\n) like text-mode file
+    iteration, and are decoded only when an edge byte could belong to whitespace
+    that `bytes.strip` does not remove.
+    """
+    for chunk in _line_chunks(buffer):
+        lines = chunk.splitlines()
+        if chunk.isascii() and not any(bytes([c]) in chunk for c in _TEXT_ONLY_WHITESPACE):
+            yield from filter(None, map(bytes.strip, lines))
+            continue
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] >= 0x80 or line[-1] >= 0x80 or line[0] in _TEXT_ONLY_WHITESPACE or line[-1] in _TEXT_ONLY_WHITESPACE:
+                line = line.decode("utf-8").strip().encode("utf-8")
+                if not line:
+                    continue
+            yield line
+
+def exact_deduplicate_corpus(input_paths, output_path):
+    """
+    Exact line deduplication over packed or JSONL corpora (see cs336_data.corpus).
+
+    Args:
+        input_paths (str or list): Corpus file(s) to deduplicate together.
+        output_path (str): Output corpus file (.docs or .jsonl(.gz)). Document ids are
+            preserved: a document whose lines were all removed is written empty.
+
+    Returns:
+        The number of documents written.
+    """
+    with metrics.timer("exact_dedup_count_pass"):
+        line_counts = count_line_hashes(corpus.read_corpus(input_paths))
+    metrics.increment("exact_dedup_unique_hashes", len(line_counts))
+    with metrics.timer("exact_dedup_write_pass"):
+        documents = (remove_duplicate_lines(document, line_counts) for document in corpus.read_corpus(input_paths))
+        return corpus.write_corpus(output_path, documents)
+
+def line_hash(line):
+    """
+    Fixed-size hash of a stripped line, as used for line deduplication: the 16-byte
+    md5 digest of its UTF-8 encoding, so str and bytes lines hash alike.
+    """
+    if isinstance(line, str):
+        line = line.encode()
+    return hashlib.md5(line).digest()
+
+def split_lines(document):
+    """
+    Split a document into lines the way text-mode file iteration does (universal newlines).
+    """
+    return document.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+def count_line_hashes(documents, line_counts=None):
+    """
+    Count the occurrences of each non-empty stripped line across documents.
+
+    Args:
+        documents (iterable of str): Document contents.
+        line_counts (dict, optional): Existing counts to add to.
+
+    Returns:
+        A dict mapping line hashes to their number of occurrences.
+    """
+    if line_counts is None:
+        line_counts = {}
+    for document in documents:
+        for line in split_lines(document):
+            line = line.strip()
+            if line:
+                h = line_hash(line)
+                line_counts[h] = line_counts.get(h, 0) + 1
+    return line_counts
+
+def remove_duplicate_lines(document, line_counts):
+    """
+    Keep only the lines of `document` that occur exactly once according to `line_counts`,
+    with the same output format as `exact_deduplication`.
+    """
+    kept = []
+    for line in split_lines(document):
+        line = line.strip()
+        if line and line_counts[line_hash(line)] == 1:
+            kept.append(line + "\n")
+    return "".join(kept)
 
 # Union-Find data structure for clustering duplicates.
 class UnionFind:
@@ -107,6 +359,12 @@ def compute_minhash_signature(ngrams, num_hashes):
         signature.append(min_hash)
     return signature
 
+def compute_signatures(texts, num_hashes, ngram_length):
+    """
+    Compute the MinHash signature of each document's normalized word n-grams.
+    """
+    return [compute_minhash_signature(get_ngrams(normalize_text(text), ngram_length), num_hashes) for text in texts]
+
 def jaccard_similarity(set1, set2):
     """
     Compute the Jaccard similarity between two sets.
@@ -115,48 +373,198 @@ def jaccard_similarity(set1, set2):
         return 1.0
     return len(set1 & set2) / len(set1 | set2)
 
-def run_minhash_deduplication(input_paths, num_hashes, num_bands, ngram_length, output_dir, jaccard_threshold=0.8):
+# Upper bound on the signature length when the LSH parameters are chosen automatically.
+DEFAULT_MAX_HASHES = 128
+
+def lsh_candidate_probability(similarity, num_bands, rows_per_band):
     """
-    Performs fuzzy document deduplication using MinHash and LSH.
-    
+    Probability that two documents with the given Jaccard similarity share at least
+    one LSH bucket: the S-curve 1 - (1 - s^r)^b.
+    """
+    return 1 - (1 - similarity ** rows_per_band) ** num_bands
+
+def choose_lsh_parameters(
+    jaccard_threshold, max_hashes=DEFAULT_MAX_HASHES, false_negative_weight=0.5, false_positive_weight=0.5,
+    num_bands=None,
+):
+    """
+    Choose the LSH bands and rows whose S-curve best approximates a step at
+    `jaccard_threshold`.
+
+    The false-positive error is the area under the S-curve below the threshold (pairs
+    that become candidates but are then rejected by verification), the false-negative
+    error the area above it that the curve misses (duplicates that are never
+    compared). The parameters minimize their weighted sum; among equally good
+    choices the one with the fewest hashes wins.
+
     Args:
-        input_paths (list): List of file paths (each file is one document).
-        num_hashes (int): Number of hash functions to compute the MinHash signature.
-        num_bands (int): Number of bands to use in LSH (must evenly divide num_hashes).
-        ngram_length (int): n-gram length (in words) to use.
-        output_dir (str): Directory to write deduplicated documents.
-        jaccard_threshold (float): Candidate pair similarity threshold.
-    
-    Writes:
-        For each retained document, writes its original contents (unchanged)
-        to the output directory with the same file name.
+        jaccard_threshold (float): Target similarity threshold.
+        max_hashes (int): Maximum signature length (bands * rows).
+        false_negative_weight (float): Weight of missed duplicates.
+        false_positive_weight (float): Weight of extra verification work.
+        num_bands (int, optional): Only choose the number of rows for this many bands.
+
+    Returns:
+        A dict with num_hashes, num_bands, rows_per_band, the false_positive and
+        false_negative errors, and the effective threshold (1/b)^(1/r) where the
+        S-curve is steepest.
     """
+    similarity = np.linspace(0, 1, 1001)
+    below = similarity < jaccard_threshold
+    best = None
+    for b in [num_bands] if num_bands else range(1, max_hashes + 1):
+        for r in range(1, max_hashes // b + 1):
+            false_positive, false_negative = _lsh_errors(similarity, below, b, r)
+            error = false_negative_weight * false_negative + false_positive_weight * false_positive
+            if best is None or error < best[0] - 1e-9 or (error < best[0] + 1e-9 and b * r < best[1] * best[2]):
+                best = (error, b, r, false_positive, false_negative)
+    _, b, r, false_positive, false_negative = best
+    return _lsh_summary(b, r, false_positive, false_negative)
+
+def _lsh_errors(similarity, below, num_bands, rows_per_band):
+    # Areas under the S-curve below the threshold and above it up to 1, on a grid of similarities.
+    probability = lsh_candidate_probability(similarity, num_bands, rows_per_band)
+    false_positive = probability[below].sum() / (len(similarity) - 1)
+    false_negative = (1 - probability[~below]).sum() / (len(similarity) - 1)
+    return false_positive, false_negative
+
+def _lsh_summary(num_bands, rows_per_band, false_positive, false_negative):
+    return {
+        "num_hashes": num_bands * rows_per_band,
+        "num_bands": num_bands,
+        "rows_per_band": rows_per_band,
+        "false_positive": float(false_positive),
+        "false_negative": float(false_negative),
+        "threshold": (1 / num_bands) ** (1 / rows_per_band),
+    }
+
+def resolve_lsh_parameters(num_hashes, num_bands, jaccard_threshold, false_negative_weight=0.5, false_positive_weight=0.5):
+    """
+    Fill in `num_hashes` and/or `num_bands` when they are None (see
+    `choose_lsh_parameters`; a given `num_hashes` is the maximum signature length),
+    and check that the bands evenly divide the signature.
+
+    Returns:
+        A dict like `choose_lsh_parameters`', describing the resolved parameters.
+    """
+    if num_hashes is None or num_bands is None:
+        return choose_lsh_parameters(
+            jaccard_threshold, num_hashes or DEFAULT_MAX_HASHES, false_negative_weight, false_positive_weight, num_bands
+        )
     if num_hashes % num_bands != 0:
         raise ValueError("num_hashes must be evenly divisible by num_bands.")
+    similarity = np.linspace(0, 1, 1001)
     rows_per_band = num_hashes // num_bands
-    
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Load and normalize documents.
-    docs = []
-    norm_docs = []
-    ngram_sets = []
-    for path in input_paths:
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-            docs.append(text)
-            norm_text = normalize_text(text)
-            norm_docs.append(norm_text)
-            ngram_sets.append(get_ngrams(norm_text, ngram_length))
-    
-    num_docs = len(docs)
-    
+    return _lsh_summary(num_bands, rows_per_band, *_lsh_errors(similarity, similarity < jaccard_threshold, num_bands, rows_per_band))
+
+def estimate_candidate_pairs(signatures, num_bands, rows_per_band, sample_size=10000, seed=0):
+    """
+    Estimate how many candidate pairs LSH will send to verification, from the
+    MinHash-estimated similarity of a random sample of document pairs (or of all
+    pairs, if there are at most `sample_size`).
+    """
+    num_docs = len(signatures)
+    total_pairs = num_docs * (num_docs - 1) // 2
+    if total_pairs == 0:
+        return 0.0
+    rng = random.Random(seed)
+    num_hashes = num_bands * rows_per_band
+    if total_pairs <= sample_size:
+        pairs = combinations(range(num_docs), 2)
+    else:
+        pairs = (rng.sample(range(num_docs), 2) for _ in range(sample_size))
+    probabilities = []
+    for i, j in pairs:
+        similarity = sum(a == b for a, b in zip(signatures[i][:num_hashes], signatures[j][:num_hashes])) / num_hashes
+        probabilities.append(lsh_candidate_probability(similarity, num_bands, rows_per_band))
+    return total_pairs * sum(probabilities) / len(probabilities)
+
+def minhash_deduplicate(
+    texts, num_hashes=None, num_bands=None, ngram_length=5, jaccard_threshold=0.8, signatures=None,
+    false_negative_weight=0.5, false_positive_weight=0.5, estimate_candidates=None,
+):
+    """
+    Find the documents to keep after fuzzy deduplication with MinHash and LSH.
+
+    See `minhash_deduplication_stats` for the same with a summary of the LSH
+    parameters and the candidate pairs.
+
+    Args:
+        texts (list of str): Document contents.
+        num_hashes (int, optional): Number of hash functions to compute the MinHash
+            signature (if num_bands is None, the maximum signature length).
+        num_bands (int, optional): Number of bands to use in LSH (must evenly divide
+            num_hashes). If either is None, they are chosen from the S-curve with
+            `choose_lsh_parameters`.
+        ngram_length (int): n-gram length (in words) to use.
+        jaccard_threshold (float): Candidate pair similarity threshold.
+        signatures (list, optional): Precomputed signatures (see `compute_signatures`);
+            only the documents in candidate pairs are then read from `texts`.
+        false_negative_weight, false_positive_weight (float): Trade-off between missed
+            duplicates and verification work used to choose the LSH parameters.
+        estimate_candidates (bool, optional): Estimate the number of candidate pairs
+            (see `estimate_candidate_pairs`). By default, only when the LSH parameters
+            are chosen automatically.
+
+    Returns:
+        The set of indices into `texts` of the retained documents (one per cluster
+        of near-duplicates).
+    """
+    kept_docs, _ = minhash_deduplication_stats(
+        texts, num_hashes, num_bands, ngram_length, jaccard_threshold, signatures,
+        false_negative_weight, false_positive_weight, estimate_candidates,
+    )
+    return kept_docs
+
+def minhash_deduplication_stats(
+    texts, num_hashes=None, num_bands=None, ngram_length=5, jaccard_threshold=0.8, signatures=None,
+    false_negative_weight=0.5, false_positive_weight=0.5, estimate_candidates=None,
+):
+    """
+    Like `minhash_deduplicate` (which see for the arguments), also describing the run.
+
+    Returns:
+        (kept_docs, stats), with the set of retained document indices and a dict with
+        the resolved LSH parameters (as in `choose_lsh_parameters`), `documents`,
+        `kept`, `candidate_pairs` (found by LSH) and `expected_candidate_pairs` (the
+        estimate made before bucketing, or None if it was not made). The estimate is
+        also recorded as the `minhash_expected_candidate_pairs` gauge.
+    """
+    if estimate_candidates is None:
+        estimate_candidates = num_hashes is None or num_bands is None
+    lsh = resolve_lsh_parameters(num_hashes, num_bands, jaccard_threshold, false_negative_weight, false_positive_weight)
+    num_hashes, num_bands, rows_per_band = lsh["num_hashes"], lsh["num_bands"], lsh["rows_per_band"]
+
+    # Normalized n-grams by document; with precomputed signatures, only those of
+    # the documents in candidate pairs are computed.
+    ngram_sets = {}
+
+    def ngrams(doc_id):
+        if doc_id not in ngram_sets:
+            ngram_sets[doc_id] = get_ngrams(normalize_text(texts[doc_id]), ngram_length)
+        return ngram_sets[doc_id]
+
     # Compute minhash signatures for each document.
-    signatures = []
-    for ng_set in ngram_sets:
-        sig = compute_minhash_signature(ng_set, num_hashes)
-        signatures.append(sig)
-    
+    if signatures is None:
+        with metrics.timer("minhash_normalize"):
+            for doc_id in range(len(texts)):
+                ngrams(doc_id)
+        signatures = []
+        with metrics.timer("minhash_signatures"):
+            for doc_id in range(len(texts)):
+                sig = compute_minhash_signature(ngram_sets[doc_id], num_hashes)
+                signatures.append(sig)
+
+    num_docs = len(signatures)
+    metrics.increment("minhash_docs", num_docs)
+
+    expected_pairs = None
+    if estimate_candidates:
+        # Lets the verification cost of the chosen parameters be checked against
+        # the candidate pairs actually found.
+        expected_pairs = estimate_candidate_pairs(signatures, num_bands, rows_per_band)
+        metrics.set_gauge("minhash_expected_candidate_pairs", expected_pairs)
+
     # LSH: For each band, bucket documents by the band signature.
     buckets = defaultdict(list)
     for doc_id, sig in enumerate(signatures):
@@ -165,41 +573,181 @@ def run_minhash_deduplication(input_paths, num_hashes, num_bands, ngram_length,
             end = start + rows_per_band
             band_tuple = tuple(sig[start:end])
             buckets[(b, band_tuple)].append(doc_id)
-    
+
     # Collect candidate duplicate pairs.
     candidate_pairs = set()
     for bucket_docs in buckets.values():
         if len(bucket_docs) > 1:
             for i, j in combinations(bucket_docs, 2):
                 candidate_pairs.add(tuple(sorted((i, j))))
-    
+
+    metrics.increment("minhash_candidate_pairs", len(candidate_pairs))
+
     # Use union-find to cluster duplicates.
     uf = UnionFind(num_docs)
-    for i, j in candidate_pairs:
-        # Compute true Jaccard similarity between the n-gram sets.
-        sim = jaccard_similarity(ngram_sets[i], ngram_sets[j])
-        if sim >= jaccard_threshold:
-            uf.union(i, j)
-    
+    with metrics.timer("minhash_verify"):
+        for i, j in candidate_pairs:
+            # Compute true Jaccard similarity between the n-gram sets.
+            sim = jaccard_similarity(ngrams(i), ngrams(j))
+            if sim >= jaccard_threshold:
+                uf.union(i, j)
+
     # Determine which document to retain from each cluster.
     clusters = defaultdict(list)
     for doc_id in range(num_docs):
         parent = uf.find(doc_id)
         clusters[parent].append(doc_id)
-    
+
     # Randomly select one representative from each cluster.
     kept_docs = set()
     for cluster in clusters.values():
         chosen = random.choice(cluster)
         kept_docs.add(chosen)
+    metrics.increment("minhash_duplicates_removed", num_docs - len(kept_docs))
+    stats = {
+        **lsh,
+        "documents": num_docs,
+        "kept": len(kept_docs),
+        "candidate_pairs": len(candidate_pairs),
+        "expected_candidate_pairs": expected_pairs,
+    }
+    return kept_docs, stats
+
+def run_minhash_deduplication(
+    input_paths, num_hashes, num_bands, ngram_length, output_dir, jaccard_threshold=0.8,
+    checkpoint_dir=None, checkpoint_every=1000, io_concurrency=DEFAULT_IO_CONCURRENCY,
+    false_negative_weight=0.5, false_positive_weight=0.5,
+):
+    """
+    Performs fuzzy document deduplication using MinHash and LSH.
+
+    With `checkpoint_dir`, signatures are saved every `checkpoint_every` documents
+    and the chosen documents once clustering is done, so a rerun after a crash
+    only computes the signatures that are missing.
     
+    Args:
+        input_paths (list): List of file paths (each file is one document).
+        num_hashes (int or None): Number of hash functions to compute the MinHash signature.
+        num_bands (int or None): Number of bands to use in LSH (must evenly divide
+            num_hashes). Pass None for either to choose them from `jaccard_threshold`
+            and the false-negative/false-positive weights (see `choose_lsh_parameters`).
+        ngram_length (int): n-gram length (in words) to use.
+        output_dir (str): Directory to write deduplicated documents.
+        jaccard_threshold (float): Candidate pair similarity threshold.
+        checkpoint_dir (str, optional): Directory for the progress manifest and saved
+            signatures used to resume an interrupted run.
+        checkpoint_every (int): Number of documents per signature checkpoint.
+        io_concurrency (int): Number of files read or written concurrently.
+        false_negative_weight, false_positive_weight (float): Trade-off used when the
+            LSH parameters are chosen automatically.
+    
+    Writes:
+        For each retained document, writes its original contents (unchanged)
+        to the output directory with the same file name.
+
+    Returns:
+        The stats of `minhash_deduplication_stats` (also logged), including the
+        expected and actual numbers of candidate pairs.
+    """
+    lsh = resolve_lsh_parameters(num_hashes, num_bands, jaccard_threshold, false_negative_weight, false_positive_weight)
+    num_hashes, num_bands = lsh["num_hashes"], lsh["num_bands"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    docs = _DocumentFiles(input_paths, io_concurrency)
+
+    if checkpoint_dir is None:
+        with metrics.timer("minhash_load"):
+            docs.load(range(len(input_paths)))
+        kept_docs, stats = minhash_deduplication_stats(
+            docs, num_hashes, num_bands, ngram_length, jaccard_threshold, estimate_candidates=True
+        )
+    else:
+        progress = ProgressManifest(checkpoint_dir, config={
+            "inputs": hash_paths(input_paths),
+            "num_hashes": num_hashes,
+            "num_bands": num_bands,
+            "ngram_length": ngram_length,
+            "jaccard_threshold": jaccard_threshold,
+        })
+        # Documents are only read for the work that is left: the signatures that
+        # were not saved, the candidate pairs and the documents to write.
+        if progress.done("kept"):
+            kept_docs = progress.load_state("kept")
+            stats = progress.info("kept").get("stats")
+        else:
+            signatures = []
+            with metrics.timer("minhash_signatures"):
+                for start in range(0, len(input_paths), checkpoint_every):
+                    key = f"signatures:{start}"
+                    if progress.done(key):
+                        signatures.extend(progress.load_state(key))
+                        continue
+                    chunk_ids = range(start, min(start + checkpoint_every, len(input_paths)))
+                    with metrics.timer("minhash_load"):
+                        docs.load(chunk_ids)
+                    chunk = compute_signatures([docs[i] for i in chunk_ids], num_hashes, ngram_length)
+                    progress.commit(key, info={"documents": len(chunk)}, state=chunk)
+                    signatures.extend(chunk)
+            kept_docs, stats = minhash_deduplication_stats(
+                docs, num_hashes, num_bands, ngram_length, jaccard_threshold, signatures=signatures,
+                estimate_candidates=True,
+            )
+            # Save the choice of cluster representatives, so an interrupted write
+            # pass is redone with the same documents.
+            progress.commit("kept", info={"documents": len(kept_docs), "stats": stats}, state=kept_docs)
+    logger.info("MinHash deduplication: %s", stats)
+
     # Write out retained documents to the output directory.
     # For each input path, if its corresponding document is retained, write it.
-    for i, path in enumerate(input_paths):
-        filename = os.path.basename(path)
-        output_path = os.path.join(output_dir, filename)
-        if i in kept_docs:
-            with open(output_path, "w", encoding="utf-8") as out_f:
-                out_f.write(docs[i])
-        else:
-            pass
+    with metrics.timer("minhash_load"):
+        docs.load(sorted(kept_docs))
+    with FileWriter(io_concurrency, atomic=True) as writer:
+        for i, path in enumerate(input_paths):
+            filename = os.path.basename(path)
+            output_path = os.path.join(output_dir, filename)
+            if i in kept_docs:
+                writer.write(output_path, docs[i])
+    return stats
+
+class _DocumentFiles:
+    """
+    The documents of `run_minhash_deduplication`, indexed like its input paths and
+    read on first access (or ahead of time, concurrently, with `load`).
+    """
+
+    def __init__(self, paths, io_concurrency):
+        self.paths = list(paths)
+        self.io_concurrency = io_concurrency
+        self.documents = {}
+
+    def load(self, doc_ids):
+        doc_ids = [i for i in doc_ids if i not in self.documents]
+        documents = read_files([self.paths[i] for i in doc_ids], io_concurrency=self.io_concurrency)
+        for i, (_, document) in zip(doc_ids, documents):
+            self.documents[i] = document
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, doc_id):
+        if doc_id not in self.documents:
+            self.load([doc_id])
+        return self.documents[doc_id]
+
+def minhash_deduplicate_corpus(input_paths, output_path, num_hashes, num_bands, ngram_length, jaccard_threshold=0.8):
+    """
+    Fuzzy document deduplication with MinHash and LSH over packed or JSONL corpora.
+
+    Args:
+        input_paths (str or list): Corpus file(s) to deduplicate together.
+        output_path (str): Output corpus file (.docs or .jsonl(.gz)) for the retained
+            documents, in their original order.
+        num_hashes, num_bands, ngram_length, jaccard_threshold: See `minhash_deduplicate`.
+
+    Returns:
+        The number of documents written.
+    """
+    with metrics.timer("minhash_load"):
+        docs = list(corpus.read_corpus(input_paths))
+    kept_docs = minhash_deduplicate(docs, num_hashes, num_bands, ngram_length, jaccard_threshold)
+    return corpus.write_corpus(output_path, (doc for i, doc in enumerate(docs) if i in kept_docs))
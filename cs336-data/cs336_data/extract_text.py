@@ -1,8 +1,13 @@
-import resiliparse.parse
-import resiliparse.extract.html2text
+from cs336_data import metrics
+from cs336_data.lazy import lazy_import
 
+encoding_detection = lazy_import("resiliparse.parse.encoding")
+html2text = lazy_import("resiliparse.extract.html2text")
+
+@metrics.timed("extract_text")
 def extract_text(html_bytes: bytes):
-    encoding = resiliparse.parse.encoding.detect_encoding(html_bytes)
+    metrics.increment("extract_text_bytes", len(html_bytes))
+    encoding = encoding_detection.detect_encoding(html_bytes)
     # Add error handling to the decode operation
     html_str = html_bytes.decode(encoding, errors='replace')
-    return resiliparse.extract.html2text.extract_plain_text(html_str)
+    return html2text.extract_plain_text(html_str)
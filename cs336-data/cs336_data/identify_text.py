@@ -1,48 +1,147 @@
-import fasttext
-fasttext.FastText.eprint = lambda x: None
-import regex as re
-
-def identify_language(text: str):
-    model = fasttext.load_model("models/lid.176.bin")
-    text = text.replace("\n", "")
-    pred = model.predict(text)
-    label = pred[0][0]
-    label = label.replace("__label__", "")
-    t = tuple((label, pred[1][0]))
-    return t
+from cs336_data import metrics
+from cs336_data.lazy import lazy_import
 
+def _silence_warnings(module):
+    module.FastText.eprint = lambda x: None
+
+fasttext = lazy_import("fasttext", on_import=_silence_warnings)
+re = lazy_import("regex")
+
+LANGUAGE_MODEL_PATH = "models/lid.176.bin"
+NSFW_MODEL_PATH = "models/jigsaw_fasttext_bigrams_nsfw_final.bin"
+HATESPEECH_MODEL_PATH = "models/jigsaw_fasttext_bigrams_hatespeech_final.bin"
+
+# Models are loaded once per process and shared by all calls (and, when loaded
+# before forking, by all worker processes; see cs336_data.workers).
+_models = {}
+
+def load_model(model_path: str):
+    model = _models.get(model_path)
+    if model is None:
+        model = _models[model_path] = fasttext.load_model(model_path)
+    return model
+
+SAMPLING_POLICIES = ("full", "head", "head_tail", "windows")
+
+class SamplingPolicy:
+    """
+    Which parts of a long document the classifiers read, bounding the work per document.
+
+    Documents of at most `max_chars` characters are always read in full. Longer ones
+    are read according to `policy`:
+
+    - "full": the whole document.
+    - "head": the first `max_chars` characters.
+    - "head_tail": the first and the last `max_chars / 2` characters.
+    - "windows": `num_windows` evenly spaced windows of `max_chars / num_windows` characters.
+
+    Samples are cut at whitespace, so no partial words are classified; text without
+    whitespace inside a sample (e.g. Chinese or Japanese) is cut at characters. With
+    `aggregate="concat"` the samples are joined and classified once; with "mean" each
+    sample is classified and the label probabilities are averaged.
+    """
+
+    def __init__(self, policy: str = "full", max_chars: int = 1000, num_windows: int = 4, aggregate: str = "concat"):
+        if policy not in SAMPLING_POLICIES:
+            raise ValueError(f"Unknown sampling policy: {policy}")
+        if aggregate not in ("concat", "mean"):
+            raise ValueError(f"Unknown sampling aggregate: {aggregate}")
+        self.policy = policy
+        self.max_chars = max_chars
+        self.num_windows = num_windows
+        self.aggregate = aggregate
+
+    def to_dict(self) -> dict:
+        return {"policy": self.policy, "max_chars": self.max_chars, "num_windows": self.num_windows, "aggregate": self.aggregate}
+
+    def samples(self, text: str) -> list[str]:
+        if self.policy == "full" or len(text) <= self.max_chars:
+            return [text]
+        if self.policy == "head":
+            return [_window(text, 0, self.max_chars)]
+        if self.policy == "head_tail":
+            half = self.max_chars // 2
+            return [_window(text, 0, half), _window(text, len(text) - half, len(text))]
+        size = self.max_chars // self.num_windows
+        step = (len(text) - size) / max(self.num_windows - 1, 1)
+        return [_window(text, round(i * step), round(i * step) + size) for i in range(self.num_windows)]
+
+def _window(text: str, start: int, end: int) -> str:
+    # Drops the words cut by the window's edges. Without whitespace to cut at, the
+    # window is kept as a plain character cut.
+    window = text[start:end]
+    if start > 0 and not text[start - 1].isspace() and not window[:1].isspace():
+        parts = window.split(None, 1)
+        if len(parts) > 1:
+            window = parts[1]
+    if end < len(text) and not text[end].isspace() and not window[-1:].isspace():
+        parts = window.rsplit(None, 1)
+        if len(parts) > 1:
+            window = parts[0]
+    return window
+
+# Used when no policy is passed to the classifiers; see `set_sampling`.
+_sampling = SamplingPolicy()
+
+def set_sampling(sampling: SamplingPolicy) -> None:
+    """
+    Set the sampling policy of this process (inherited by worker processes forked later).
+    """
+    global _sampling
+    _sampling = sampling
+
+def get_sampling() -> SamplingPolicy:
+    """
+    The sampling policy of this process (see `set_sampling`).
+    """
+    return _sampling
+
+def _predict(model, text: str, sampling: SamplingPolicy | None):
+    sampling = sampling or _sampling
+    samples = sampling.samples(text)
+    if len(samples) == 1 or sampling.aggregate == "concat":
+        pred = model.predict(" ".join(samples).replace("\n", ""))
+        return pred[0][0].replace("__label__", ""), pred[1][0]
+    labels, probs = model.predict([sample.replace("\n", "") for sample in samples], k=-1)
+    totals = {}
+    for sample_labels, sample_probs in zip(labels, probs):
+        for label, prob in zip(sample_labels, sample_probs):
+            totals[label] = totals.get(label, 0.0) + float(prob)
+    label = max(totals, key=totals.get)
+    return label.replace("__label__", ""), totals[label] / len(samples)
+
+@metrics.timed("identify_language")
+def identify_language(text: str, sampling: SamplingPolicy | None = None):
+    model = load_model(LANGUAGE_MODEL_PATH)
+    return _predict(model, text, sampling)
+
+@metrics.timed("mask_email")
 def mask_email(text: str):
     PAT = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
     res = re.subn(PAT, "|||EMAIL_ADDRESS|||", text)
     return res
 
+@metrics.timed("mask_phone_num")
 def mask_phone_num(text: str):
     PAT = re.compile(r"(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
     res = re.subn(PAT, "|||PHONE_NUMBER|||",text)
     return res
 
+@metrics.timed("mask_ip")
 def mask_ip(text: str):
     PAT = re.compile(r"((25[0-5]|(2[0-4]|1\d|[1-9]|)\d)\.?\b){4}")
     res = re.subn(PAT, "|||IP_ADDRESS|||", text)
     return res
 
-def identify_nsfw(text: str):
-    model = fasttext.load_model("models/jigsaw_fasttext_bigrams_nsfw_final.bin")
-    text = text.replace("\n", "")
-    pred = model.predict(text)
-    label = pred[0][0]
-    label = label.replace("__label__", "")
-    t = tuple((label, pred[1][0]))
-    return t
-
-def identify_hatespeech(text: str):
-    model = fasttext.load_model("models/jigsaw_fasttext_bigrams_hatespeech_final.bin")
-    text = text.replace("\n", "")
-    pred = model.predict(text)
-    label = pred[0][0]
-    label = label.replace("__label__", "")
-    t = tuple((label, pred[1][0]))
-    return t
+@metrics.timed("identify_nsfw")
+def identify_nsfw(text: str, sampling: SamplingPolicy | None = None):
+    model = load_model(NSFW_MODEL_PATH)
+    return _predict(model, text, sampling)
+
+@metrics.timed("identify_hatespeech")
+def identify_hatespeech(text: str, sampling: SamplingPolicy | None = None):
+    model = load_model(HATESPEECH_MODEL_PATH)
+    return _predict(model, text, sampling)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+"""
+Deferred imports of heavy dependencies.
+
+`fasttext = lazy_import("fasttext")` binds a placeholder module that imports the real
+one on first attribute access. Importing a cs336_data module then stays fast for
+CLIs and short-lived worker processes that never classify, parse HTML or read WARC
+files, while code using the module is unchanged. Compare with:
+
+```
+python -X importtime -c "import cs336_data.pipeline" 2>&1 | tail -1
+python -m cs336_data.benchmark --stages gopher --import-time
+```
+"""
+import importlib
+import threading
+import types
+
+_modules = {}
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder for a module that is imported on first attribute access.
+
+    After the import, the module's attributes are copied into the placeholder, so
+    later accesses are ordinary attribute lookups.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_hooks = []
+
+    def _load(self) -> types.ModuleType:
+        with _lock:
+            if self._lazy_module is None:
+                module = importlib.import_module(self.__name__)
+                for hook in self._lazy_hooks:
+                    hook(module)
+                self.__dict__.update(module.__dict__)
+                self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+
+def lazy_import(name: str, on_import=None) -> LazyModule:
+    """
+    Return a placeholder for the module `name` that imports it on first use.
+
+    Args:
+        name (str): Full module name (e.g. "resiliparse.extract.html2text").
+        on_import (callable, optional): Called with the real module once it is imported
+            (immediately if it already was through this function).
+
+    Returns:
+        The placeholder, shared by all callers asking for the same module.
+    """
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            module = _modules[name] = LazyModule(name)
+        if on_import is not None:
+            if module._lazy_module is not None:
+                on_import(module._lazy_module)
+            else:
+                module._lazy_hooks.append(on_import)
+    return module
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Persistent line-hash counts for exact line deduplication across crawl batches.
+
+`exact_deduplication(..., store=LineHashStore(path))` removes the lines of a new
+batch that occur more than once in the batch *or* occurred in any earlier batch
+deduplicated with the same store, and then adds the batch's counts to the store.
+The work per batch is proportional to the batch, not to everything seen before.
+
+Example:
+
+```
+python -m cs336_data.line_store dedup data/batch-0001/*.txt --store data/line-store --output-dir out/batch-0001
+python -m cs336_data.line_store info data/line-store
+```
+
+The store is a log-structured set of segments. Each batch is written as a new
+segment: a sorted array of 16-byte line hashes (`.keys.npy`) with their counts
+(`.counts.npy`), looked up by binary search on memory maps so only the pages that
+are touched are read. Once there are more than `max_segments`, a background thread
+merges the smallest ones, so lookups stay at a few binary searches per hash.
+
+`store.json` lists the live segments and is replaced atomically, so the store is
+consistent after a crash at any point; files of interrupted writes or merges are
+removed the next time the store is opened. Only one process may open a store at a
+time.
+"""
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data import metrics
+from cs336_data.checkpoint import atomic_write
+
+KEY_DTYPE = "S16"
+DEFAULT_MAX_SEGMENTS = 8
+
+
+class LineHashStore:
+    """
+    On-disk counts of 16-byte line hashes (md5 digests of stripped lines).
+
+    Args:
+        directory (str or Path): Store directory (created if missing).
+        max_segments (int): Merge segments once there are more than this many.
+        background (bool): Merge in a background thread (otherwise in `add`).
+    """
+
+    def __init__(self, directory: str | Path, max_segments: int = DEFAULT_MAX_SEGMENTS, background: bool = True):
+        self.directory = Path(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_segments = max_segments
+        self.background = background
+        self.path = self.directory / "store.json"
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._error = None
+        state = {"segments": [], "next_id": 0, "batches": []}
+        if self.path.exists():
+            with open(self.path) as f:
+                state = json.load(f)
+        self._next_id = state["next_id"]
+        self.batches = state["batches"]
+        self._segments = [self._open(name) for name in state["segments"]]
+        live = {f"{name}{suffix}" for name in state["segments"] for suffix in (".keys.npy", ".counts.npy")}
+        for path in [*self.directory.glob("segment-*"), *self.directory.glob(".segment-*.tmp.*")]:
+            if path.name not in live:
+                path.unlink()
+
+    def _open(self, name: str) -> dict:
+        return {
+            "name": name,
+            "keys": np.load(self.directory / f"{name}.keys.npy", mmap_mode="r"),
+            "counts": np.load(self.directory / f"{name}.counts.npy", mmap_mode="r"),
+        }
+
+    def _write_segment(self, keys: np.ndarray, counts: np.ndarray) -> dict:
+        with self._lock:
+            name = f"segment-{self._next_id:06d}"
+            self._next_id += 1
+        for suffix, array in ((".keys.npy", keys), (".counts.npy", counts)):
+            with atomic_write(self.directory / f"{name}{suffix}", "wb") as f:
+                np.save(f, array)
+        return self._open(name)
+
+    def _save_state(self) -> None:
+        # Called with the lock held.
+        state = {"segments": [s["name"] for s in self._segments], "next_id": self._next_id, "batches": self.batches}
+        with atomic_write(self.path) as f:
+            json.dump(state, f, indent=2)
+
+    def __len__(self) -> int:
+        """
+        Number of stored (hash, count) entries; a hash can be in several segments
+        until they are merged.
+        """
+        return sum(len(s["keys"]) for s in self._segments)
+
+    @property
+    def num_segments(self) -> int:
+        return len(self._segments)
+
+    def has_batch(self, batch_id: str) -> bool:
+        return batch_id in self.batches
+
+    def counts(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Look up the stored count of each hash (0 if it was never added).
+
+        Args:
+            keys (np.ndarray): 16-byte hashes (dtype "S16"), in any order.
+
+        Returns:
+            An int64 array of counts, aligned with `keys`.
+        """
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        totals = np.zeros(len(keys), dtype=np.int64)
+        with self._lock:
+            segments = list(self._segments)
+        with metrics.timer("line_store_lookup"):
+            for segment in segments:
+                if len(segment["keys"]) == 0:
+                    continue
+                positions = np.searchsorted(segment["keys"], keys)
+                found = positions < len(segment["keys"])
+                found[found] = segment["keys"][positions[found]] == keys[found]
+                totals[found] += segment["counts"][positions[found]]
+        return totals
+
+    def add(self, keys: np.ndarray, counts: np.ndarray, batch_id: str | None = None) -> None:
+        """
+        Add the counts of a batch as a new segment.
+
+        Args:
+            keys (np.ndarray): Distinct 16-byte hashes (dtype "S16").
+            counts (np.ndarray): Number of occurrences of each hash in the batch.
+            batch_id (str, optional): Recorded in the store (see `has_batch`), so a
+                rerun can tell whether a batch was already added.
+        """
+        self._raise_compaction_error()
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        order = np.argsort(keys, kind="stable")
+        segment = self._write_segment(keys[order], np.asarray(counts, dtype=np.int64)[order])
+        with self._lock:
+            self._segments.append(segment)
+            if batch_id is not None:
+                self.batches.append(batch_id)
+            self._save_state()
+        if len(self._segments) > self.max_segments:
+            self.compact(wait=not self.background)
+
+    def compact(self, wait: bool = True) -> None:
+        """
+        Merge the smallest segments until at most `max_segments / 2` remain (or all
+        of them into one with `max_segments` of 1 or less). Does nothing if a
+        background merge is already running.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            if wait:
+                self._compactor.join()
+                self._raise_compaction_error()
+            return
+        self._compactor = threading.Thread(target=self._compact, daemon=True)
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+            self._raise_compaction_error()
+
+    def _compact(self) -> None:
+        try:
+            with self._lock:
+                segments = sorted(self._segments, key=lambda s: len(s["keys"]))
+            target = max(1, self.max_segments // 2)
+            if len(segments) <= target:
+                return
+            merging = segments[:len(segments) - target + 1]
+            with metrics.timer("line_store_compact"):
+                keys = np.concatenate([s["keys"] for s in merging])
+                counts = np.concatenate([s["counts"] for s in merging])
+                order = np.argsort(keys, kind="stable")
+                keys, counts = keys[order], counts[order]
+                starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+                merged = self._write_segment(keys[starts], np.add.reduceat(counts, starts) if len(keys) else counts)
+            names = {s["name"] for s in merging}
+            with self._lock:
+                # Segments added meanwhile are kept; the merged one takes the place of
+                # the oldest merged segment.
+                first = min(i for i, s in enumerate(self._segments) if s["name"] in names)
+                self._segments = [s for s in self._segments if s["name"] not in names]
+                self._segments.insert(first, merged)
+                self._save_state()
+            for name in names:
+                for suffix in (".keys.npy", ".counts.npy"):
+                    (self.directory / f"{name}{suffix}").unlink()
+            metrics.increment("line_store_compactions")
+        except Exception as e:
+            self._error = e
+
+    def _raise_compaction_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Background line store compaction failed") from error
+
+    def close(self) -> None:
+        """
+        Wait for a background merge to finish.
+        """
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        self._raise_compaction_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    from cs336_data.deduplication import exact_deduplication
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    dedup = subparsers.add_parser("dedup", help="Deduplicate a batch of files against the store and add it.")
+    dedup.add_argument("inputs", nargs="+")
+    dedup.add_argument("--store", required=True)
+    dedup.add_argument("--output-dir", required=True)
+    info = subparsers.add_parser("info", help="Print the size of a store.")
+    info.add_argument("store")
+    compact = subparsers.add_parser("compact", help="Merge all segments of a store into one.")
+    compact.add_argument("store")
+    args = parser.parse_args()
+
+    if args.command == "dedup":
+        with LineHashStore(args.store) as store:
+            exact_deduplication(args.inputs, args.output_dir, store=store)
+    elif args.command == "info":
+        store = LineHashStore(args.store)
+        print(json.dumps({"entries": len(store), "segments": store.num_segments, "batches": len(store.batches)}))
+    else:
+        with LineHashStore(args.store, max_segments=1) as store:
+            store.compact()
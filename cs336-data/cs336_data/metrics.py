@@ -0,0 +1,281 @@
+"""
+Lightweight counters, gauges, timers and histograms for the cs336_data pipeline stages.
+
+Metrics are off by default, in which case every recording call returns after a
+single global check. Set the `CS336_DATA_METRICS` environment variable to a file
+path to turn them on without code changes:
+
+```
+CS336_DATA_METRICS=metrics.jsonl python -m cs336_data.create_quality_datasets
+CS336_DATA_METRICS=metrics.prom CS336_DATA_METRICS_INTERVAL=30 python ...
+```
+
+Snapshots are written every `CS336_DATA_METRICS_INTERVAL` seconds (default 10) and
+at exit: appended as JSON lines, or, for a `.prom` path, rewritten in the Prometheus
+text exposition format. Forked worker processes record their own metrics and write
+to the same JSON-lines file (or to `<path stem>.<pid>.prom` for Prometheus).
+"""
+import atexit
+import functools
+import json
+import math
+import multiprocessing.util
+import os
+import threading
+import time
+
+ENV_VAR = "CS336_DATA_METRICS"
+INTERVAL_ENV_VAR = "CS336_DATA_METRICS_INTERVAL"
+
+# Upper bounds of the histogram buckets; wide enough for both seconds and byte counts.
+DEFAULT_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0, 100.0, 1e3, 1e4, 1e5, 1e6, math.inf)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class Registry:
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._dump_periodically, daemon=True)
+        self._thread.start()
+
+    def increment(self, name: str, value: float) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "time": time.time(),
+                "pid": os.getpid(),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+
+    def dump(self) -> None:
+        snapshot = self.snapshot()
+        if self.path.endswith(".prom"):
+            tmp_path = f"{self.path}.tmp.{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                f.write(format_prometheus(snapshot))
+            os.replace(tmp_path, self.path)
+        else:
+            # A single short write to a file opened for appending, so lines from
+            # several worker processes do not interleave.
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+    def _dump_periodically(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.dump()
+
+
+def _metric_name(name: str) -> str:
+    return "cs336_data_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def format_prometheus(snapshot: dict) -> str:
+    """
+    Render a snapshot in the Prometheus text exposition format.
+    """
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        # Counters are named with a `_total` suffix by convention.
+        metric = _metric_name(name)
+        if not metric.endswith("_total"):
+            metric += "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, value in sorted(snapshot.get("gauges", {}).items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    for name, histogram in sorted(snapshot["histograms"].items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum {histogram['sum']}")
+        lines.append(f"{metric}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+_registry = None
+
+
+def enable(path: str, interval: float = 10.0) -> None:
+    """
+    Start recording metrics and dumping them to `path` every `interval` seconds and at exit.
+    """
+    global _registry
+    if _registry is not None:
+        _registry.close()
+    _registry = Registry(path, interval)
+
+
+def disable() -> None:
+    """
+    Stop recording metrics, writing a final snapshot first.
+    """
+    global _registry
+    if _registry is not None:
+        _registry.close()
+        _registry = None
+
+
+def enabled() -> bool:
+    return _registry is not None
+
+
+def increment(name: str, value: float = 1) -> None:
+    if _registry is None:
+        return
+    _registry.increment(name, value)
+
+
+def set_gauge(name: str, value: float) -> None:
+    """
+    Record the latest value of a quantity that is not a count (e.g. an estimate).
+    """
+    if _registry is None:
+        return
+    _registry.set_gauge(name, value)
+
+
+def observe(name: str, value: float) -> None:
+    if _registry is None:
+        return
+    _registry.observe(name, value)
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _registry is not None:
+            _registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    """
+    Context manager recording the duration of its block in the `<name>_seconds` histogram.
+    """
+    if _registry is None:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed(name: str):
+    """
+    Decorator recording each call's duration in the `<name>_seconds` histogram.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _registry is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _registry.observe(f"{name}_seconds", time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _reset_after_fork() -> None:
+    # The dump thread does not survive fork; give the child a fresh registry of its own.
+    global _registry
+    if _registry is not None:
+        path = _registry.path
+        if path.endswith(".prom"):
+            path = f"{path[:-len('.prom')]}.{os.getpid()}.prom"
+        _registry = Registry(path, _registry.interval)
+
+
+def _close_at_exit() -> None:
+    if _registry is not None:
+        _registry.close()
+
+
+def _register_exit_finalizer(_) -> None:
+    # multiprocessing children leave through os._exit, which skips atexit handlers.
+    multiprocessing.util.Finalize(None, _close_at_exit, exitpriority=0)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+multiprocessing.util.register_after_fork(_register_exit_finalizer, _register_exit_finalizer)
+atexit.register(_close_at_exit)
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR], float(os.environ.get(INTERVAL_ENV_VAR, 10.0)))
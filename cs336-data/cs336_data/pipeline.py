@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Stream WARC files through the cs336_data filters and write tokenized uint16 shards.
+
+Example:
+
+```
+python -m cs336_data.pipeline data/*.warc.gz --output-dir data/tokens --num-workers 8 \
+    --stages langid gopher nsfw toxicity pii line_dedup minhash_dedup
+python scripts/train.py --train-path data/tokens/train-00000.bin --dev-path data/tokens/dev-00000.bin ...
+```
+
+Per-document stages (extraction, classifiers, Gopher, PII masking) run in a pool of
+worker processes, one WARC per task, and write the surviving documents to one
+intermediate file per WARC. Line and MinHash deduplication then run over all of
+them, documents overlapping evaluation sets are optionally removed (see
+cs336_data.decontaminate), and the remaining documents are tokenized with an end-of-text token after
+each one (see cs336_data.tokenization). `manifest.json` describes the shards and
+records per-stage counts.
+
+The run's settings are written to `filtered/progress.json` and each finished WARC
+file is appended to `filtered/progress.log`, so rerunning the same command after an
+interruption only filters the WARC files that were not done yet.
+
+To tune the document stage thresholds without re-running extraction and the
+classifiers for every setting, see cs336_data.annotations.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data import decontaminate, deduplication, extract_text, identify_text, metrics, quality_classifier
+from cs336_data.checkpoint import ProgressManifest, shard_key
+from cs336_data.readers import open_input
+from cs336_data.corpus import JsonlCorpusWriter, read_corpus
+from cs336_data.lazy import lazy_import
+from cs336_data.tokenization import MemmapShardWriter, get_tokenizer, parallel_tokenize
+from cs336_data.workers import FilterPool
+
+archiveiterator = lazy_import("warcio.archiveiterator")
+
+
+def _sampling(config: dict) -> identify_text.SamplingPolicy:
+    return identify_text.SamplingPolicy(**config["sampling"])
+
+
+def _langid(text: str, config: dict) -> str | None:
+    label, score = identify_text.identify_language(text, _sampling(config))
+    return text if label == config["language"] and score >= config["language_threshold"] else None
+
+
+def _gopher(text: str, config: dict) -> str | None:
+    return text if quality_classifier.gopher_quality_filters(text) else None
+
+
+def _nsfw(text: str, config: dict) -> str | None:
+    label, score = identify_text.identify_nsfw(text, _sampling(config))
+    return None if label == "nsfw" and score > config["nsfw_threshold"] else text
+
+
+def _toxicity(text: str, config: dict) -> str | None:
+    label, score = identify_text.identify_hatespeech(text, _sampling(config))
+    return None if label == "toxic" and score > config["toxicity_threshold"] else text
+
+
+def _quality(text: str, config: dict) -> str | None:
+    label, score = quality_classifier.load_and_predict(text)
+    return text if label == "wiki" and score >= config["quality_threshold"] else None
+
+
+def _pii(text: str, config: dict) -> str | None:
+    text, _ = identify_text.mask_email(text)
+    text, _ = identify_text.mask_phone_num(text)
+    text, _ = identify_text.mask_ip(text)
+    return text
+
+
+# Per-document stages, applied in the order given on the command line. Each takes
+# (text, config) and returns the (possibly transformed) text, or None to drop it.
+DOCUMENT_STAGES = {
+    "langid": _langid,
+    "gopher": _gopher,
+    "nsfw": _nsfw,
+    "toxicity": _toxicity,
+    "quality": _quality,
+    "pii": _pii,
+}
+# Stages that need to see the whole corpus; they always run after the document stages.
+CORPUS_STAGES = ("line_dedup", "minhash_dedup", "decontaminate")
+DEFAULT_STAGES = ("langid", "gopher", "nsfw", "toxicity", "pii", "line_dedup", "minhash_dedup")
+
+
+def filter_warc(task: tuple) -> Counter:
+    """
+    Extract and filter every response record of one WARC, writing the kept documents
+    as JSON lines to a gzipped intermediate file.
+
+    Args:
+        task (tuple): (warc_path, output_path, config).
+
+    Returns:
+        A Counter with the number of records, extracted documents, kept documents and
+        documents dropped by each stage.
+    """
+    warc_path, output_path, config = task
+    stats = Counter()
+    # With the names of their drop counts, built once rather than per document.
+    stages = [
+        (name, DOCUMENT_STAGES[name], f"dropped_{name}", f"pipeline_dropped_{name}")
+        for name in config["stages"] if name in DOCUMENT_STAGES
+    ]
+    with open_input(warc_path, "rb") as stream, JsonlCorpusWriter(output_path) as out_f:
+        for record in archiveiterator.ArchiveIterator(stream):
+            if record.rec_type != "response":
+                continue
+            stats["records"] += 1
+            text = extract_text.extract_text(record.content_stream().read())
+            if not text or not text.strip():
+                stats["dropped_extract"] += 1
+                continue
+            stats["extracted"] += 1
+            for name, stage, dropped, dropped_metric in stages:
+                text = stage(text, config)
+                if text is None:
+                    stats[dropped] += 1
+                    metrics.increment(dropped_metric)
+                    break
+            else:
+                stats["kept"] += 1
+                url = record.rec_headers.get_header("WARC-Target-URI")
+                out_f.add(text, url=url)
+    return stats
+
+
+def run_pipeline(
+    warc_paths: list[str | Path],
+    output_dir: str | Path,
+    stages=DEFAULT_STAGES,
+    num_workers: int | None = None,
+    language: str = "en",
+    language_threshold: float = 0.5,
+    nsfw_threshold: float = 0.7,
+    toxicity_threshold: float = 0.7,
+    quality_threshold: float = 0.5,
+    sampling: str = "full",
+    sampling_chars: int = 1000,
+    num_hashes: int = 100,
+    num_bands: int = 10,
+    ngram_length: int = 5,
+    jaccard_threshold: float = 0.8,
+    decontamination_index: str | Path | None = None,
+    decontamination_mode: str = "drop",
+    tokenizer="gpt2",
+    dev_fraction: float = 0.01,
+    shard_tokens: int | None = None,
+    seed: int = 0,
+    keep_intermediate: bool = False,
+) -> dict:
+    """
+    Run WARC files through the configured stages and write tokenized uint16 shards.
+
+    Args:
+        warc_paths (list): Paths of the (gzipped) WARC files to process.
+        output_dir (str or Path): Directory for the token shards and manifest.json.
+        stages (list of str): Stages to run; see DOCUMENT_STAGES and CORPUS_STAGES.
+        num_workers (int, optional): Number of worker processes for the document stages.
+        language, language_threshold: Keep documents identified as `language` with at
+            least this confidence.
+        nsfw_threshold, toxicity_threshold: Drop documents classified as NSFW/toxic with
+            more than this confidence.
+        quality_threshold (float): Keep documents the quality classifier labels as
+            "wiki" with at least this confidence.
+        sampling, sampling_chars: Which parts of long documents the language, NSFW and
+            toxicity classifiers read (see `identify_text.SamplingPolicy`).
+        num_hashes, num_bands, ngram_length, jaccard_threshold: MinHash deduplication settings.
+        decontamination_index (str or Path, optional): Evaluation n-gram index built with
+            `python -m cs336_data.decontaminate build`; required by the "decontaminate" stage.
+        decontamination_mode (str): "drop" or "mask" (see `decontaminate.decontaminate`).
+        tokenizer: tiktoken encoding name, or an object with `encode_ordinary`,
+            `eot_token` and `n_vocab`.
+        dev_fraction (float): Fraction of documents written to the dev split.
+        shard_tokens (int, optional): Start a new shard after this many tokens
+            (default: one shard per split, usable directly with train.py).
+        seed (int): Seed for the train/dev split and MinHash cluster representatives.
+        keep_intermediate (bool): Keep the per-WARC filtered documents.
+
+    Returns:
+        The manifest, which is also written to `output_dir/manifest.json`.
+    """
+    unknown = [name for name in stages if name not in DOCUMENT_STAGES and name not in CORPUS_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages: {unknown}")
+    if "decontaminate" in stages and decontamination_index is None:
+        raise ValueError("The decontaminate stage needs a decontamination_index.")
+    if isinstance(tokenizer, str):
+        tokenizer_name, tokenizer = tokenizer, get_tokenizer(tokenizer)
+    else:
+        tokenizer_name = type(tokenizer).__name__
+    if tokenizer.n_vocab > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Vocabulary of size {tokenizer.n_vocab} does not fit in uint16.")
+
+    output_dir = Path(output_dir)
+    work_dir = output_dir / "filtered"
+    os.makedirs(work_dir, exist_ok=True)
+    config = {
+        "stages": list(stages),
+        "language": language,
+        "language_threshold": language_threshold,
+        "nsfw_threshold": nsfw_threshold,
+        "toxicity_threshold": toxicity_threshold,
+        "quality_threshold": quality_threshold,
+        "sampling": {"policy": sampling, "max_chars": sampling_chars},
+    }
+
+    # Per-document stages, one WARC per task.
+    tasks = [(str(path), str(work_dir / f"{i:05d}.jsonl.gz"), config) for i, path in enumerate(warc_paths)]
+    stats = Counter()
+    progress = ProgressManifest(work_dir, config=config)
+    keys = {task[1]: f"{task[1]}:{shard_key(task[0])}" for task in tasks}
+    for task in tasks:
+        if progress.done(keys[task[1]]):
+            stats.update(progress.info(keys[task[1]]))
+    pending = [task for task in tasks if not progress.done(keys[task[1]])]
+    if len(pending) < len(tasks):
+        print(f"Resuming: {len(tasks) - len(pending)} of {len(tasks)} WARC files already filtered")
+    with FilterPool(num_workers, missing_ok=True, include_quality="quality" in stages) as pool:
+        for task, warc_stats in zip(pending, pool.imap(filter_warc, pending, chunksize=1)):
+            progress.commit(keys[task[1]], info=dict(warc_stats))
+            stats.update(warc_stats)
+    filtered_paths = [task[1] for task in tasks]
+    print(f"Filtered {stats['records']} records down to {stats['kept']} documents")
+
+    documents = read_corpus(filtered_paths)
+    if "line_dedup" in stages:
+        with metrics.timer("pipeline_line_dedup"):
+            line_counts = deduplication.count_line_hashes(read_corpus(filtered_paths))
+        documents = (deduplication.remove_duplicate_lines(text, line_counts) for text in documents)
+        documents = (text for text in documents if text)
+    if "minhash_dedup" in stages:
+        # minhash_deduplicate picks cluster representatives with the global RNG.
+        random.seed(seed)
+        documents = list(documents)
+        stats["before_minhash_dedup"] = len(documents)
+        kept = deduplication.minhash_deduplicate(documents, num_hashes, num_bands, ngram_length, jaccard_threshold)
+        documents = [text for i, text in enumerate(documents) if i in kept]
+    if "decontaminate" in stages:
+        index = decontaminate.NgramBloomFilter.load(decontamination_index)
+        decontamination_stats = {}
+        documents = decontaminate.decontaminate(documents, index, decontamination_mode, decontamination_stats)
+
+    # Tokenize in worker processes, separating documents with the end-of-text token,
+    # and assign whole documents to the train or dev split.
+    rng = np.random.default_rng(seed)
+    writers = {
+        "train": MemmapShardWriter(output_dir, "train", shard_tokens),
+        "dev": MemmapShardWriter(output_dir, "dev", shard_tokens),
+    }
+    with metrics.timer("pipeline_tokenize"):
+        for tokens, lengths in parallel_tokenize(documents, tokenizer, num_workers):
+            is_dev = rng.random(len(lengths)) < dev_fraction
+            for split, mask in (("train", ~is_dev), ("dev", is_dev)):
+                if mask.any():
+                    writers[split].write_batch(tokens[np.repeat(mask, lengths)], lengths[mask])
+                    stats[f"{split}_documents"] += int(mask.sum())
+                    stats[f"{split}_tokens"] += int(lengths[mask].sum())
+    for writer in writers.values():
+        writer.close()
+    if "decontaminate" in stages:
+        stats["contaminated"] = decontamination_stats["contaminated"]
+
+    if not keep_intermediate:
+        shutil.rmtree(work_dir)
+
+    manifest = {
+        "dtype": "uint16",
+        "tokenizer": tokenizer_name,
+        "vocab_size": tokenizer.n_vocab,
+        "eos_token_id": tokenizer.eot_token,
+        "inputs": [str(path) for path in warc_paths],
+        "config": {
+            **config,
+            "num_hashes": num_hashes,
+            "num_bands": num_bands,
+            "ngram_length": ngram_length,
+            "jaccard_threshold": jaccard_threshold,
+            "decontamination_index": None if decontamination_index is None else str(decontamination_index),
+            "decontamination_mode": decontamination_mode,
+            "dev_fraction": dev_fraction,
+            "shard_tokens": shard_tokens,
+            "seed": seed,
+        },
+        "stats": dict(stats),
+        "splits": {split: writer.shards for split, writer in writers.items()},
+    }
+    with open(output_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {stats['train_tokens']} train and {stats['dev_tokens']} dev tokens to {output_dir}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("warc_paths", nargs="+", help="WARC files to process.")
+    parser.add_argument("--output-dir", required=True, help="Directory for token shards and manifest.json.")
+    parser.add_argument("--stages", nargs="+", default=list(DEFAULT_STAGES), choices=[*DOCUMENT_STAGES, *CORPUS_STAGES])
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--language-threshold", type=float, default=0.5)
+    parser.add_argument("--nsfw-threshold", type=float, default=0.7)
+    parser.add_argument("--toxicity-threshold", type=float, default=0.7)
+    parser.add_argument("--quality-threshold", type=float, default=0.5)
+    parser.add_argument("--sampling", choices=identify_text.SAMPLING_POLICIES, default="full")
+    parser.add_argument("--sampling-chars", type=int, default=1000)
+    parser.add_argument("--num-hashes", type=int, default=100)
+    parser.add_argument("--num-bands", type=int, default=10)
+    parser.add_argument("--ngram-length", type=int, default=5)
+    parser.add_argument("--jaccard-threshold", type=float, default=0.8)
+    parser.add_argument("--decontamination-index", help="Index from `python -m cs336_data.decontaminate build`.")
+    parser.add_argument("--decontamination-mode", choices=["drop", "mask"], default="drop")
+    parser.add_argument("--tokenizer", default="gpt2", help="tiktoken encoding name.")
+    parser.add_argument("--dev-fraction", type=float, default=0.01)
+    parser.add_argument("--shard-tokens", type=int, help="Maximum tokens per shard (default: one shard per split).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-intermediate", action="store_true")
+    args = parser.parse_args()
+
+    run_pipeline(**vars(args))
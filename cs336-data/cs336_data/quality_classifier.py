@@ -1,8 +1,48 @@
-from pathlib import Path
+import math
+import multiprocessing
+import os
+import queue
+import random
 import re
+import shutil
+import time
 from pathlib import Path
-from fasttext import train_supervised, load_model
+from cs336_data import metrics
+from cs336_data.lazy import lazy_import
+
+fasttext = lazy_import("fasttext")
+
+# Gopher rule thresholds (Rae et al., 2021).
+GOPHER_MIN_WORDS = 50
+GOPHER_MAX_WORDS = 100000
+GOPHER_MIN_MEAN_WORD_LENGTH = 3
+GOPHER_MAX_MEAN_WORD_LENGTH = 10
+GOPHER_MAX_ELLIPSIS_LINE_FRACTION = 0.3
+GOPHER_MIN_ALPHA_WORD_FRACTION = 0.8
+
+def gopher_stats(text: str) -> dict:
+    """
+    Compute the document statistics that the Gopher quality rules threshold.
 
+    Returns:
+        A dict with `num_words`, `mean_word_length`, `ellipsis_line_fraction` (of
+        lines ending with "...") and `alpha_word_fraction` (of words containing an
+        alphabetic character).
+    """
+    # Tokenize text into words using whitespace splitting.
+    words = re.findall(r'\S+', text)
+    num_words = len(words)
+    lines = text.splitlines()
+    ellipsis_lines = sum(1 for line in lines if line.rstrip().endswith("..."))
+    alpha_words = sum(1 for word in words if re.search(r'[A-Za-z]', word))
+    return {
+        "num_words": num_words,
+        "mean_word_length": sum(len(word) for word in words) / num_words if num_words else 0.0,
+        "ellipsis_line_fraction": ellipsis_lines / len(lines) if lines else 0.0,
+        "alpha_word_fraction": alpha_words / num_words if num_words else 0.0,
+    }
+
+@metrics.timed("gopher_quality_filters")
 def gopher_quality_filters(text: str) -> bool:
     """
     Applies Gopher quality filters to a given text.
@@ -15,60 +55,320 @@ def gopher_quality_filters(text: str) -> bool:
     
     Returns True if the text passes all filters, False otherwise.
     """
-    # Tokenize text into words using whitespace splitting.
-    words = re.findall(r'\S+', text)
-    num_words = len(words)
-    
+    stats = gopher_stats(text)
+
     # Rule 1: Word count between 50 and 100,000.
-    if num_words < 50 or num_words > 100000:
+    if stats["num_words"] < GOPHER_MIN_WORDS or stats["num_words"] > GOPHER_MAX_WORDS:
+        metrics.increment("gopher_rejected_word_count")
         return False
 
     # Rule 2: Mean word length between 3 and 10 characters.
-    total_chars = sum(len(word) for word in words)
-    mean_word_length = total_chars / num_words
-    if mean_word_length < 3 or mean_word_length > 10:
+    if not GOPHER_MIN_MEAN_WORD_LENGTH <= stats["mean_word_length"] <= GOPHER_MAX_MEAN_WORD_LENGTH:
+        metrics.increment("gopher_rejected_mean_word_length")
         return False
 
     # Rule 3: No more than 30% of lines end with an ellipsis.
-    lines = text.splitlines()
-    if lines:
-        ellipsis_lines = sum(1 for line in lines if line.rstrip().endswith("..."))
-        if (ellipsis_lines / len(lines)) > 0.3:
-            return False
+    if stats["ellipsis_line_fraction"] > GOPHER_MAX_ELLIPSIS_LINE_FRACTION:
+        metrics.increment("gopher_rejected_ellipsis_lines")
+        return False
 
     # Rule 4: At least 80% of words must contain at least one alphabetic character.
-    alpha_words = sum(1 for word in words if re.search(r'[A-Za-z]', word))
-    if (alpha_words / num_words) < 0.8:
+    if stats["alpha_word_fraction"] < GOPHER_MIN_ALPHA_WORD_FRACTION:
+        metrics.increment("gopher_rejected_alpha_words")
         return False
 
+    metrics.increment("gopher_passed")
     return True
 
-def train_fasttext_model(dataset_path: str | Path, model_path: str | Path, validation_path: str | Path | None = None):
+def train_fasttext_model(
+    dataset_path: str | Path,
+    model_path: str | Path,
+    validation_path: str | Path | None = None,
+    epoch: int | None = None,
+    quantize: bool = False,
+    cutoff: int = 0,
+    retrain: bool = False,
+    qnorm: bool = False,
+    autotune_budget: float | None = None,
+    **train_kwargs,
+):
     """
     Train a fastText classifier model on the given labeled dataset.
-    
+
     Args:
         dataset_path (str or Path): Path to the training data file.
         model_path (str or Path): Path to save the trained model.
         validation_path (str or Path, optional): Path to a validation dataset file.
-    
+        epoch (int, optional): Number of training epochs (default: 50).
+        quantize (bool): If True, also save a quantized copy of the model next to
+            `model_path` with an `.ftz` suffix and report how it compares to the full model.
+        cutoff (int): When quantizing, keep only the `cutoff` most important words and
+            n-grams (0 keeps all of them).
+        retrain (bool): When quantizing with a cutoff, fine-tune the remaining embeddings.
+        qnorm (bool): When quantizing, also quantize the vector norms.
+        autotune_budget (float, optional): If given, search hyperparameters for this many
+            seconds with `autotune_fasttext_model` (requires `validation_path`) and keep the
+            most accurate candidate instead of training a single configuration. `epoch`
+            and `train_kwargs`, if given, are then fixed for every candidate.
+        **train_kwargs: Extra arguments forwarded to `fasttext.train_supervised`
+            (e.g. `lr`, `wordNgrams`, `dim`, `thread`).
+
     Returns:
-        The trained fastText model.
+        The trained fastText model (the quantized one if `quantize` is set).
     """
-    model = train_supervised(input=str(dataset_path), epoch=50)
-    model.save_model(str(model_path))
-    
+    if autotune_budget is not None:
+        if validation_path is None:
+            raise ValueError("autotune_budget requires a validation_path.")
+        candidates_dir = Path(model_path).parent / f"{Path(model_path).stem}-autotune"
+        fixed = {**train_kwargs, **({"epoch": epoch} if epoch is not None else {})}
+        results = autotune_fasttext_model(
+            dataset_path, validation_path, candidates_dir, time_budget=autotune_budget,
+            search_space={name: [value] for name, value in fixed.items()},
+        )
+        if not results:
+            raise RuntimeError(
+                f"No autotune candidate finished within {autotune_budget} seconds; "
+                "increase autotune_budget or narrow the search space."
+            )
+        best = max(results, key=lambda r: (r["precision"], r["predictions_per_second"]))
+        print(f"Best autotune candidate: {best}")
+        shutil.copyfile(best["model_path"], model_path)
+        model = fasttext.load_model(str(model_path))
+    else:
+        model = fasttext.train_supervised(input=str(dataset_path), epoch=epoch or 50, **train_kwargs)
+        model.save_model(str(model_path))
+
     if validation_path is not None:
         samples, precision, recall = model.test(str(validation_path))
         print(f'Validation -> Precision: {precision}, Recall: {recall}')
-    
+
     print(f"Model saved to: {model_path}")
+
+    if quantize:
+        quantized_path = Path(model_path).with_suffix(".ftz")
+        quantize_kwargs = {"thread": train_kwargs["thread"]} if "thread" in train_kwargs else {}
+        model.quantize(input=str(dataset_path), cutoff=cutoff, retrain=retrain, qnorm=qnorm, **quantize_kwargs)
+        model.save_model(str(quantized_path))
+        print(f"Quantized model saved to: {quantized_path}")
+        # Measure throughput on held-out data if we have it.
+        texts = read_labeled_texts(validation_path or dataset_path)
+        for path, stats in compare_models([model_path, quantized_path], texts, validation_path).items():
+            print(f"{path}: {stats}")
+
     return model
 
+def compare_models(model_paths, texts, validation_path: str | Path | None = None, repeats: int = 1) -> dict:
+    """
+    Measure size, load time and prediction throughput of one or more fastText models.
+
+    Args:
+        model_paths (list): Paths of the models to compare (full `.bin` or quantized `.ftz`).
+        texts (list of str): Texts to predict on when measuring throughput.
+        validation_path (str or Path, optional): If given, also report precision on this file.
+        repeats (int): Number of passes over `texts` when measuring throughput.
+
+    Returns:
+        A dict mapping each model path to a dict with `size_bytes`, `load_seconds`,
+        `predictions_per_second` and, if a validation file is given, `precision`.
+    """
+    texts = [text.replace("\n", " ") for text in texts]
+    results = {}
+    for model_path in model_paths:
+        start = time.perf_counter()
+        model = fasttext.load_model(str(model_path))
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model.predict(texts)
+        elapsed = time.perf_counter() - start
+
+        stats = {
+            "size_bytes": os.path.getsize(model_path),
+            "load_seconds": load_seconds,
+            "predictions_per_second": len(texts) * repeats / elapsed if elapsed > 0 else float("inf"),
+        }
+        if validation_path is not None:
+            stats["precision"] = model.test(str(validation_path))[1]
+        results[str(model_path)] = stats
+    return results
+
+def read_labeled_texts(path: str | Path, limit: int = 10000) -> list[str]:
+    """
+    Read up to `limit` texts from a fastText-formatted file, dropping the label prefix.
+    """
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if len(texts) >= limit:
+                break
+            if " " in line:
+                texts.append(line.split(" ", 1)[1].rstrip("\n"))
+    return texts
+
+# Ranges searched by autotune_fasttext_model. Tuples are (low, high) ranges, lists are choices.
+DEFAULT_SEARCH_SPACE = {
+    "lr": (0.05, 1.0),
+    "epoch": (5, 50),
+    "wordNgrams": (1, 3),
+    "dim": [16, 32, 64, 100],
+}
+
+def _sample_config(rng: random.Random, search_space: dict) -> dict:
+    config = {}
+    for name, space in search_space.items():
+        if isinstance(space, list):
+            config[name] = rng.choice(space)
+        elif isinstance(space[0], int) and isinstance(space[1], int):
+            config[name] = rng.randint(*space)
+        else:
+            # Learning rates are sampled log-uniformly.
+            config[name] = math.exp(rng.uniform(math.log(space[0]), math.log(space[1])))
+    return config
+
+def _train_candidate(dataset_path: str, validation_path: str, model_path: str, config: dict) -> dict:
+    start = time.perf_counter()
+    model = fasttext.train_supervised(input=dataset_path, **{"thread": 1, "verbose": 0, **config})
+    train_seconds = time.perf_counter() - start
+    model.save_model(model_path)
+
+    samples, precision, recall = model.test(validation_path)
+    texts = read_labeled_texts(validation_path)
+    start = time.perf_counter()
+    model.predict(texts)
+    elapsed = time.perf_counter() - start
+    return {
+        "config": config,
+        "model_path": model_path,
+        "precision": precision,
+        "recall": recall,
+        "train_seconds": train_seconds,
+        "predictions_per_second": len(texts) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+def pareto_front(results: list[dict], keys=("precision", "predictions_per_second")) -> list[dict]:
+    """
+    Return the results not dominated by any other result on `keys` (higher is better for all).
+    """
+    front = []
+    for r in results:
+        dominated = any(
+            all(o[k] >= r[k] for k in keys) and any(o[k] > r[k] for k in keys)
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return front
+
+def autotune_fasttext_model(
+    dataset_path: str | Path,
+    validation_path: str | Path,
+    output_dir: str | Path,
+    time_budget: float = 600,
+    num_workers: int | None = None,
+    search_space: dict | None = None,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Random search over fastText hyperparameters under a wall-clock budget.
+
+    Candidates are trained in parallel in a process pool (one fastText thread each)
+    until the budget runs out; candidates still training then are stopped, and
+    candidates that diverge are skipped, so the result may be empty.
+
+    Args:
+        dataset_path (str or Path): Path to the training data file.
+        validation_path (str or Path): Path to the validation data file.
+        output_dir (str or Path): Directory to save each candidate model in.
+        time_budget (float): Wall-clock budget in seconds for the whole search.
+        num_workers (int, optional): Number of candidates trained at once (default: CPU count).
+        search_space (dict, optional): Overrides for `DEFAULT_SEARCH_SPACE` (a list
+            with one value fixes a hyperparameter).
+        seed (int): Seed for sampling configurations.
+
+    Returns:
+        A list with one dict per candidate (config, model path, precision, recall, training
+        time and predictions per second), with `pareto` set for candidates on the
+        accuracy/throughput Pareto front.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    search_space = {**DEFAULT_SEARCH_SPACE, **(search_space or {})}
+    num_workers = num_workers or os.cpu_count() or 1
+    deadline = time.monotonic() + time_budget
+
+    results = []
+    # Finished candidates (results or exceptions), in order of completion.
+    finished = queue.Queue()
+
+    def collect(result) -> None:
+        if isinstance(result, RuntimeError):
+            # Aggressive learning rates can make training diverge; skip the candidate.
+            print(f"Autotune candidate failed: {result}")
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            print(f"Autotune candidate: {result}")
+            results.append(result)
+
+    pool = multiprocessing.get_context().Pool(num_workers)
+    try:
+        num_running = 0
+        num_started = 0
+        while True:
+            while num_running < num_workers and time.monotonic() < deadline:
+                model_path = os.path.join(output_dir, f"candidate-{num_started}.bin")
+                config = _sample_config(rng, search_space)
+                pool.apply_async(
+                    _train_candidate, (str(dataset_path), str(validation_path), model_path, config),
+                    callback=finished.put, error_callback=finished.put,
+                )
+                num_running += 1
+                num_started += 1
+            remaining = deadline - time.monotonic()
+            if not num_running or remaining <= 0:
+                break
+            try:
+                result = finished.get(timeout=remaining)
+            except queue.Empty:
+                break
+            num_running -= 1
+            collect(result)
+        while not finished.empty():
+            num_running -= 1
+            collect(finished.get())
+        if num_running:
+            print(f"Autotune budget exhausted; stopping {num_running} running candidate(s).")
+    finally:
+        # Stops the candidates still training at the deadline.
+        pool.terminate()
+        pool.join()
+
+    front = pareto_front(results)
+    for r in results:
+        r["pareto"] = any(r is f for f in front)
+    return results
+
+def resolve_model_path(model_path: str | Path) -> Path:
+    """
+    Return `model_path` if it exists, otherwise its quantized (`.ftz`) or full (`.bin`) sibling.
+    """
+    model_path = Path(model_path)
+    if model_path.exists():
+        return model_path
+    for suffix in (".ftz", ".bin"):
+        candidate = model_path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return model_path
+
 class QualityModel:
     def __init__(self, model_path: str | Path = 'models/fasttext-quality.bin'):
-        self.model = load_model(str(model_path))
+        # Either the full .bin or the quantized .ftz model can be loaded.
+        self.model_path = resolve_model_path(model_path)
+        self.model = fasttext.load_model(str(self.model_path))
     
+    @metrics.timed("quality_classifier")
     def predict(self, text: str):
         label, prob = self.model.predict(text.replace('\n', ' '))
         # Remove the __label__ prefix.
@@ -79,15 +379,34 @@ class QualityModel:
             label = 'cc'
         return label, prob[0]
         
+QUALITY_MODEL_PATH = 'models/fasttext-quality.bin'
+
+_quality_model = None
+
+def get_quality_model() -> QualityModel:
+    # Loaded once per process; see cs336_data.workers for sharing it across workers.
+    global _quality_model
+    if _quality_model is None:
+        _quality_model = QualityModel(QUALITY_MODEL_PATH)
+    return _quality_model
+
 def load_and_predict(text: str):
-    model = QualityModel('models/fasttext-quality.bin')
+    model = get_quality_model()
     return model.predict(text)
 
 if __name__ == '__main__':
     # Define file paths.
     training_dataset = "data/quality-dataset-train.txt"
-        
-    train_fasttext_model(dataset_path=training_dataset, model_path="models/fasttext-quality.bin")
+    validation_dataset = "data/quality-dataset-valid.txt"
+
+    train_fasttext_model(
+        dataset_path=training_dataset,
+        model_path="models/fasttext-quality.bin",
+        validation_path=validation_dataset if os.path.exists(validation_dataset) else None,
+        quantize=True,
+        cutoff=100000,
+        retrain=True,
+    )
     
     sample_text = "This is a well-written research article with clear arguments and proper citations."
     label, confidence = load_and_predict(sample_text)
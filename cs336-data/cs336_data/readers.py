@@ -0,0 +1,315 @@
+import io
+import mmap
+import os
+import queue
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cs336_data.checkpoint import atomic_write
+
+# Size of the compressed reads and of each decompressed chunk handed to the consumer.
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Number of decompressed chunks the background thread may run ahead of the consumer.
+DEFAULT_QUEUE_CHUNKS = 8
+# Number of whole-file reads or writes kept in flight for many-small-file corpora.
+DEFAULT_IO_CONCURRENCY = 16
+# Files smaller than this are read into memory by `map_files` rather than mapped.
+MIN_MAP_SIZE = 1024 * 1024
+
+_EOF = object()
+
+
+class ThreadedGzipReader(io.RawIOBase):
+    """
+    Read-only raw stream over a gzip file that is decompressed in a background thread.
+
+    zlib releases the GIL while inflating, so decompression runs on its own core
+    while the consumer parses the previous chunk. Multi-member files (e.g. WARCs,
+    or concatenated .gz shards) are decoded member by member.
+
+    Args:
+        path (str or Path): Path to the gzipped file.
+        chunk_size (int): Size of compressed reads and maximum size of decompressed chunks.
+        max_chunks (int): Maximum number of decompressed chunks buffered ahead of the consumer.
+    """
+
+    def __init__(self, path, chunk_size: int = DEFAULT_CHUNK_SIZE, max_chunks: int = DEFAULT_QUEUE_CHUNKS):
+        super().__init__()
+        self.name = str(path)
+        self._file = open(path, "rb")
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._stop = threading.Event()
+        self._buffer = memoryview(b"")
+        self._offset = 0
+        self._done = False
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decompress(self):
+        try:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            in_member = False
+            while not self._stop.is_set():
+                data = self._file.read(self._chunk_size)
+                if not data:
+                    break
+                while data:
+                    in_member = True
+                    out = decompressor.decompress(data, self._chunk_size)
+                    if out and not self._put(out):
+                        return
+                    if decompressor.eof:
+                        # Start the next member with whatever followed the previous one.
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                        in_member = False
+                    else:
+                        data = decompressor.unconsumed_tail
+            if in_member and not self._stop.is_set():
+                # Drain output zlib may still hold for input it has consumed; only a
+                # member without its end-of-stream marker means the file is truncated.
+                out = decompressor.flush()
+                if out and not self._put(out):
+                    return
+                in_member = not decompressor.eof or bool(decompressor.unused_data)
+            if in_member:
+                raise EOFError(f"Compressed file ended before the end-of-stream marker was reached: {self.name}")
+            self._put(_EOF)
+        except BaseException as e:
+            self._put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        while self._offset >= len(self._buffer):
+            if self._done:
+                return 0
+            item = self._queue.get()
+            if item is _EOF:
+                self._done = True
+                return 0
+            if isinstance(item, BaseException):
+                self._done = True
+                raise item
+            self._buffer = memoryview(item)
+            self._offset = 0
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._file.close()
+        super().close()
+
+
+def _open_gzip(path, chunk_size: int):
+    return ThreadedGzipReader(path, chunk_size=chunk_size)
+
+
+def _open_plain(path, chunk_size: int):
+    return io.FileIO(path, "r")
+
+
+# Maps a lower-case file suffix to a function returning a raw binary stream.
+_OPENERS = {
+    ".gz": _open_gzip,
+}
+
+
+def register_opener(suffix: str, opener) -> None:
+    """
+    Register the raw-stream opener used by `open_input` for files ending in `suffix`.
+
+    Args:
+        suffix (str): File suffix including the dot, e.g. ".zst".
+        opener (callable): Called as `opener(path, chunk_size)`; must return a readable binary stream.
+    """
+    _OPENERS[suffix.lower()] = opener
+
+
+def open_input(path: str | Path, mode: str = "rb", encoding: str = "utf-8", chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Open an input file for reading, transparently decompressing it based on its suffix.
+
+    All cs336_data readers go through this function so that they share the same
+    decompression and buffering behaviour.
+
+    Args:
+        path (str or Path): Path to the input file.
+        mode (str): "rb" for a buffered binary stream or "rt" for a text stream.
+        encoding (str): Text encoding used in "rt" mode.
+        chunk_size (int): Read buffer size (and decompressed chunk size for compressed inputs).
+
+    Returns:
+        A buffered binary or text file object.
+    """
+    if mode not in ("r", "rb", "rt"):
+        raise ValueError(f"Unsupported mode for open_input: {mode!r}")
+    suffix = os.path.splitext(str(path))[1].lower()
+    raw = _OPENERS.get(suffix, _open_plain)(path, chunk_size)
+    stream = io.BufferedReader(raw, buffer_size=chunk_size)
+    if mode == "rb":
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+def _read_file(path, mode: str, encoding: str):
+    if mode == "rb":
+        with open(path, "rb") as f:
+            return f.read()
+    with open(path, "r", encoding=encoding) as f:
+        return f.read()
+
+
+def read_files(paths, mode: str = "rt", encoding: str = "utf-8", io_concurrency: int = DEFAULT_IO_CONCURRENCY):
+    """
+    Read whole files, keeping up to `io_concurrency` reads in flight in a thread pool.
+
+    Upcoming files are prefetched while the caller processes the current one, which
+    hides per-file latency on network filesystems. At most `io_concurrency` files
+    are buffered at a time.
+
+    Args:
+        paths (iterable): Paths of the files to read.
+        mode (str): "rt" to read text (with universal newlines) or "rb" for bytes.
+        encoding (str): Text encoding used in "rt" mode.
+        io_concurrency (int): Maximum number of concurrent reads; 1 reads serially.
+
+    Yields:
+        (path, contents) tuples in the order of `paths`.
+    """
+    if mode not in ("rt", "rb"):
+        raise ValueError(f"Unsupported mode for read_files: {mode!r}")
+    if io_concurrency <= 1:
+        for path in paths:
+            yield path, _read_file(path, mode, encoding)
+        return
+    with ThreadPoolExecutor(io_concurrency) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(_read_file, path, mode, encoding)))
+            if len(pending) >= io_concurrency:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MIN_MAP_SIZE:
+            # Mapping costs more than reading for small files.
+            return f.read()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_WILLNEED"):
+        # Start kernel readahead now, so the pages are resident by the time they are scanned.
+        mapped.madvise(mmap.MADV_WILLNEED)
+    return mapped
+
+
+def map_files(paths, io_concurrency: int = DEFAULT_IO_CONCURRENCY):
+    """
+    Memory-map files read-only, opening up to `io_concurrency` ahead of the caller in
+    a thread pool and asking the kernel to read them ahead. Files smaller than
+    `MIN_MAP_SIZE` are read into a bytes object instead.
+
+    Each map is closed when the caller moves on to the next file, so the caller must
+    not keep references into it (copy out what it needs, e.g. with `bytes(...)`).
+
+    Yields:
+        (path, buffer) tuples in the order of `paths`, where buffer is an mmap or bytes.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(max(1, io_concurrency)) as pool:
+        for path in paths:
+            pending.append((path, pool.submit(_map_file, path)))
+            if len(pending) >= max(1, io_concurrency):
+                path, future = pending.popleft()
+                yield from _yield_and_close(path, future.result())
+        while pending:
+            path, future = pending.popleft()
+            yield from _yield_and_close(path, future.result())
+
+
+def _yield_and_close(path, buffer):
+    try:
+        yield path, buffer
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+
+class FileWriter:
+    """
+    Write whole files from a thread pool, so the caller can go on with the next
+    document while earlier ones are written.
+
+    At most `2 * io_concurrency` writes are queued; `write` blocks beyond that. Errors
+    are raised from a later `write` or from `close`.
+
+    Args:
+        io_concurrency (int): Maximum number of concurrent writes; 1 writes serially.
+        atomic (bool): Write each file to a temporary name and rename it into place.
+    """
+
+    def __init__(self, io_concurrency: int = DEFAULT_IO_CONCURRENCY, atomic: bool = False):
+        self.io_concurrency = io_concurrency
+        self.atomic = atomic
+        self._pool = ThreadPoolExecutor(io_concurrency) if io_concurrency > 1 else None
+        self._pending = deque()
+
+    def _write(self, path, data, encoding: str) -> None:
+        mode = "wb" if isinstance(data, bytes) else "w"
+        kwargs = {} if mode == "wb" else {"encoding": encoding}
+        if self.atomic:
+            with atomic_write(path, mode, **kwargs) as f:
+                f.write(data)
+        else:
+            with open(path, mode, **kwargs) as f:
+                f.write(data)
+
+    def write(self, path, data: str | bytes, encoding: str = "utf-8") -> None:
+        if self._pool is None:
+            self._write(path, data, encoding)
+            return
+        while len(self._pending) >= 2 * self.io_concurrency:
+            self._pending.popleft().result()
+        self._pending.append(self._pool.submit(self._write, path, data, encoding))
+
+    def close(self) -> None:
+        """
+        Wait for all queued writes, raising the first error if any failed.
+        """
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
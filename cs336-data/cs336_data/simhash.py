@@ -0,0 +1,200 @@
+"""
+Near-duplicate detection with 64-bit SimHash fingerprints.
+
+A low-memory alternative to MinHash deduplication: each document is reduced to a
+single 64-bit fingerprint (8 bytes, versus `num_hashes` 128-bit integers for a
+MinHash signature), and documents whose fingerprints differ in at most
+`max_distance` bits are treated as near-duplicates.
+
+Near pairs are found with permuted tables (Manku et al., 2007): the 64 bits are
+split into `num_blocks` blocks, and two fingerprints within distance k agree on at
+least `num_blocks - k` of them. One table is sorted for every choice of those
+blocks, so candidates are fingerprints with equal keys in some table.
+
+Fingerprints of short documents move more per edit, so they need a larger
+`max_distance`; `python -m cs336_data.benchmark --near-duplicates` reports recall
+and precision against MinHash on the fuzzy-duplicate fixtures.
+"""
+import hashlib
+import os
+import random
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+
+from cs336_data import metrics
+from cs336_data.deduplication import UnionFind, get_ngrams, jaccard_similarity, normalize_text
+from cs336_data.readers import DEFAULT_IO_CONCURRENCY, FileWriter, read_files
+
+FINGERPRINT_BITS = 64
+
+
+def _features(text, ngram_length):
+    norm_text = normalize_text(text)
+    ngrams = get_ngrams(norm_text, ngram_length)
+    # Documents shorter than one n-gram are fingerprinted by their whole text, so
+    # only identical short documents collide.
+    return ngrams or {norm_text}
+
+
+def simhash_fingerprint(text, ngram_length=2):
+    """
+    Compute the 64-bit SimHash of a document's normalized word n-grams.
+
+    Each n-gram is hashed to 64 bits; bit i of the fingerprint is set when more
+    than half of the n-gram hashes have bit i set.
+    """
+    features = _features(text, ngram_length)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little") for gram in features),
+        dtype=np.uint64,
+        count=len(features),
+    )
+    bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int(np.packbits(majority, bitorder="little").view("<u8")[0])
+
+
+def compute_fingerprints(texts, ngram_length=2):
+    """
+    Fingerprint each document, returning a uint64 array.
+    """
+    return np.fromiter((simhash_fingerprint(text, ngram_length) for text in texts), dtype=np.uint64)
+
+
+def _block_masks(num_blocks):
+    bounds = np.linspace(0, FINGERPRINT_BITS, num_blocks + 1).astype(int)
+    return [(1 << int(hi)) - (1 << int(lo)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def near_duplicate_pairs(fingerprints, max_distance=4, num_blocks=None):
+    """
+    Find all pairs of distinct fingerprints within Hamming distance `max_distance`.
+
+    Args:
+        fingerprints (np.ndarray): Distinct uint64 fingerprints.
+        max_distance (int): Maximum number of differing bits.
+        num_blocks (int, optional): Number of blocks the fingerprint is split into
+            (default: max_distance + 3). More blocks mean more tables but longer keys,
+            and so fewer chance collisions to check.
+
+    Returns:
+        A set of index pairs (i, j) with i < j.
+    """
+    fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+    num_blocks = num_blocks or max_distance + 3
+    if not max_distance < num_blocks <= FINGERPRINT_BITS:
+        raise ValueError("num_blocks must be larger than max_distance and at most 64.")
+    masks = _block_masks(num_blocks)
+    values = fingerprints.tolist()
+    pairs = set()
+    num_candidates = 0
+    for blocks in combinations(range(num_blocks), num_blocks - max_distance):
+        keys = fingerprints & np.uint64(sum(masks[b] for b in blocks))
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            for i, j in combinations(sorted(order[start:end].tolist()), 2):
+                num_candidates += 1
+                if (values[i] ^ values[j]).bit_count() <= max_distance:
+                    pairs.add((i, j))
+    metrics.increment("simhash_candidate_pairs", num_candidates)
+    return pairs
+
+
+def _cluster(fingerprints, max_distance, num_blocks, same_document=None):
+    # Union documents with identical fingerprints, then across near fingerprints.
+    # `same_document(i, j)`, if given, must also accept each merged pair.
+    unique, first, inverse = np.unique(fingerprints, return_index=True, return_inverse=True)
+    uf = UnionFind(len(fingerprints))
+    for doc_id, group in enumerate(inverse.tolist()):
+        representative = int(first[group])
+        if doc_id != representative and (same_document is None or same_document(representative, doc_id)):
+            uf.union(representative, doc_id)
+    with metrics.timer("simhash_verify"):
+        for a, b in near_duplicate_pairs(unique, max_distance, num_blocks):
+            i, j = int(first[a]), int(first[b])
+            if same_document is None or same_document(i, j):
+                uf.union(i, j)
+
+    clusters = defaultdict(list)
+    for doc_id in range(len(fingerprints)):
+        clusters[uf.find(doc_id)].append(doc_id)
+    kept_docs = {random.choice(cluster) for cluster in clusters.values()}
+    metrics.increment("simhash_duplicates_removed", len(fingerprints) - len(kept_docs))
+    return kept_docs
+
+
+def simhash_deduplicate(texts, ngram_length=2, max_distance=4, jaccard_threshold=None, num_blocks=None):
+    """
+    Find the documents to keep after fuzzy deduplication with SimHash.
+
+    Args:
+        texts (list of str): Document contents.
+        ngram_length (int): n-gram length (in words) of the fingerprinted features.
+        max_distance (int): Maximum Hamming distance between near-duplicate fingerprints.
+        jaccard_threshold (float, optional): Also require this n-gram Jaccard similarity
+            between merged documents (default: fingerprints alone decide).
+        num_blocks (int, optional): See `near_duplicate_pairs`.
+
+    Returns:
+        The set of indices into `texts` of the retained documents (one per cluster
+        of near-duplicates).
+    """
+    with metrics.timer("simhash_fingerprints"):
+        fingerprints = compute_fingerprints(texts, ngram_length)
+    metrics.increment("simhash_docs", len(fingerprints))
+
+    same_document = None
+    if jaccard_threshold is not None:
+        def same_document(i, j):
+            return jaccard_similarity(_features(texts[i], ngram_length), _features(texts[j], ngram_length)) >= jaccard_threshold
+
+    return _cluster(fingerprints, max_distance, num_blocks, same_document)
+
+
+def run_simhash_deduplication(
+    input_paths, output_dir, ngram_length=2, max_distance=4, jaccard_threshold=None, num_blocks=None,
+    io_concurrency=DEFAULT_IO_CONCURRENCY,
+):
+    """
+    Performs fuzzy document deduplication using SimHash, with the same input and
+    output contract as `deduplication.run_minhash_deduplication`.
+
+    Documents are streamed: only their fingerprints are kept in memory, and files
+    are read again for Jaccard verification and when writing the retained ones.
+
+    Args:
+        input_paths (list): List of file paths (each file is one document).
+        output_dir (str): Directory to write deduplicated documents.
+        ngram_length, max_distance, jaccard_threshold, num_blocks: See `simhash_deduplicate`.
+        io_concurrency (int): Number of files read or written concurrently.
+
+    Writes:
+        For each retained document, writes its original contents (unchanged)
+        to the output directory with the same file name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    input_paths = list(input_paths)
+
+    with metrics.timer("simhash_fingerprints"):
+        fingerprints = compute_fingerprints(
+            (document for _, document in read_files(input_paths, io_concurrency=io_concurrency)), ngram_length
+        )
+    metrics.increment("simhash_docs", len(fingerprints))
+
+    same_document = None
+    if jaccard_threshold is not None:
+        def same_document(i, j):
+            (_, a), (_, b) = read_files([input_paths[i], input_paths[j]], io_concurrency=1)
+            return jaccard_similarity(_features(a, ngram_length), _features(b, ngram_length)) >= jaccard_threshold
+
+    kept_docs = _cluster(fingerprints, max_distance, num_blocks, same_document)
+
+    kept_paths = [path for i, path in enumerate(input_paths) if i in kept_docs]
+    with FileWriter(io_concurrency, atomic=True) as writer:
+        for path, document in read_files(kept_paths, io_concurrency=io_concurrency):
+            writer.write(os.path.join(output_dir, os.path.basename(path)), document)
@@ -1,5 +1,5 @@
-import gzip
 import random
+from cs336_data.readers import open_input
 
 def subsample_urls(input_gz: str, output_file: str, sample_fraction: float = 0.01):
     """
@@ -11,7 +11,7 @@ def subsample_urls(input_gz: str, output_file: str, sample_fraction: float = 0.0
         output_file (str): Path to the output file.
         sample_fraction (float): Fraction of URLs to retain.
     """
-    with gzip.open(input_gz, "rt", encoding="utf-8") as fin, open(output_file, "w", encoding="utf-8") as fout:
+    with open_input(input_gz, "rt", encoding="utf-8") as fin, open(output_file, "w", encoding="utf-8") as fout:
         for line in fin:
             url = line.strip()
             if random.random() < sample_fraction:
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Exact substring deduplication with suffix arrays (Lee et al., 2021).
+
+Removes every span of at least `min_length` bytes that already occurred earlier in
+the corpus, such as boilerplate footers embedded in otherwise unique pages, keeping
+the first occurrence.
+
+Example:
+
+```
+python -m cs336_data.substring_dedup data/filtered.docs --output data/substring-dedup.docs \
+    --min-length 100 --work-dir /scratch/substring-dedup
+```
+
+The steps, all on memory-mapped files in `work_dir`:
+
+1. Documents are concatenated into one byte file, each followed by a 0xFF
+   separator (a byte that never occurs in UTF-8).
+2. The file is cut into chunks, and a suffix array of each chunk, ordered by the
+   first `min_length` bytes of each suffix, is built with prefix doubling and
+   written out as a sorted run. Suffixes whose window contains a separator are
+   dropped, so matches never cross a document boundary.
+3. Runs are merged pairwise on their `min_length`-byte prefixes. In the merged
+   array, equal windows are adjacent and ordered by position, so every window
+   equal to its predecessor is a repeat of an earlier occurrence.
+4. The bytes covered by repeated windows are removed from the documents.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data import corpus, metrics
+
+SEPARATOR = 0xFF
+DEFAULT_MIN_LENGTH = 100
+# Bytes per suffix-array chunk; building a chunk's array takes about 40 bytes per byte.
+DEFAULT_CHUNK_SIZE = 1 << 22
+# Suffixes compared at a time when merging runs and scanning for repeats.
+DEFAULT_BLOCK_SIZE = 1 << 18
+# Bytes packed into the initial sort key (9 bits each, to fit in an int64).
+_PACKED_BYTES = 7
+
+
+def write_byte_corpus(documents, path: str | Path, padding: int) -> np.ndarray:
+    """
+    Concatenate the UTF-8 bytes of the documents into `path`, each followed by a
+    separator byte, plus `padding` separator bytes at the end.
+
+    Returns:
+        The uint64 start offset of each document, followed by the total length
+        (excluding the padding).
+    """
+    offsets = array("Q", [0])
+    with open(path, "wb") as f:
+        for document in documents:
+            data = document.encode("utf-8")
+            f.write(data)
+            f.write(bytes([SEPARATOR]))
+            offsets.append(offsets[-1] + len(data) + 1)
+        f.write(bytes([SEPARATOR]) * padding)
+    return np.frombuffer(offsets, dtype=np.uint64).copy()
+
+
+def suffix_array(data: np.ndarray, prefix_length: int | None = None) -> np.ndarray:
+    """
+    Sort the suffixes of a byte array by prefix doubling.
+
+    Args:
+        data (np.ndarray): uint8 array.
+        prefix_length (int, optional): Only order suffixes by their first
+            `prefix_length` bytes; ties are broken by position. Without it, this is
+            the full suffix array.
+
+    Returns:
+        An int64 array of suffix start positions in sorted order.
+    """
+    n = len(data)
+    limit = n if prefix_length is None else min(prefix_length, n)
+    # Start from the first (up to) 7 bytes of each suffix packed into one key, with
+    # byte values shifted by one so that a suffix sorts before its extensions.
+    k = min(limit, _PACKED_BYTES)
+    padded = np.concatenate([data.astype(np.int64) + 1, np.zeros(k, dtype=np.int64)])
+    key = np.zeros(n, dtype=np.int64)
+    for j in range(k):
+        key = (key << 9) | padded[j:j + n]
+    order = np.argsort(key, kind="stable")
+    while True:
+        rank = _rerank(order, key)
+        if n == 0 or rank[order[-1]] == n - 1 or k == limit:
+            return order
+        # The rank of the first min(2k, limit) bytes is the pair (rank of the first k
+        # bytes, rank of the k bytes ending at that length), packed into one key.
+        shift = min(k, limit - k)
+        second = np.zeros(n, dtype=np.int64)
+        second[:n - shift] = rank[shift:] + 1
+        key = rank * (n + 1) + second
+        order = np.argsort(key, kind="stable")
+        k += shift
+
+
+def _rerank(order: np.ndarray, key: np.ndarray) -> np.ndarray:
+    sorted_key = key[order]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.concatenate([[0], np.cumsum(sorted_key[1:] != sorted_key[:-1])])
+    return rank
+
+
+def _windows(data: np.ndarray, positions: np.ndarray, length: int) -> np.ndarray:
+    # The `length`-byte window at each position as a fixed-width bytes array, which
+    # numpy compares and sorts lexicographically.
+    return np.ascontiguousarray(data[positions[:, None] + np.arange(length)]).view(f"S{length}").ravel()
+
+
+def _sorted_run(data: np.ndarray, start: int, end: int, min_length: int) -> np.ndarray:
+    chunk = np.asarray(data[start:end + min_length - 1])
+    order = suffix_array(chunk, min_length)
+    order = order[order < end - start]
+    separators = np.concatenate([[0], np.cumsum(chunk == SEPARATOR)])
+    order = order[separators[order + min_length] == separators[order]]
+    return order + start
+
+
+def _merge_runs(data, a, b, out, min_length: int, block_size: int) -> None:
+    # Merge two runs sorted by window (ties by position, with every position in
+    # `a` before those in `b`), a block of each at a time.
+    i = j = k = 0
+    while i < len(a) and j < len(b):
+        block_a, block_b = np.asarray(a[i:i + block_size]), np.asarray(b[j:j + block_size])
+        keys_a, keys_b = _windows(data, block_a, min_length), _windows(data, block_b, min_length)
+        # Everything up to the smaller of the two last keys can be emitted now, except
+        # keys of `b` equal to a last key of `a` that may continue in its next block.
+        bound = min(keys_a[-1], keys_b[-1])
+        num_a = np.searchsorted(keys_a, bound, side="right")
+        more_a = keys_a[-1] == bound and i + len(block_a) < len(a)
+        num_b = np.searchsorted(keys_b, bound, side="left" if more_a else "right")
+        keys = np.concatenate([keys_a[:num_a], keys_b[:num_b]])
+        merged = np.concatenate([block_a[:num_a], block_b[:num_b]])[np.argsort(keys, kind="stable")]
+        out[k:k + len(merged)] = merged
+        i, j, k = i + num_a, j + num_b, k + len(merged)
+    rest = a[i:] if i < len(a) else b[j:]
+    out[k:k + len(rest)] = rest
+
+
+def _mark_repeats(data, merged, removed, min_length: int, block_size: int) -> int:
+    # Windows equal to their predecessor in the merged array repeat an earlier
+    # occurrence; count +1/-1 at the start/end of each into `removed`.
+    previous = None
+    num_repeats = 0
+    for start in range(0, len(merged), block_size):
+        positions = np.asarray(merged[start:start + block_size])
+        keys = _windows(data, positions, min_length)
+        repeat = np.empty(len(keys), dtype=bool)
+        repeat[0] = previous is not None and keys[0] == previous
+        repeat[1:] = keys[1:] == keys[:-1]
+        previous = keys[-1]
+        repeated = positions[repeat]
+        np.add.at(removed, repeated, 1)
+        np.add.at(removed, repeated + min_length, -1)
+        num_repeats += len(repeated)
+    return num_repeats
+
+
+def find_repeated_spans(
+    byte_corpus: str | Path,
+    work_dir: str | Path,
+    min_length: int = DEFAULT_MIN_LENGTH,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> np.ndarray:
+    """
+    Find the bytes of a byte corpus (see `write_byte_corpus`) that lie in a window of
+    `min_length` bytes that already occurred earlier.
+
+    Args:
+        byte_corpus (str or Path): Byte corpus, padded with `min_length` separators.
+        work_dir (str or Path): Directory for the memory-mapped intermediate files.
+        min_length (int): Minimum length in bytes of a removed span.
+        chunk_size (int): Bytes per suffix-array chunk.
+        block_size (int): Suffixes compared at a time when merging and scanning.
+
+    Returns:
+        A memory-mapped boolean array over the corpus, True for bytes to remove.
+    """
+    data = np.memmap(byte_corpus, dtype=np.uint8, mode="r")
+    size = len(data) - min_length
+    work_dir = Path(work_dir)
+
+    with metrics.timer("substring_dedup_suffix_arrays"):
+        runs = []
+        for start in range(0, size, chunk_size):
+            positions = _sorted_run(data, start, min(start + chunk_size, size), min_length)
+            run = np.lib.format.open_memmap(work_dir / f"run-{len(runs):05d}.npy", mode="w+", dtype=np.int64, shape=(len(positions),))
+            run[:] = positions
+            runs.append(run)
+
+    with metrics.timer("substring_dedup_merge"):
+        # Merge adjacent runs pairwise, so earlier positions stay in earlier runs.
+        generation = 0
+        while len(runs) > 1:
+            generation += 1
+            merged_runs = []
+            for r in range(0, len(runs), 2):
+                if r + 1 == len(runs):
+                    merged_runs.append(runs[r])
+                    continue
+                a, b = runs[r], runs[r + 1]
+                out = np.lib.format.open_memmap(
+                    work_dir / f"merge-{generation}-{r // 2:05d}.npy", mode="w+", dtype=np.int64, shape=(len(a) + len(b),)
+                )
+                _merge_runs(data, a, b, out, min_length, block_size)
+                merged_runs.append(out)
+                os.remove(a.filename)
+                os.remove(b.filename)
+            runs = merged_runs
+
+    with metrics.timer("substring_dedup_mark"):
+        counts = np.lib.format.open_memmap(work_dir / "removed-counts.npy", mode="w+", dtype=np.int32, shape=(size + min_length + 1,))
+        num_repeats = _mark_repeats(data, runs[0], counts, min_length, block_size) if runs and len(runs[0]) else 0
+        metrics.increment("substring_dedup_repeated_windows", num_repeats)
+        removed = np.lib.format.open_memmap(work_dir / "removed.npy", mode="w+", dtype=bool, shape=(size,))
+        total = 0
+        for start in range(0, size, chunk_size):
+            running = np.cumsum(counts[start:start + chunk_size], dtype=np.int64) + total
+            removed[start:start + len(running)] = running[:size - start] > 0
+            total = int(running[-1])
+    return removed
+
+
+def substring_deduplicate(
+    documents,
+    output_path: str | Path,
+    min_length: int = DEFAULT_MIN_LENGTH,
+    work_dir: str | Path | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    keep_intermediate: bool = False,
+) -> dict:
+    """
+    Remove every span of at least `min_length` bytes that occurred earlier in the
+    corpus, and write the remaining documents in order to a corpus file.
+
+    Removed spans can cut a multi-byte character; its remaining bytes are dropped.
+
+    Args:
+        documents (iterable of str): Documents to deduplicate.
+        output_path (str or Path): Output corpus file (.docs or .jsonl(.gz)).
+        min_length (int): Minimum length in bytes of a removed span.
+        work_dir (str or Path, optional): Directory for intermediate files (default:
+            a temporary directory). They take up to about 26 bytes per corpus byte.
+        chunk_size (int): Bytes per suffix-array chunk.
+        block_size (int): Suffixes compared at a time when merging and scanning.
+        keep_intermediate (bool): Keep the intermediate files.
+
+    Returns:
+        A dict with the number of documents and of input and removed bytes.
+    """
+    created = work_dir is None
+    work_dir = Path(tempfile.mkdtemp(prefix="substring-dedup-") if created else work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        byte_corpus = work_dir / "corpus.bin"
+        offsets = write_byte_corpus(documents, byte_corpus, padding=min_length)
+        removed = find_repeated_spans(byte_corpus, work_dir, min_length, chunk_size, block_size)
+        data = np.memmap(byte_corpus, dtype=np.uint8, mode="r")
+
+        def deduplicated_documents():
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+                keep = ~removed[start:end - 1]
+                yield bytes(data[start:end - 1][keep]).decode("utf-8", errors="ignore")
+
+        num_documents = corpus.write_corpus(output_path, deduplicated_documents())
+        stats = {
+            "documents": num_documents,
+            "bytes": int(offsets[-1]) - num_documents,
+            "removed_bytes": int(np.count_nonzero(removed)),
+        }
+        metrics.increment("substring_dedup_removed_bytes", stats["removed_bytes"])
+        del data, removed
+        return stats
+    finally:
+        if created and not keep_intermediate:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        elif not keep_intermediate:
+            for name in ("corpus.bin", "removed-counts.npy", "removed.npy"):
+                (work_dir / name).unlink(missing_ok=True)
+            for path in [*work_dir.glob("run-*.npy"), *work_dir.glob("merge-*.npy")]:
+                path.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Corpus files or one-document files (see cs336_data.corpus).")
+    parser.add_argument("--output", required=True, help="Output .docs or .jsonl(.gz) file.")
+    parser.add_argument("--min-length", type=int, default=DEFAULT_MIN_LENGTH, help="Minimum removed span length in bytes.")
+    parser.add_argument("--work-dir", help="Directory for intermediate files (default: a temporary directory).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--keep-intermediate", action="store_true")
+    args = parser.parse_args()
+
+    stats = substring_deduplicate(
+        corpus.read_corpus(args.inputs),
+        args.output,
+        min_length=args.min_length,
+        work_dir=args.work_dir,
+        chunk_size=args.chunk_size,
+        keep_intermediate=args.keep_intermediate,
+    )
+    print(json.dumps(stats))
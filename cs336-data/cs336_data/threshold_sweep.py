@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Sweep grids of filter thresholds over annotation sidecars and report how many
+documents and tokens each combination keeps.
+
+Example:
+
+```
+python -m cs336_data.annotations annotate data/*.warc.gz --output-dir data/annotations
+python -m cs336_data.threshold_sweep data/annotations/*.npz --filters langid nsfw toxicity quality \
+    --grid 0.5 0.6 0.7 0.8 0.9 --output data/sweep.jsonl
+```
+
+Every combination of thresholds is evaluated at once. For each filter, a document
+is kept up to some position in the grid (ordered from least to most strict), so
+the documents kept by a combination are those whose positions all lie beyond it.
+One `np.bincount` over the joint grid of positions followed by reversed cumulative
+sums along each axis gives the kept counts of every combination, so the cost is a
+binary search per document and filter plus the size of the grid, and tens of
+millions of documents take seconds.
+
+The thresholds mean the same as in `pipeline.run_pipeline`. Documents that were
+not extracted or fail the Gopher rules (unless `--no-gopher`) are never counted.
+Token counts are estimated from the UTF-8 size of the documents.
+
+The combinations in the Pareto set are those for which no stricter combination
+(at least as strict for every filter) keeps as many tokens; they are printed as
+JSON lines, and `--output` writes every combination.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from cs336_data import metrics
+from cs336_data.annotations import load_annotations, select
+
+# Score column of each filter, and whether documents are kept when their score is at
+# least the threshold (rather than dropped when it is above it).
+FILTERS = {
+    "langid": ("language_score", True),
+    "nsfw": ("nsfw_score", False),
+    "toxicity": ("toxicity_score", False),
+    "quality": ("quality_score", True),
+}
+DEFAULT_GRID = (0.5, 0.6, 0.7, 0.8, 0.9)
+# GPT-2 averages roughly four bytes of English web text per token.
+DEFAULT_BYTES_PER_TOKEN = 4.0
+
+
+def load_sweep_columns(annotation_paths, filters, language: str = "en", gopher: bool = True) -> dict:
+    """
+    Load the columns needed for a sweep from annotation sidecars.
+
+    Only the documents kept by the loosest thresholds are loaded: those that were
+    extracted, pass the Gopher rules (if `gopher`) and, for the "langid" and
+    "quality" filters, are labeled `language` and "wiki".
+
+    Returns:
+        A dict with `num_bytes` and the score column of each filter.
+    """
+    loosest = {
+        "language": language, "language_threshold": 0.0, "nsfw_threshold": 1.0,
+        "toxicity_threshold": 1.0, "quality_threshold": 0.0,
+    }
+    parts = []
+    for path in annotation_paths:
+        annotations = load_annotations(path)
+        keep, _ = select(annotations, ["gopher", *filters] if gopher else list(filters), loosest)
+        parts.append({column: annotations[column][keep] for column in ["num_bytes", *(FILTERS[name][0] for name in filters)]})
+    if not parts:
+        raise ValueError("No annotation files to sweep.")
+    return {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+
+
+def _positions(columns: dict, name: str, grid: np.ndarray) -> np.ndarray:
+    # Number of thresholds of the (increasing) grid at which each document is kept;
+    # these are the least strict ones.
+    column, keep_above = FILTERS[name]
+    scores = columns[column]
+    if keep_above:
+        # Kept when score >= threshold.
+        return np.searchsorted(grid, scores, side="right")
+    # Dropped when score > 0.5 and score > threshold, so kept at the thresholds >= score,
+    # which come first in order of strictness.
+    positions = len(grid) - np.searchsorted(grid, scores, side="left")
+    return np.where(scores > 0.5, positions, len(grid))
+
+
+def sweep(columns: dict, grids: dict, bytes_per_token: float = DEFAULT_BYTES_PER_TOKEN) -> dict:
+    """
+    Count the documents and tokens kept by every combination of thresholds.
+
+    Args:
+        columns (dict): Columns returned by `load_sweep_columns`.
+        grids (dict): Thresholds to try for each filter (a subset of FILTERS).
+        bytes_per_token (float): Bytes per token for estimating token counts.
+
+    Returns:
+        A dict with `filters`, `grids` (each ordered from least to most strict) and
+        `documents` and `tokens` arrays with one axis per filter.
+    """
+    filters = list(grids)
+    ordered = {}
+    for name in filters:
+        grid = np.unique(np.asarray(grids[name], dtype=np.float64))
+        ordered[name] = grid if FILTERS[name][1] else grid[::-1]
+    shape = tuple(len(ordered[name]) + 1 for name in filters)
+    with metrics.timer("threshold_sweep"):
+        positions = [_positions(columns, name, np.sort(ordered[name])) for name in filters]
+        cells = np.ravel_multi_index(positions, shape) if filters else np.zeros(len(columns["num_bytes"]), dtype=np.int64)
+        size = int(np.prod(shape))
+        documents = np.bincount(cells, minlength=size).reshape(shape)
+        tokens = np.bincount(cells, weights=columns["num_bytes"] / bytes_per_token, minlength=size).reshape(shape)
+        # A combination keeps the documents whose positions all exceed it.
+        for axis in range(len(filters)):
+            documents = np.flip(np.cumsum(np.flip(documents, axis), axis), axis)
+            tokens = np.flip(np.cumsum(np.flip(tokens, axis), axis), axis)
+        inner = tuple(slice(1, None) for _ in filters)
+    return {
+        "filters": filters,
+        "grids": [ordered[name] for name in filters],
+        "documents": documents[inner],
+        "tokens": np.round(tokens[inner]).astype(np.int64),
+    }
+
+
+def pareto_mask(tokens: np.ndarray) -> np.ndarray:
+    """
+    Mark the combinations for which no stricter combination keeps as many tokens.
+
+    Kept tokens never increase with strictness, so a combination is dominated exactly
+    when the next stricter threshold of some filter keeps the same number of tokens.
+    """
+    mask = np.ones(tokens.shape, dtype=bool)
+    for axis in range(tokens.ndim):
+        equal = np.diff(tokens, axis=axis) == 0
+        mask[tuple(slice(None, -1) if a == axis else slice(None) for a in range(tokens.ndim))] &= ~equal
+    return mask
+
+
+def sweep_table(result: dict, pareto_only: bool = False) -> list[dict]:
+    """
+    Flatten a sweep into one row per combination of thresholds.
+    """
+    pareto = pareto_mask(result["tokens"])
+    rows = []
+    for index in zip(*np.nonzero(pareto if pareto_only else np.ones_like(pareto))):
+        row = {f"{name}_threshold": float(grid[i]) for name, grid, i in zip(result["filters"], result["grids"], index)}
+        row["documents"] = int(result["documents"][index])
+        row["tokens"] = int(result["tokens"][index])
+        row["pareto"] = bool(pareto[index])
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("annotation_paths", nargs="+", help="Sidecars from `python -m cs336_data.annotations annotate`.")
+    parser.add_argument("--filters", nargs="+", default=["langid", "nsfw", "toxicity"], choices=list(FILTERS))
+    parser.add_argument("--grid", type=float, nargs="+", default=list(DEFAULT_GRID), help="Thresholds to try for every filter.")
+    for name in FILTERS:
+        parser.add_argument(f"--{name}-grid", type=float, nargs="+", help=f"Thresholds to try for {name} (default: --grid).")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--no-gopher", action="store_true", help="Do not apply the Gopher rules first.")
+    parser.add_argument("--bytes-per-token", type=float, default=DEFAULT_BYTES_PER_TOKEN)
+    parser.add_argument("--output", help="Write every combination to this JSON lines file.")
+    args = parser.parse_args()
+
+    columns = load_sweep_columns(args.annotation_paths, args.filters, args.language, gopher=not args.no_gopher)
+    grids = {name: getattr(args, f"{name}_grid") or args.grid for name in args.filters}
+    result = sweep(columns, grids, args.bytes_per_token)
+    if args.output:
+        with open(args.output, "w") as f:
+            for row in sweep_table(result):
+                f.write(json.dumps(row) + "\n")
+    for row in sweep_table(result, pareto_only=True):
+        print(json.dumps(row))
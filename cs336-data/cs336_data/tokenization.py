@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Tokenize filtered documents in parallel into uint16 memmap shards.
+
+Example:
+
+```
+python -m cs336_data.tokenization data/filtered.docs --output-dir data/tokens --prefix train
+```
+
+Each shard `<prefix>-00000.bin` is a flat array of uint16 token ids that
+`scripts/train.py` can memmap directly, with an end-of-text token after every
+document. Next to it, `<prefix>-00000.idx` holds the uint64 end offset (in tokens)
+of every document in the shard, so document i spans [idx[i - 1], idx[i]) with
+idx[-1] taken to be 0.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from cs336_data import metrics
+from cs336_data.corpus import read_corpus
+
+# Initial size of a shard's memmap; it grows geometrically up to the shard size.
+INITIAL_CAPACITY = 1 << 20
+
+
+def get_tokenizer(name: str):
+    """
+    Load a tiktoken encoding by name (e.g. "gpt2").
+
+    Any object with `encode_ordinary(text) -> list[int]`, `eot_token` and `n_vocab`
+    attributes can be used instead.
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+class MemmapShardWriter:
+    """
+    Write tokenized documents into `<prefix>-NNNNN.bin` uint16 memmap shards with a
+    `<prefix>-NNNNN.idx` document end-offset index alongside.
+
+    Shard files are pre-sized (sparsely) and grown geometrically, so batches are
+    copied straight into the mapped file; each shard is truncated to its final size
+    when it is closed. Documents are never split across shards.
+
+    Args:
+        output_dir (str or Path): Directory to write the shards in.
+        prefix (str): Shard file name prefix, e.g. "train".
+        shard_tokens (int, optional): Maximum tokens per shard (default: a single shard).
+    """
+
+    def __init__(self, output_dir: str | Path, prefix: str, shard_tokens: int | None = None):
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.shard_tokens = shard_tokens
+        self.shards = []
+        self._memmap = None
+        self._index_file = None
+        self._size = 0
+        self._capacity = 0
+
+    def _path(self, suffix: str) -> Path:
+        return self.output_dir / f"{self.prefix}-{len(self.shards) - 1:05d}{suffix}"
+
+    def _open_shard(self) -> None:
+        self.close()
+        self.shards.append({"path": f"{self.prefix}-{len(self.shards):05d}.bin", "tokens": 0, "documents": 0})
+        open(self._path(".bin"), "wb").close()
+        self._index_file = open(self._path(".idx"), "wb")
+        self._size = 0
+        self._capacity = 0
+
+    def _reserve(self, num_tokens: int) -> None:
+        needed = self._size + num_tokens
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, 2 * self._capacity, INITIAL_CAPACITY)
+        if self.shard_tokens is not None:
+            capacity = max(needed, min(capacity, self.shard_tokens))
+        if self._memmap is not None:
+            self._memmap.flush()
+            self._memmap = None
+        os.truncate(self._path(".bin"), capacity * 2)
+        self._memmap = np.memmap(self._path(".bin"), dtype=np.uint16, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def write_batch(self, tokens: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        Append a batch of documents.
+
+        Args:
+            tokens (np.ndarray): uint16 token ids of the documents, concatenated.
+            lengths (np.ndarray): Number of tokens of each document.
+        """
+        ends = np.cumsum(lengths, dtype=np.uint64)
+        start_doc = 0
+        start_token = 0
+        while start_doc < len(lengths):
+            if self._index_file is None:
+                self._open_shard()
+            if self.shard_tokens is None:
+                end_doc = len(lengths)
+            else:
+                # Take as many whole documents as fit, and at least one into an empty shard.
+                room = self.shard_tokens - self._size + start_token
+                end_doc = int(np.searchsorted(ends, room, side="right"))
+                if end_doc <= start_doc:
+                    if self._size > 0:
+                        self._open_shard()
+                        continue
+                    end_doc = start_doc + 1
+            end_token = int(ends[end_doc - 1])
+            num_tokens = end_token - start_token
+            self._reserve(num_tokens)
+            self._memmap[self._size:self._size + num_tokens] = tokens[start_token:end_token]
+            (ends[start_doc:end_doc] - start_token + self._size).tofile(self._index_file)
+            self._size += num_tokens
+            self.shards[-1]["tokens"] += num_tokens
+            self.shards[-1]["documents"] += end_doc - start_doc
+            start_doc, start_token = end_doc, end_token
+
+    def close(self) -> None:
+        if self._index_file is None:
+            return
+        if self._memmap is not None:
+            self._memmap.flush()
+            self._memmap = None
+        os.truncate(self._path(".bin"), self._size * 2)
+        self._index_file.close()
+        self._index_file = None
+
+
+_tokenizer = None
+
+
+def _tokenize_batch(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    with metrics.timer("tokenize_batch"):
+        if hasattr(_tokenizer, "encode_ordinary_batch"):
+            encoded = _tokenizer.encode_ordinary_batch(texts)
+        else:
+            encoded = [_tokenizer.encode_ordinary(text) for text in texts]
+        lengths = np.fromiter((len(ids) + 1 for ids in encoded), dtype=np.int64, count=len(encoded))
+        tokens = np.empty(int(lengths.sum()), dtype=np.uint16)
+        position = 0
+        for ids, length in zip(encoded, lengths):
+            tokens[position:position + length - 1] = ids
+            tokens[position + length - 1] = _tokenizer.eot_token
+            position += length
+    return tokens, lengths
+
+
+def _batches(documents, batch_size: int):
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def parallel_tokenize(documents, tokenizer, num_workers: int | None = None, batch_size: int = 1000, max_in_flight: int | None = None):
+    """
+    Tokenize documents in worker processes, yielding (tokens, lengths) batches in input order.
+
+    Only `max_in_flight` batches are read ahead of the consumer, so the input can be a
+    lazily read corpus of any size.
+
+    Args:
+        documents (iterable of str): Documents to tokenize.
+        tokenizer: Object with `encode_ordinary`, `eot_token` (and optionally
+            `encode_ordinary_batch`); inherited by the forked workers.
+        num_workers (int, optional): Number of worker processes (default: CPU count).
+        batch_size (int): Documents per task.
+        max_in_flight (int, optional): Maximum batches queued or being tokenized
+            (default: twice the number of workers).
+
+    Yields:
+        A uint16 array with each document's tokens followed by the end-of-text token,
+        and an int64 array with each document's length including that token.
+    """
+    global _tokenizer
+    if tokenizer.n_vocab > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Vocabulary of size {tokenizer.n_vocab} does not fit in uint16.")
+    _tokenizer = tokenizer
+    num_workers = num_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * num_workers
+    with multiprocessing.get_context("fork").Pool(num_workers) as pool:
+        pending = deque()
+        for batch in _batches(documents, batch_size):
+            pending.append(pool.apply_async(_tokenize_batch, (batch,)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def tokenize_to_shards(
+    documents,
+    output_dir: str | Path,
+    prefix: str = "train",
+    tokenizer="gpt2",
+    num_workers: int | None = None,
+    shard_tokens: int | None = None,
+    batch_size: int = 1000,
+) -> list[dict]:
+    """
+    Tokenize documents in parallel and write them to uint16 memmap shards.
+
+    Args:
+        documents (iterable of str): Documents to tokenize.
+        output_dir (str or Path): Directory to write the shards in.
+        prefix (str): Shard file name prefix.
+        tokenizer: tiktoken encoding name, or a tokenizer object (see `get_tokenizer`).
+        num_workers (int, optional): Number of worker processes.
+        shard_tokens (int, optional): Maximum tokens per shard (default: a single shard).
+        batch_size (int): Documents per worker task.
+
+    Returns:
+        One dict per shard with its file name, number of tokens and number of documents.
+    """
+    if isinstance(tokenizer, str):
+        tokenizer = get_tokenizer(tokenizer)
+    os.makedirs(output_dir, exist_ok=True)
+    writer = MemmapShardWriter(output_dir, prefix, shard_tokens)
+    for tokens, lengths in parallel_tokenize(documents, tokenizer, num_workers, batch_size):
+        writer.write_batch(tokens, lengths)
+    writer.close()
+    return writer.shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Corpus files (.docs, .jsonl or .jsonl.gz; see cs336_data.corpus).")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--prefix", default="train")
+    parser.add_argument("--tokenizer", default="gpt2", help="tiktoken encoding name.")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-tokens", type=int)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    shards = tokenize_to_shards(
+        read_corpus(args.inputs),
+        args.output_dir,
+        prefix=args.prefix,
+        tokenizer=args.tokenizer,
+        num_workers=args.num_workers,
+        shard_tokens=args.shard_tokens,
+        batch_size=args.batch_size,
+    )
+    print(json.dumps(shards, indent=2))
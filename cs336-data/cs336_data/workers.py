@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import resource
+
+from cs336_data import identify_text, quality_classifier
+
+
+def preload_models(include_quality: bool = True, missing_ok: bool = False) -> list[str]:
+    """
+    Load the language ID, NSFW, hatespeech and quality models into this process's caches.
+
+    Called in the parent before forking so that workers inherit the loaded models as
+    shared copy-on-write pages instead of each loading their own copy.
+
+    Args:
+        include_quality (bool): Also load the quality classifier.
+        missing_ok (bool): Skip models whose files do not exist instead of raising.
+
+    Returns:
+        The paths of the models that were loaded.
+    """
+    paths = [
+        identify_text.LANGUAGE_MODEL_PATH,
+        identify_text.NSFW_MODEL_PATH,
+        identify_text.HATESPEECH_MODEL_PATH,
+    ]
+    loaded = []
+    for path in paths:
+        if missing_ok and not os.path.exists(path):
+            continue
+        identify_text.load_model(path)
+        loaded.append(path)
+    if include_quality:
+        quality_path = quality_classifier.resolve_model_path(quality_classifier.QUALITY_MODEL_PATH)
+        if not (missing_ok and not quality_path.exists()):
+            quality_classifier.get_quality_model()
+            loaded.append(str(quality_path))
+    return loaded
+
+
+def memory_usage() -> dict:
+    """
+    Memory usage of the current process, in bytes.
+
+    On Linux this reads /proc/self/smaps_rollup, which splits resident memory into
+    pages shared with other processes and pages private to this one. `pss` charges
+    each shared page proportionally to every process mapping it, so summing `pss`
+    over the parent and workers gives their true combined footprint.
+    """
+    usage = {"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return usage
+    usage["rss"] = fields.get("Rss", 0)
+    usage["pss"] = fields.get("Pss", 0)
+    usage["shared"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    usage["private"] = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return usage
+
+
+_barrier = None
+
+
+def _init_worker(barrier, preload_args):
+    global _barrier
+    _barrier = barrier
+    if preload_args is not None:
+        preload_models(*preload_args)
+
+
+def _report_worker_memory(_):
+    # Every worker blocks here until all of them have picked up a task, so each
+    # worker reports exactly once.
+    _barrier.wait(timeout=60)
+    return {"pid": os.getpid(), **memory_usage()}
+
+
+class FilterPool:
+    """
+    Process pool for cs336_data filters whose workers share the parent's loaded models.
+
+    The models are loaded in the parent and the workers are forked afterwards, so the
+    model weights are inherited as read-only copy-on-write pages rather than loaded once
+    per worker. The garbage collector is frozen before forking so that collections in
+    the workers do not touch (and therefore copy) the parent's objects.
+
+    Usage:
+        with FilterPool(num_workers=8) as pool:
+            labels = pool.map(identify_text.identify_language, documents)
+            print(pool.memory_report())
+
+    Args:
+        num_workers (int, optional): Number of worker processes (default: CPU count).
+        share_models (bool): Load all models in the parent before forking. If False, every
+            worker loads its own copy at startup instead (useful as a baseline).
+        include_quality (bool): Also load the quality classifier.
+        missing_ok (bool): Skip models whose files do not exist.
+    """
+
+    def __init__(self, num_workers: int | None = None, share_models: bool = True, include_quality: bool = True, missing_ok: bool = False):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        preload_args = (include_quality, missing_ok)
+        if share_models:
+            self.loaded_models = preload_models(*preload_args)
+            preload_args = None
+        else:
+            self.loaded_models = []
+        context = multiprocessing.get_context("fork")
+        self._barrier = context.Barrier(self.num_workers)
+        gc.freeze()
+        try:
+            self._pool = context.Pool(self.num_workers, initializer=_init_worker, initargs=(self._barrier, preload_args))
+        except BaseException:
+            # close() will never run, so undo the freeze here.
+            gc.unfreeze()
+            raise
+
+    def map(self, func, iterable, chunksize: int = 64) -> list:
+        return self._pool.map(func, iterable, chunksize)
+
+    def imap(self, func, iterable, chunksize: int = 64):
+        return self._pool.imap(func, iterable, chunksize)
+
+    def memory_report(self) -> dict:
+        """
+        Measure the parent's and every worker's memory usage.
+
+        Returns:
+            A dict with the parent's usage, a list with each worker's usage, and the mean
+            private (unshared) bytes per worker, which is the marginal cost of one more worker.
+        """
+        workers = self._pool.map(_report_worker_memory, range(self.num_workers), chunksize=1)
+        report = {"models": self.loaded_models, "parent": memory_usage(), "workers": workers}
+        if workers and "private" in workers[0]:
+            report["mean_worker_private"] = sum(w["private"] for w in workers) / len(workers)
+        return report
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        gc.unfreeze()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-worker memory with models shared across forked workers.")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-share", action="store_true", help="Let each worker load its own models instead.")
+    parser.add_argument("--missing-ok", action="store_true", help="Skip models that have not been downloaded.")
+    args = parser.parse_args()
+
+    with FilterPool(args.num_workers, share_models=not args.no_share, missing_ok=args.missing_ok) as pool:
+        print(json.dumps(pool.memory_report(), indent=2))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from cs336_data.annotations import annotate_warc, filter_annotated, load_annotations, select
+from cs336_data.identify_text import SamplingPolicy
+from cs336_data.pipeline import filter_warc
+
+from .common import FIXTURES_PATH
+from .test_pipeline import write_warc
+
+
+def _read_jsonl(path):
+    with gzip.open(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_filter_annotated_matches_pipeline(tmp_path):
+    moby = (FIXTURES_PATH / "moby.html").read_bytes()
+    paragraph = "<p>" + "This is a perfectly reasonable sentence about whales. " * 20 + "</p>"
+    write_warc(tmp_path / "a.warc.gz", [
+        ("http://example.com/moby", moby),
+        ("http://example.com/empty", b"<html><body></body></html>"),
+        ("http://example.com/short", b"<html><body><p>Too short.</p></body></html>"),
+        ("http://example.com/contact", f"<html><body>{paragraph}<p>Mail me at whale@sea.org</p></body></html>".encode()),
+    ])
+    annotate_warc((tmp_path / "a.warc.gz", tmp_path / "a.npz"))
+    annotations = load_annotations(tmp_path / "a.npz")
+    assert annotations["extracted"].tolist() == [True, False, True, True]
+
+    expected = filter_warc((tmp_path / "a.warc.gz", tmp_path / "expected.jsonl.gz", {"stages": ["gopher", "pii"]}))
+    stats = filter_annotated([tmp_path / "a.npz"], tmp_path / "filtered.jsonl.gz", stages=["gopher", "pii"])
+    assert stats == expected
+    assert _read_jsonl(tmp_path / "filtered.jsonl.gz") == _read_jsonl(tmp_path / "expected.jsonl.gz")
+    assert "|||EMAIL_ADDRESS|||" in _read_jsonl(tmp_path / "filtered.jsonl.gz")[-1]["text"]
+
+    # New thresholds apply to the stored columns without touching the WARC.
+    keep, stats = select(annotations, ["gopher"], {"min_words": 1})
+    assert keep.tolist() == [True, False, True, True]
+    assert stats["dropped_extract"] == 1 and stats["kept"] == 3
+    keep, stats = select(annotations, ["gopher"], {"max_words": 150})
+    assert keep.tolist() == [True, False, False, False]
+    assert stats["dropped_gopher"] == 2
+
+
+def test_select_rejects_missing_model_scores(tmp_path):
+    write_warc(tmp_path / "a.warc.gz", [("http://example.com/", b"<html><body><p>Some text.</p></body></html>")])
+    annotate_warc((tmp_path / "a.warc.gz", tmp_path / "a.npz"))
+    annotations = load_annotations(tmp_path / "a.npz")
+    annotations["nsfw_score"][:] = np.nan
+    with pytest.raises(ValueError):
+        select(annotations, ["nsfw"], {"nsfw_threshold": 0.7})
+    with pytest.raises(ValueError):
+        select(annotations, ["unknown"], {})
+
+
+def test_select_rejects_other_sampling_policy(tmp_path):
+    write_warc(tmp_path / "a.warc.gz", [("http://example.com/", b"<html><body><p>Some text.</p></body></html>")])
+    annotate_warc((tmp_path / "a.warc.gz", tmp_path / "a.npz", SamplingPolicy("head", max_chars=500)))
+    annotations = load_annotations(tmp_path / "a.npz")
+    assert annotations["sampling"] == SamplingPolicy("head", max_chars=500).to_dict()
+    # The policy only matters to the langid, NSFW and toxicity stages.
+    select(annotations, ["gopher"], {"sampling": {"policy": "full", "max_chars": 1000}})
+    with pytest.raises(ValueError, match="sampling policy"):
+        select(annotations, ["nsfw"], {"sampling": {"policy": "full", "max_chars": 1000}, "nsfw_threshold": 0.7})
+    with pytest.raises(ValueError, match="sampling policy"):
+        filter_annotated([tmp_path / "a.npz"], stages=["langid"], sampling="head", sampling_chars=1000)
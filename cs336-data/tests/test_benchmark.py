@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import logging
+import os
+import signal
+
+from cs336_data import benchmark
+from cs336_data.benchmark import (
+    FIXTURES,
+    compare_results,
+    evaluate_sampling,
+    generate_documents,
+    make_long_documents,
+    measure_import_times,
+    run_benchmarks,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_generate_documents_duplicates():
+    documents = generate_documents(200, words_per_doc=50, duplicate_rate=0.25, near_duplicate_rate=0.0, seed=1)
+    assert len(documents) == 200
+    num_exact_duplicates = len(documents) - len(set(documents))
+    assert 30 < num_exact_duplicates < 70
+    assert documents == generate_documents(200, words_per_doc=50, duplicate_rate=0.25, near_duplicate_rate=0.0, seed=1)
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(["gopher", "exact_dedup"], num_docs=20, words_per_doc=50, workers=[1, 2])
+    stages = [(r["stage"], r["workers"]) for r in report["results"]]
+    assert stages == [("gopher", 1), ("gopher", 2), ("exact_dedup", 1)]
+    for result in report["results"]:
+        assert result["docs_per_second"] > 0
+        assert result["peak_rss_bytes"] > 0
+    assert all(row["speedup"] == 1.0 for row in compare_results(report, report))
+
+
+def test_evaluate_sampling(monkeypatch):
+    def count_words(text, sampling=benchmark.SAMPLING_POLICIES["full"]):
+        # Labels a document by whether most of the words it reads are "whale".
+        words = " ".join(sampling.samples(text)).split()
+        share = sum(word == "whale" for word in words) / len(words)
+        return ("whale" if share > 0.5 else "other"), share
+
+    monkeypatch.setitem(benchmark.SAMPLING_MODELS, "words", (count_words, None))
+    documents = ["whale " * 5000 + "sea " * 100, "sea " * 3000 + "whale " * 4000]
+    results = evaluate_sampling(["words"], ["head", "windows_mean"], documents)
+    assert [r["policy"] for r in results] == ["full", "head", "windows_mean"]
+    assert results[0]["agreement"] == 1.0 and results[0]["speedup"] == 1.0
+    # The head of the second document has no whales.
+    assert results[1]["agreement"] == 0.5
+    assert all(r["docs_per_second"] > 0 for r in results)
+    assert len(make_long_documents(lengths=(5000,))) == len(list(FIXTURES.rglob("*.txt"))) + 4
+
+
+def test_measure_import_times():
+    results = measure_import_times(["cs336_data.extract_text", "cs336_data.identify_text"], repeats=1)
+    assert [r["module"] for r in results] == ["cs336_data.extract_text", "cs336_data.identify_text"]
+    # The parser and classifier libraries are only imported when first used.
+    assert all(r["heavy_imports"] == [] and r["import_seconds"] > 0 for r in results)
+
+
+def _crash():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_isolated_reports_killed_child():
+    assert benchmark._isolated(lambda x: {"seconds": x}, 1.5) == {"seconds": 1.5}
+    result = benchmark._isolated(_crash, poll_interval=0.1)
+    assert result == {"error": f"Measurement process exited with code {-signal.SIGKILL}"}
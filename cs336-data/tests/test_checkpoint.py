@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import pytest
+
+from cs336_data import deduplication
+from cs336_data.checkpoint import ProgressManifest, atomic_write
+
+from .common import FIXTURES_PATH
+
+
+def test_atomic_write_keeps_old_contents_on_error(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write("partial")
+            raise RuntimeError("crash")
+    assert path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [path]
+
+    with atomic_write(path) as f:
+        f.write("new")
+    assert path.read_text() == "new"
+
+
+def test_progress_manifest_resume(tmp_path):
+    progress = ProgressManifest(tmp_path, config={"n": 1})
+    progress.commit("a", info={"docs": 3}, state=[1, 2, 3])
+    progress.commit("b")
+
+    resumed = ProgressManifest(tmp_path, config={"n": 1})
+    assert resumed.done("a") and resumed.done("b") and not resumed.done("c")
+    assert resumed.info("a") == {"docs": 3}
+    assert resumed.load_state("a") == [1, 2, 3]
+    assert resumed.load_state("b") is None
+    assert resumed.last_key() == "b"
+    resumed.discard_state("a")
+    assert ProgressManifest(tmp_path, config={"n": 1}).load_state("a") is None
+
+    with pytest.raises(ValueError):
+        ProgressManifest(tmp_path, config={"n": 2})
+
+
+def test_progress_manifest_appends_commits(tmp_path):
+    progress = ProgressManifest(tmp_path, config={"inputs": "abc"})
+    config_bytes = (tmp_path / "progress.json").read_bytes()
+    for i in range(3):
+        progress.commit(f"shard-{i}", info={"i": i})
+    # Commits only append to the log; the configuration is written once.
+    assert (tmp_path / "progress.json").read_bytes() == config_bytes
+    assert len((tmp_path / "progress.log").read_text().splitlines()) == 3
+
+    # A line cut short by a crash is dropped, and later commits still parse.
+    with open(tmp_path / "progress.log", "a") as f:
+        f.write('{"key": "shard-3", "in')
+    resumed = ProgressManifest(tmp_path, config={"inputs": "abc"})
+    assert list(resumed.completed) == ["shard-0", "shard-1", "shard-2"]
+    resumed.commit("shard-3")
+    assert ProgressManifest(tmp_path, config={"inputs": "abc"}).done("shard-3")
+
+
+def test_progress_manifest_recommit_keeps_states_apart(tmp_path):
+    progress = ProgressManifest(tmp_path)
+    progress.commit("x", state="X1")
+    progress.commit("x", state="X2")
+    progress.commit("y", state="Y")
+    resumed = ProgressManifest(tmp_path)
+    assert resumed.load_state("x") == "X2"
+    assert resumed.load_state("y") == "Y"
+
+
+def test_minhash_deduplication_resumes_signatures(tmp_path, monkeypatch):
+    paths = sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    compute_signatures = deduplication.compute_signatures
+    calls = []
+
+    def crash_after_first_chunk(texts, num_hashes, ngram_length):
+        calls.append(len(texts))
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return compute_signatures(texts, num_hashes, ngram_length)
+
+    monkeypatch.setattr(deduplication, "compute_signatures", crash_after_first_chunk)
+    args = (paths, 100, 10, 5, tmp_path / "out")
+    with pytest.raises(KeyboardInterrupt):
+        deduplication.run_minhash_deduplication(*args, checkpoint_dir=tmp_path / "ckpt", checkpoint_every=1)
+    assert not (tmp_path / "out").exists() or not list((tmp_path / "out").iterdir())
+
+    # The rerun only computes the signatures of the two documents that were not saved.
+    def count_calls(texts, num_hashes, ngram_length):
+        calls.append(len(texts))
+        return compute_signatures(texts, num_hashes, ngram_length)
+
+    calls.clear()
+    monkeypatch.setattr(deduplication, "compute_signatures", count_calls)
+    deduplication.run_minhash_deduplication(*args, checkpoint_dir=tmp_path / "ckpt", checkpoint_every=1)
+    assert calls == [1, 1]
+    assert len(list((tmp_path / "out").iterdir())) == len(paths) - 1
+
+    # Once the documents to keep are saved, a rerun only reads those.
+    read_files = deduplication.read_files
+    read = []
+
+    def count_reads(paths, **kwargs):
+        paths = list(paths)
+        read.extend(paths)
+        return read_files(paths, **kwargs)
+
+    calls.clear()
+    monkeypatch.setattr(deduplication, "read_files", count_reads)
+    deduplication.run_minhash_deduplication(*args, checkpoint_dir=tmp_path / "ckpt", checkpoint_every=1)
+    assert calls == []
+    assert len(read) == len(set(read)) == len(paths) - 1
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import pytest
+
+from cs336_data.corpus import PackedCorpus, open_corpus_writer, read_corpus, write_corpus
+from cs336_data.deduplication import exact_deduplicate_corpus, minhash_deduplicate_corpus
+
+from .common import FIXTURES_PATH
+
+
+@pytest.mark.parametrize("suffix", [".docs", ".jsonl", ".jsonl.gz"])
+def test_corpus_round_trip(tmp_path, suffix):
+    documents = [f"document {i}\nwith ünïcode and a second line" * (i % 3) for i in range(1000)]
+    path = tmp_path / f"corpus{suffix}"
+    assert write_corpus(path, documents) == len(documents)
+    assert list(read_corpus(path)) == documents
+    assert not any(p.name.startswith(".") for p in tmp_path.iterdir())
+
+
+def test_packed_corpus_random_access(tmp_path):
+    documents = ["", "short", "é" * 10000, "last"]
+    path = tmp_path / "corpus.docs"
+    write_corpus(path, documents)
+    packed = PackedCorpus(path)
+    assert len(packed) == 4
+    assert packed[2] == documents[2]
+    assert packed[-1] == "last"
+    assert bytes(packed.get_bytes(1)) == b"short"
+    with pytest.raises(IndexError):
+        packed[4]
+
+
+def test_corpus_writer_discards_on_error(tmp_path):
+    path = tmp_path / "corpus.docs"
+    with pytest.raises(RuntimeError):
+        with open_corpus_writer(path) as writer:
+            writer.add("partial")
+            raise RuntimeError("crash")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_deduplicate_packed_corpus(tmp_path):
+    paths = sorted((FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt"))
+    packed = tmp_path / "input.docs"
+    write_corpus(packed, read_corpus(paths))
+
+    exact_deduplicate_corpus(packed, tmp_path / "lines.docs")
+    expected = sorted(p.read_text() for p in (FIXTURES_PATH / "documents_line_deduplicated").glob("doc*.txt"))
+    assert sorted(read_corpus(tmp_path / "lines.docs")) == expected
+
+    # doc1.txt and doc2.txt are exact duplicates.
+    assert minhash_deduplicate_corpus(packed, tmp_path / "fuzzy.jsonl.gz", 100, 10, 5) == len(paths) - 1
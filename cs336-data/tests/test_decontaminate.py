@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import json
+
+import numpy as np
+
+from cs336_data.corpus import read_corpus, write_corpus
+from cs336_data.decontaminate import NgramBloomFilter, build_index, decontaminate, read_eval_texts, run_decontamination
+
+
+def test_bloom_filter_has_no_false_negatives(tmp_path):
+    rng = np.random.default_rng(0)
+    items = rng.integers(0, 2**63, size=10000, dtype=np.uint64)
+    bloom = NgramBloomFilter.for_capacity(len(items), false_positive_rate=1e-3)
+    bloom.add(items)
+    bloom.save(tmp_path / "index.npz")
+    loaded = NgramBloomFilter.load(tmp_path / "index.npz")
+    assert loaded.contains(items).all()
+    others = rng.integers(0, 2**63, size=100000, dtype=np.uint64)
+    assert loaded.contains(others).mean() < 3e-3
+    assert loaded.false_positive_rate() < 3e-3
+
+
+def test_decontaminate_drops_and_masks_overlapping_documents(tmp_path):
+    question = "Which river flows through the city of Paris before it reaches the English Channel at Le Havre?"
+    with open(tmp_path / "eval.jsonl", "w") as f:
+        f.write(json.dumps({"id": 1, "question": question, "choices": ["Seine", "Loire"]}) + "\n")
+    index = build_index(read_eval_texts([str(tmp_path / "eval.jsonl")]))
+
+    leaked = f"Quiz night! {question.upper()} Answer: the Seine."
+    clean = "Paris is the capital of France, and the Seine flows through the city on its way to the sea."
+    # The last 13 words of one document and the first of the next must not match.
+    words = question.split()
+    split = [" ".join(words[:7]), " ".join(words[7:])]
+    documents = [leaked, clean, *split]
+
+    stats = {}
+    assert list(decontaminate(documents, index, stats=stats, batch_size=3)) == [clean, *split]
+    assert stats["documents"] == 4
+    assert stats["contaminated"] == 1
+    assert list(decontaminate(documents, index, mode="mask")) == ["Quiz night! ? Answer: the Seine.", clean, *split]
+
+    write_corpus(tmp_path / "corpus.docs", documents)
+    index.save(tmp_path / "index.npz")
+    stats = run_decontamination([tmp_path / "corpus.docs"], tmp_path / "out.jsonl", tmp_path / "index.npz")
+    assert list(read_corpus(tmp_path / "out.jsonl")) == [clean, *split]
+    assert stats["contaminated"] == 1
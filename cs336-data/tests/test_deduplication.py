@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import logging
 
+import pytest
 from xopen import xopen
 
+from cs336_data import deduplication, readers
+from cs336_data.deduplication import choose_lsh_parameters, estimate_candidate_pairs, stripped_lines
+
 from .adapters import run_exact_line_deduplication, run_minhash_deduplication
 from .common import FIXTURES_PATH
 
@@ -131,3 +135,108 @@ def test_minhash_deduplication_fuzzy_duplicates(tmp_path):
     assert len(deduplicated_documents) == 0
     # One of the kept deduplicated documents should be kept, and the other should be removed.
     assert len(kept_duplicated_documents) == 1
+
+
+def test_choose_lsh_parameters():
+    params = choose_lsh_parameters(0.8)
+    assert params["num_bands"] * params["rows_per_band"] == params["num_hashes"] <= 128
+    assert abs(params["threshold"] - 0.8) < 0.1
+    # Weighting missed duplicates more heavily moves the S-curve to lower similarities.
+    recall_heavy = choose_lsh_parameters(0.8, false_negative_weight=0.9, false_positive_weight=0.1)
+    assert recall_heavy["false_negative"] < params["false_negative"]
+    assert recall_heavy["false_positive"] > params["false_positive"]
+    assert choose_lsh_parameters(0.8, max_hashes=100, num_bands=10)["rows_per_band"] == 10
+
+
+def test_minhash_deduplication_automatic_lsh_parameters(tmp_path):
+    paths = list((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    run_minhash_deduplication(
+        input_files=paths,
+        output_directory=tmp_path,
+        num_hashes=None,
+        num_bands=None,
+        ngrams=5,
+        jaccard_threshold=0.8,
+    )
+    outputs = {path.name for path in tmp_path.glob("*")}
+    assert "pytorch_license.txt" in outputs
+    assert len(outputs & {"rails_mit_license.txt", "react_mit_license.txt"}) == 1
+    signatures = [[1, 2, 3, 4], [1, 2, 3, 4], [5, 6, 7, 8]]
+    assert estimate_candidate_pairs(signatures, 2, 2) == pytest.approx(1.0)
+
+
+def test_minhash_deduplication_stats(tmp_path):
+    paths = sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    stats = deduplication.run_minhash_deduplication(paths, None, None, 5, tmp_path, jaccard_threshold=0.8)
+    assert stats == {**choose_lsh_parameters(0.8), **{key: stats[key] for key in ("documents", "kept", "candidate_pairs", "expected_candidate_pairs")}}
+    assert stats["documents"] == len(paths) and stats["kept"] == len(list(tmp_path.iterdir()))
+    assert stats["candidate_pairs"] >= 1 and stats["expected_candidate_pairs"] > 0
+
+    # Explicit parameters are described too; the estimate is only made on request.
+    texts = [path.read_text() for path in paths]
+    _, stats = deduplication.minhash_deduplication_stats(texts, 100, 10, 5, 0.8)
+    assert (stats["num_bands"], stats["rows_per_band"]) == (10, 10)
+    assert 0 < stats["false_negative"] < 1 and stats["expected_candidate_pairs"] is None
+
+
+def test_stripped_lines_match_text_mode(tmp_path):
+    text = (
+        "plain line\n  indented\t\r\nold mac\rline\n\n   \n"
+        "\u3000ideographic space\u3000\n\xa0nbsp\xa0\n\x1cfile separator\x1f\n\x85next line\x85\n"
+        "inner\u2028separator\u2028\n\x0bvertical tab\x0c\n\ufeffbom\n\xe9t\xe9\n \u2003 \n"
+    )
+    path = tmp_path / "doc.txt"
+    path.write_bytes(text.encode("utf-8"))
+    with open(path, encoding="utf-8") as f:
+        expected = [line.strip().encode("utf-8") for line in f if line.strip()]
+    assert list(stripped_lines(path.read_bytes())) == expected
+
+
+def test_line_hash_matches_for_text_and_bytes():
+    lines = ["same line", "other", "same line", "\xe9t\xe9"]
+    text_counts = deduplication.count_line_hashes(["\n".join(lines)])
+    byte_counts = {}
+    for line in stripped_lines("\n".join(lines).encode("utf-8")):
+        h = deduplication.line_hash(line)
+        byte_counts[h] = byte_counts.get(h, 0) + 1
+    assert text_counts == byte_counts
+    assert all(isinstance(h, bytes) and len(h) == 16 for h in text_counts)
+
+
+def test_exact_line_deduplication_memory_mapped_chunks(tmp_path, monkeypatch):
+    # Map every file and scan it in tiny chunks, so lines and \r\n pairs straddle chunk boundaries.
+    monkeypatch.setattr(readers, "MIN_MAP_SIZE", 0)
+    monkeypatch.setattr(deduplication, "LINE_CHUNK_SIZE", 7)
+    text = "first line\r\nshared\r\n\xe9t\xe9 \u3000\rshared\nlast line without newline"
+    path = tmp_path / "doc.txt"
+    path.write_bytes(text.encode("utf-8"))
+    with open(path, encoding="utf-8") as f:
+        expected = [line.strip().encode("utf-8") for line in f if line.strip()]
+    assert list(deduplication.stripped_lines(readers._map_file(path))) == expected
+
+    deduplication.exact_deduplication([path], tmp_path / "out")
+    assert (tmp_path / "out" / "doc.txt").read_text() == "first line\n\xe9t\xe9\nlast line without newline\n"
+
+
+def test_approximate_line_deduplication(tmp_path, monkeypatch):
+    paths = sorted((FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt"))
+    exact = deduplication.exact_deduplication(paths, tmp_path / "exact")
+    assert exact["estimate"] is None
+    # Small batches, so lines repeated across batches are caught through the filters.
+    monkeypatch.setattr(deduplication, "APPROXIMATE_BATCH_LINES", 3)
+    approximate = deduplication.exact_deduplication(paths, tmp_path / "approximate", memory_budget=1 << 16)
+    for path in paths:
+        assert (tmp_path / "approximate" / path.name).read_text() == (tmp_path / "exact" / path.name).read_text()
+    assert approximate["lines"] == exact["lines"] and approximate["kept_lines"] == exact["kept_lines"]
+    assert approximate["estimate"]["unique_lines_removed"] < 1e-6
+
+    # With a tiny budget the filters fill up: duplicates are still removed, along
+    # with unique lines, and the estimate reflects it.
+    lines = [f"line {i}" for i in range(2000)]
+    (tmp_path / "a.txt").write_text("\n".join(lines[:1000] + ["shared"]))
+    (tmp_path / "b.txt").write_text("\n".join(lines[1000:] + ["shared"]))
+    estimate = deduplication.exact_deduplication([tmp_path / "a.txt", tmp_path / "b.txt"], tmp_path / "tiny", memory_budget=64)["estimate"]
+    kept = (tmp_path / "tiny" / "a.txt").read_text().splitlines() + (tmp_path / "tiny" / "b.txt").read_text().splitlines()
+    assert "shared" not in kept
+    assert estimate["unique_lines_removed"] > 0.5
+    assert len(kept) < 2000 * (1 - estimate["unique_lines_removed"] / 2)
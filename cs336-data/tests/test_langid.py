@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 import logging
 
+import numpy as np
+
+from cs336_data import identify_text
+from cs336_data.identify_text import SamplingPolicy
+
 from .adapters import run_identify_language
 from .common import FIXTURES_PATH
 
@@ -26,3 +31,58 @@ def test_identify_language_chinese_simplified():
     assert predicted_language == "zh"
     assert isinstance(score, float)
     assert score > 0
+
+
+def test_sampling_policy_bounds_samples():
+    text = " ".join(f"word{i}" for i in range(2000))
+    assert SamplingPolicy("full").samples(text) == [text]
+    assert SamplingPolicy("head", max_chars=20000).samples(text) == [text]
+    for policy in ("head", "head_tail", "windows"):
+        samples = SamplingPolicy(policy, max_chars=1000, num_windows=5).samples(text)
+        assert len(samples) == {"head": 1, "head_tail": 2, "windows": 5}[policy]
+        assert sum(len(sample) for sample in samples) <= 1000
+        # Samples are cut at whitespace.
+        assert all(set(sample.split()) <= set(text.split()) for sample in samples)
+    head, tail = SamplingPolicy("head_tail", max_chars=1000).samples(text)
+    assert text.startswith(head) and text.endswith(tail)
+    windows = SamplingPolicy("windows", max_chars=1000, num_windows=5).samples(text)
+    assert text.startswith(windows[0]) and text.endswith(windows[-1])
+
+
+def test_sampling_policy_without_whitespace():
+    # Text without spaces (the Chinese example above) is cut at characters.
+    text = "\u6b22\u8fce\u6765\u5230\u6211\u4eec\u7684\u7f51\u7ad9" * 200
+    for policy in ("head", "head_tail", "windows"):
+        samples = SamplingPolicy(policy, max_chars=100, num_windows=4).samples(text)
+        assert samples and all(samples)
+        assert sum(len(sample) for sample in samples) <= 100
+        assert all(sample in text for sample in samples)
+
+
+class WordCountModel:
+    """Labels text by the share of English and German words, like a fastText model."""
+
+    def _predict(self, text):
+        words = text.split()
+        english = sum(word in ("the", "whale", "and", "sea") for word in words) / max(len(words), 1)
+        return ("__label__en", "__label__de"), np.array([english, 1 - english])
+
+    def predict(self, text, k=1):
+        if isinstance(text, str):
+            labels, probs = self._predict(text)
+            order = np.argsort(-probs)[:k]
+            return tuple(labels[i] for i in order), probs[order]
+        predictions = [self.predict(t, k=2) for t in text]
+        return [labels for labels, _ in predictions], [probs for _, probs in predictions]
+
+
+def test_sampling_policy_mean_aggregate(monkeypatch):
+    monkeypatch.setitem(identify_text._models, identify_text.LANGUAGE_MODEL_PATH, WordCountModel())
+    text = "the whale and the sea " * 200 + "der wal und das meer " * 200
+    # The head is English, but half of the document is German.
+    assert identify_text.identify_language(text, sampling=SamplingPolicy("head", max_chars=400))[0] == "en"
+    sampling = SamplingPolicy("windows", max_chars=400, num_windows=5, aggregate="mean")
+    _, score = identify_text.identify_language(text, sampling=sampling)
+    assert 0.5 <= score < 0.7
+    _, score = identify_text.identify_language(text, sampling=SamplingPolicy("head_tail", max_chars=400))
+    assert abs(score - 0.5) < 0.05
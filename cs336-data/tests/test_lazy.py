@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import sys
+
+import cs336_data
+from cs336_data.lazy import lazy_import
+
+
+def test_lazy_import_defers_until_first_use(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    imported = []
+    colorsys = lazy_import("colorsys", on_import=imported.append)
+    assert "colorsys" not in sys.modules
+    assert lazy_import("colorsys") is colorsys
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert [module.__name__ for module in imported] == ["colorsys"]
+    assert "colorsys" in sys.modules
+    # Hooks registered after the import run immediately.
+    lazy_import("colorsys", on_import=imported.append)
+    assert len(imported) == 2
+
+
+def test_package_imports_submodules_on_access():
+    assert cs336_data.bloom.BloomFilter.__module__ == "cs336_data.bloom"
+    assert "threshold_sweep" in dir(cs336_data)
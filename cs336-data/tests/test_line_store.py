@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import hashlib
+
+import numpy as np
+import pytest
+
+from cs336_data.deduplication import exact_deduplication
+from cs336_data.line_store import LineHashStore
+
+
+def test_exact_deduplication_against_earlier_batches(tmp_path):
+    batches = {
+        "batch1": {"a.txt": "header\nalpha\nshared footer\n", "b.txt": "header\nbeta\n"},
+        "batch2": {"c.txt": "gamma\nshared footer\n", "d.txt": "delta\nepsilon\n"},
+        "batch3": {"e.txt": "delta\nzeta\n"},
+    }
+    store_dir = tmp_path / "store"
+    for name, files in batches.items():
+        paths = []
+        for file_name, content in files.items():
+            (tmp_path / file_name).write_text(content)
+            paths.append(tmp_path / file_name)
+        with LineHashStore(store_dir) as store:
+            exact_deduplication(paths, tmp_path / name, store=store, batch_id=name)
+
+    def output(batch, file_name):
+        return (tmp_path / batch / file_name).read_text()
+
+    assert output("batch1", "a.txt") == "alpha\nshared footer\n"
+    assert output("batch1", "b.txt") == "beta\n"
+    assert output("batch2", "c.txt") == "gamma\n"
+    assert output("batch2", "d.txt") == "delta\nepsilon\n"
+    assert output("batch3", "e.txt") == "zeta\n"
+
+    with LineHashStore(store_dir) as store, pytest.raises(ValueError):
+        exact_deduplication([tmp_path / "e.txt"], tmp_path / "again", store=store, batch_id="batch3")
+
+
+def test_line_hash_store_compaction(tmp_path):
+    rng = np.random.default_rng(0)
+    expected = {}
+    with LineHashStore(tmp_path, max_segments=2) as store:
+        for batch in range(10):
+            lines = rng.integers(0, 500, size=200)
+            keys, counts = np.unique([hashlib.md5(str(x).encode()).digest() for x in lines], return_counts=True)
+            store.add(keys.astype("S16"), counts)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                expected[key] = expected.get(key, 0) + count
+
+    store = LineHashStore(tmp_path)
+    assert store.num_segments <= 3
+    assert len(list(tmp_path.glob("segment-*"))) == 2 * store.num_segments
+    queries = list(expected) + [hashlib.md5(b"never added").digest()]
+    assert store.counts(np.array(queries, dtype="S16")).tolist() == [expected.get(q, 0) for q in queries]
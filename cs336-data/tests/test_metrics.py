@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import json
+import logging
+
+from cs336_data import metrics
+
+from .adapters import run_gopher_quality_filter
+
+logger = logging.getLogger(__name__)
+
+
+def test_metrics_disabled_by_default():
+    assert not metrics.enabled()
+    with metrics.timer("noop"):
+        metrics.increment("noop")
+
+
+def test_metrics_json_lines(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics.enable(str(path), interval=3600)
+    try:
+        assert not run_gopher_quality_filter("too short")
+    finally:
+        metrics.disable()
+    snapshot = json.loads(path.read_text().splitlines()[-1])
+    assert snapshot["counters"]["gopher_rejected_word_count"] == 1
+    assert snapshot["histograms"]["gopher_quality_filters_seconds"]["count"] == 1
+
+
+def test_metrics_prometheus(tmp_path):
+    path = tmp_path / "metrics.prom"
+    metrics.enable(str(path), interval=3600)
+    try:
+        metrics.increment("docs", 3)
+        metrics.set_gauge("estimate", 2.5)
+        metrics.set_gauge("estimate", 1.5)
+        metrics.observe("doc_bytes", 5000)
+        with metrics.timer("stage"):
+            pass
+    finally:
+        metrics.disable()
+    text = path.read_text()
+    assert "# TYPE cs336_data_docs_total counter\ncs336_data_docs_total 3" in text
+    assert "# TYPE cs336_data_estimate gauge\ncs336_data_estimate 1.5" in text
+    assert 'cs336_data_doc_bytes_bucket{le="10000.0"} 1' in text
+    assert 'cs336_data_doc_bytes_bucket{le="+Inf"} 1' in text
+    assert "cs336_data_stage_seconds_count 1" in text
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import io
+import json
+import logging
+
+import numpy as np
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+from cs336_data.pipeline import run_pipeline
+
+from .common import FIXTURES_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class ByteTokenizer:
+    """Tokenizes text into its UTF-8 bytes, with 256 as the end-of-text token."""
+
+    n_vocab = 257
+    eot_token = 256
+
+    def encode_ordinary(self, text):
+        return list(text.encode("utf-8"))
+
+
+def write_warc(path, pages):
+    with open(path, "wb") as f:
+        writer = WARCWriter(f, gzip=True)
+        for url, html in pages:
+            http_headers = StatusAndHeaders("200 OK", [("Content-Type", "text/html; charset=utf-8")], protocol="HTTP/1.0")
+            record = writer.create_warc_record(url, "response", payload=io.BytesIO(html), http_headers=http_headers)
+            writer.write_record(record)
+
+
+def test_pipeline_writes_token_shards(tmp_path):
+    moby = (FIXTURES_PATH / "moby.html").read_bytes()
+    paragraph = "<p>" + "This is a perfectly reasonable sentence about whales. " * 20 + "</p>"
+    write_warc(tmp_path / "a.warc.gz", [
+        ("http://example.com/moby", moby),
+        ("http://example.com/short", b"<html><body><p>Too short.</p></body></html>"),
+        ("http://example.com/contact", f"<html><body>{paragraph}<p>Mail me at whale@sea.org</p></body></html>".encode()),
+    ])
+    # An exact duplicate of moby in a second WARC.
+    write_warc(tmp_path / "b.warc.gz", [("http://mirror.example.com/moby", moby)])
+
+    output_dir = tmp_path / "tokens"
+    manifest = run_pipeline(
+        [tmp_path / "a.warc.gz", tmp_path / "b.warc.gz"],
+        output_dir,
+        stages=["gopher", "pii", "line_dedup", "minhash_dedup"],
+        num_workers=2,
+        tokenizer=ByteTokenizer(),
+        dev_fraction=0.0,
+    )
+
+    assert manifest["stats"]["records"] == 4
+    assert manifest["stats"]["dropped_gopher"] == 1
+    assert manifest["stats"]["kept"] == 3
+    assert manifest == json.loads((output_dir / "manifest.json").read_text())
+    assert not (output_dir / "filtered").exists()
+
+    [shard] = manifest["splits"]["train"]
+    tokens = np.memmap(output_dir / shard["path"], dtype=np.uint16, mode="r")
+    assert len(tokens) == shard["tokens"] == manifest["stats"]["train_tokens"]
+    documents = bytes(tokens[tokens != 256].astype(np.uint8)).decode("utf-8")
+    assert (tokens == 256).sum() == shard["documents"]
+    ends = np.fromfile(output_dir / "train-00000.idx", dtype=np.uint64)
+    assert ends.tolist() == [len(tokens)]
+    assert "|||EMAIL_ADDRESS|||" in documents
+    assert "whale@sea.org" not in documents
+    # Line dedup removes every line shared by the two copies of moby, and the remaining
+    # contact page is the only document left.
+    assert shard["documents"] == 1
+    assert "Moby" not in documents
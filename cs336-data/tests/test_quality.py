@@ -1,8 +1,23 @@
 #!/usr/bin/env python3
 import logging
+import os
+import random
+import time
+
+import pytest
+
+from cs336_data.create_quality_datasets import Reservoir, create_quality_dataset
+from cs336_data.identify_text import SamplingPolicy
+from cs336_data.quality_classifier import (
+    autotune_fasttext_model,
+    pareto_front,
+    resolve_model_path,
+    train_fasttext_model,
+)
 
 from .adapters import run_classify_quality, run_gopher_quality_filter
 from .common import FIXTURES_PATH
+from .test_pipeline import write_warc
 
 logger = logging.getLogger(__name__)
 
@@ -93,3 +108,123 @@ def test_gopher_less_than_80_percent_words_with_alphabetic_character():
     words += ["word" for _ in range(2)]
     text = "the and " + " ".join(words)
     assert not run_gopher_quality_filter(text)
+
+
+def test_reservoir_is_bounded_and_uniform():
+    counts = [0] * 10
+    for trial in range(2000):
+        reservoir = Reservoir(3, random.Random(trial))
+        for i in range(10):
+            reservoir.add(i)
+        assert len(reservoir.items) == 3
+        assert reservoir.seen == 10
+        for item in reservoir.items:
+            counts[item] += 1
+    # Every item is kept with probability 3/10.
+    assert all(abs(c / 2000 - 0.3) < 0.05 for c in counts)
+
+
+def test_resolve_quality_model_path(tmp_path):
+    full_path = tmp_path / "quality.bin"
+    quantized_path = tmp_path / "quality.ftz"
+    quantized_path.touch()
+    # Only the quantized model exists, so it is used in place of the .bin.
+    assert resolve_model_path(full_path) == quantized_path
+    full_path.touch()
+    assert resolve_model_path(full_path) == full_path
+    assert resolve_model_path(quantized_path) == quantized_path
+
+
+def test_autotune_pareto_front():
+    results = [
+        {"precision": 0.90, "predictions_per_second": 1000},
+        {"precision": 0.85, "predictions_per_second": 5000},
+        {"precision": 0.80, "predictions_per_second": 4000},
+        {"precision": 0.95, "predictions_per_second": 200},
+    ]
+    front = pareto_front(results)
+    assert [r["precision"] for r in front] == [0.90, 0.85, 0.95]
+
+
+def _write_fixture_dataset(path):
+    # One labeled line per line of the fixtures.
+    with open(path, "w") as f:
+        for name, label in [("high_quality_wiki_reference.txt", "wiki"), ("low_quality_cc.txt", "cc")]:
+            for line in (FIXTURES_PATH / name).read_text().splitlines():
+                if line.strip():
+                    f.write(f"__label__{label} {line.strip()}\n")
+
+
+def _write_tiny_dataset(path):
+    # Two labels with disjoint vocabularies, so a 2-dimensional model separates them.
+    rng = random.Random(0)
+    words = {"a": ["alpha", "beta", "gamma", "delta"], "b": ["one", "two", "three", "four"]}
+    with open(path, "w") as f:
+        for _ in range(40):
+            for label, vocabulary in words.items():
+                f.write(f"__label__{label} {' '.join(rng.choices(vocabulary, k=6))}\n")
+
+
+# A small learning rate and dimension keep training stable; hierarchical softmax
+# and no hash buckets keep each candidate (and its saved model) tiny.
+TINY_SEARCH_SPACE = {"lr": [0.01], "dim": [2], "loss": ["hs"], "wordNgrams": [1], "bucket": [0], "epoch": (1, 5)}
+
+
+def test_autotune_pareto_flags(tmp_path):
+    dataset = tmp_path / "train.txt"
+    _write_tiny_dataset(dataset)
+    results = autotune_fasttext_model(
+        dataset, dataset, tmp_path / "candidates", time_budget=2, num_workers=2, search_space=TINY_SEARCH_SPACE
+    )
+    assert results
+    front = pareto_front(results)
+    assert front and any(r["pareto"] for r in results)
+    for r in results:
+        assert os.path.exists(r["model_path"])
+        assert 1 <= r["config"]["epoch"] <= 5 and r["config"]["dim"] == 2
+        assert 0 <= r["precision"] <= 1 and r["predictions_per_second"] > 0
+        assert r["pareto"] == any(r is f for f in front)
+        # No candidate on the front is dominated by another one.
+        if r["pareto"]:
+            assert not any(
+                o["precision"] >= r["precision"]
+                and o["predictions_per_second"] >= r["predictions_per_second"]
+                and (o["precision"], o["predictions_per_second"]) != (r["precision"], r["predictions_per_second"])
+                for o in results
+            )
+
+
+def test_autotune_stops_at_deadline(tmp_path):
+    dataset = tmp_path / "train.txt"
+    _write_tiny_dataset(dataset)
+    # Each candidate would train for minutes, so all are stopped at the deadline.
+    search_space = {**TINY_SEARCH_SPACE, "epoch": [10**6]}
+    start = time.monotonic()
+    results = autotune_fasttext_model(
+        dataset, dataset, tmp_path / "candidates", time_budget=1, num_workers=2, search_space=search_space
+    )
+    elapsed = time.monotonic() - start
+    assert results == []
+    assert 1 <= elapsed < 5
+
+
+def test_autotune_without_candidates_raises(tmp_path):
+    dataset = tmp_path / "train.txt"
+    _write_fixture_dataset(dataset)
+    # No candidate can start within a zero budget.
+    assert autotune_fasttext_model(dataset, dataset, tmp_path / "candidates", time_budget=0) == []
+    with pytest.raises(RuntimeError, match="No autotune candidate"):
+        train_fasttext_model(dataset, tmp_path / "model.bin", validation_path=dataset, autotune_budget=0)
+
+
+def test_quality_dataset_resume_checks_settings(tmp_path):
+    # Negative examples are not filtered with the models, so they run without them.
+    for name in ("a", "b"):
+        write_warc(tmp_path / f"{name}.warc.gz", [("http://example.com/", b"<html><body><p>Some words here.</p></body></html>")])
+    run = dict(output_file=tmp_path / "out.txt", min_word_count=1, seed=0, checkpoint_dir=tmp_path / "ckpt")
+    create_quality_dataset([], [tmp_path / "a.warc.gz"], **run)
+    create_quality_dataset([], [tmp_path / "a.warc.gz"], **run)
+    with pytest.raises(ValueError):
+        create_quality_dataset([], [tmp_path / "b.warc.gz"], **run)
+    with pytest.raises(ValueError):
+        create_quality_dataset([], [tmp_path / "a.warc.gz"], sampling=SamplingPolicy("head", max_chars=500), **run)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import gzip
+import io
+import logging
+
+import pytest
+
+from cs336_data.readers import FileWriter, open_input, read_files, register_opener
+
+logger = logging.getLogger(__name__)
+
+
+def test_open_input_multi_member_gzip(tmp_path):
+    path = tmp_path / "urls.txt.gz"
+    lines = [f"https://example.com/{i}\n" for i in range(10000)]
+    # Write each half as its own gzip member, like concatenated WARC records.
+    with open(path, "wb") as f:
+        f.write(gzip.compress("".join(lines[:5000]).encode("utf-8")))
+        f.write(gzip.compress("".join(lines[5000:]).encode("utf-8")))
+
+    with open_input(path, "rt", chunk_size=1024) as f:
+        assert list(f) == lines
+    with open_input(path, "rb", chunk_size=1024) as f:
+        assert f.read() == "".join(lines).encode("utf-8")
+
+
+def test_open_input_gzip_ending_at_read_boundary(tmp_path):
+    path = tmp_path / "aligned.gz"
+    chunk_size = 64
+    # Grow the first member until the file is a whole number of reads long, so its
+    # last member ends exactly where a read ends.
+    for n in range(1, 10000):
+        members = [b"a" * (100 * n) + b"b" * n, bytes(range(256)) * 20]
+        data = b"".join(gzip.compress(member) for member in members)
+        if len(data) % chunk_size == 0:
+            break
+    assert len(data) % chunk_size == 0
+    path.write_bytes(data)
+    with open_input(path, "rb", chunk_size=chunk_size) as f:
+        assert f.read() == b"".join(members)
+
+
+def test_open_input_early_close(tmp_path):
+    path = tmp_path / "big.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b"x" * (1 << 22))
+    with open_input(path, "rb", chunk_size=1024) as f:
+        assert f.read(10) == b"x" * 10
+
+
+def test_open_input_truncated_gzip(tmp_path):
+    path = tmp_path / "truncated.gz"
+    data = gzip.compress(b"hello world" * 1000)
+    path.write_bytes(data[: len(data) // 2])
+    with pytest.raises(EOFError):
+        with open_input(path, "rb") as f:
+            f.read()
+
+
+def test_open_input_plain_and_registered(tmp_path):
+    path = tmp_path / "plain.txt"
+    path.write_text("a\nb\n")
+    with open_input(path, "rt") as f:
+        assert f.read() == "a\nb\n"
+
+    register_opener(".upper", lambda p, chunk_size: io.BytesIO(open(p, "rb").read().upper()))
+    path = tmp_path / "shout.upper"
+    path.write_text("quiet\n")
+    with open_input(path, "rt") as f:
+        assert f.read() == "QUIET\n"
+
+
+def test_read_files_prefetches_in_order(tmp_path):
+    paths = []
+    for i in range(50):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_bytes(f"document {i}\r\nsecond line\n".encode())
+        paths.append(path)
+    for io_concurrency in (1, 4):
+        contents = list(read_files(paths, io_concurrency=io_concurrency))
+        assert [path for path, _ in contents] == paths
+        assert contents[7][1] == "document 7\nsecond line\n"
+    assert list(read_files(paths[:1], mode="rb")) == [(paths[0], b"document 0\r\nsecond line\n")]
+
+
+def test_file_writer(tmp_path):
+    with FileWriter(io_concurrency=4, atomic=True) as writer:
+        for i in range(20):
+            writer.write(tmp_path / f"out{i}.txt", f"text {i}")
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(f"out{i}.txt" for i in range(20))
+    assert (tmp_path / "out3.txt").read_text() == "text 3"
+
+    writer = FileWriter(io_concurrency=4)
+    writer.write(tmp_path / "missing" / "out.txt", "text")
+    with pytest.raises(FileNotFoundError):
+        writer.close()
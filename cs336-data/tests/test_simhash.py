@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+from itertools import combinations
+
+import numpy as np
+from xopen import xopen
+
+from cs336_data.benchmark import evaluate_near_duplicates
+from cs336_data.simhash import near_duplicate_pairs, run_simhash_deduplication
+
+from .common import FIXTURES_PATH
+
+
+def test_near_duplicate_pairs_matches_brute_force():
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 2**63, size=50, dtype=np.uint64)
+    # Add copies of each fingerprint with 1 to 6 random bits flipped.
+    flips = [int(b) ^ sum(1 << int(bit) for bit in rng.choice(64, size=rng.integers(1, 7), replace=False)) for b in base]
+    fingerprints = np.unique(np.concatenate([base, np.array(flips, dtype=np.uint64)]))
+    values = fingerprints.tolist()
+    for max_distance in (0, 3, 5):
+        expected = {
+            (i, j) for i, j in combinations(range(len(values)), 2)
+            if (values[i] ^ values[j]).bit_count() <= max_distance
+        }
+        assert near_duplicate_pairs(fingerprints, max_distance) == expected
+    assert len(near_duplicate_pairs(fingerprints, 5)) > 0
+
+
+def test_simhash_deduplication_fuzzy_duplicates(tmp_path):
+    paths = list((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    run_simhash_deduplication(paths, tmp_path)
+    outputs = {path.name for path in tmp_path.glob("*")}
+    # rails_mit_license.txt and react_mit_license.txt are fuzzy duplicates.
+    assert "pytorch_license.txt" in outputs
+    assert len(outputs & {"rails_mit_license.txt", "react_mit_license.txt"}) == 1
+    for name in outputs:
+        with xopen(tmp_path / name) as f, open(FIXTURES_PATH / "documents_with_fuzzy_duplicates" / name) as g:
+            assert f.read() == g.read()
+
+
+def test_evaluate_near_duplicates():
+    [result] = evaluate_near_duplicates(["simhash"], variants_per_document=5, num_distinct=20)
+    assert result["docs"] == 3 + 3 * 5 + 20
+    assert result["precision"] == 1.0
+    assert result["recall"] > 0.5
+    assert result["signature_bytes_per_doc"] == 8
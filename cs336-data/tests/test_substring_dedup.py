@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from cs336_data.corpus import read_corpus
+from cs336_data.substring_dedup import SEPARATOR, substring_deduplicate, suffix_array
+
+
+def _brute_force(documents, min_length):
+    # Remove the bytes of every window (inside one document) seen earlier in the corpus.
+    data = b"".join(document.encode("utf-8") + bytes([SEPARATOR]) for document in documents)
+    removed = np.zeros(len(data), dtype=bool)
+    seen = set()
+    for p in range(len(data) - min_length + 1):
+        window = data[p:p + min_length]
+        if SEPARATOR in window:
+            continue
+        if window in seen:
+            removed[p:p + min_length] = True
+        seen.add(window)
+    kept = bytes(np.frombuffer(data, dtype=np.uint8)[~removed])
+    return [part.decode("utf-8", errors="ignore") for part in kept.split(bytes([SEPARATOR]))[:-1]]
+
+
+def test_suffix_array_matches_sorted_suffixes():
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 3, size=300).astype(np.uint8)
+    raw = data.tobytes()
+    assert suffix_array(data).tolist() == sorted(range(len(raw)), key=lambda p: raw[p:])
+    for prefix_length in (1, 5, 12):
+        assert suffix_array(data, prefix_length).tolist() == sorted(range(len(raw)), key=lambda p: (raw[p:p + prefix_length], p))
+
+
+def test_substring_deduplicate_removes_repeated_spans(tmp_path):
+    rng = np.random.default_rng(0)
+    footer = "Copyright \u00a9 2024 Example Corp. All rights reserved. Contact us at info@example.com."
+    words = ["alpha", "beta", "gamma", "delta", "\u00e9psilon", "zeta"]
+    documents = [
+        " ".join(rng.choice(words, size=rng.integers(5, 40))) + (footer if i % 3 == 0 else "")
+        for i in range(60)
+    ]
+    output_path = tmp_path / "deduplicated.docs"
+    # Small chunks and blocks so documents span chunks and the runs are merged in several passes.
+    stats = substring_deduplicate(documents, output_path, min_length=30, work_dir=tmp_path / "work", chunk_size=500, block_size=37)
+
+    deduplicated = list(read_corpus(output_path))
+    assert deduplicated == _brute_force(documents, 30)
+    assert deduplicated[0].endswith(footer)
+    assert all(footer not in document for document in deduplicated[1:])
+    assert stats["documents"] == len(documents)
+    assert stats["removed_bytes"] > 0
+    assert list((tmp_path / "work").iterdir()) == []
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import itertools
+
+import numpy as np
+
+from cs336_data.annotations import select
+from cs336_data.threshold_sweep import load_sweep_columns, pareto_mask, sweep, sweep_table
+
+
+def _random_annotations(path, rng, size):
+    columns = {
+        "warc_path": np.array("example.warc.gz"),
+        "extracted": rng.random(size) < 0.9,
+        "num_bytes": rng.integers(100, 10000, size),
+        "language": rng.choice(["en", "de"], size),
+        "num_words": rng.integers(0, 400, size),
+        "mean_word_length": rng.uniform(2, 11, size),
+        "ellipsis_line_fraction": rng.uniform(0, 0.4, size),
+        "alpha_word_fraction": rng.uniform(0.7, 1, size),
+    }
+    # Scores on a coarse grid, so that some of them equal the thresholds.
+    for name in ("language_score", "nsfw_score", "toxicity_score", "quality_score"):
+        columns[name] = (rng.integers(0, 21, size) / 20).astype(np.float32)
+    np.savez(path, **columns)
+    return {**columns, "warc_path": str(columns["warc_path"])}
+
+
+def test_sweep_matches_select(tmp_path):
+    rng = np.random.default_rng(0)
+    annotations = [_random_annotations(tmp_path / f"{i}.npz", rng, 500) for i in range(2)]
+    filters = ["langid", "nsfw", "toxicity", "quality"]
+    columns = load_sweep_columns([tmp_path / "0.npz", tmp_path / "1.npz"], filters)
+    grids = {"langid": [0.3, 0.5, 0.8], "nsfw": [0.9, 0.5, 0.7], "toxicity": [0.4, 0.6, 0.75, 0.95], "quality": [0.5, 0.85]}
+    result = sweep(columns, grids, bytes_per_token=1.0)
+    assert result["documents"].shape == (3, 3, 4, 2)
+    # Grids are ordered from least to most strict.
+    assert result["grids"][1].tolist() == [0.9, 0.7, 0.5]
+
+    for index in itertools.product(*(range(len(grid)) for grid in result["grids"])):
+        config = {
+            "language": "en",
+            "language_threshold": result["grids"][0][index[0]],
+            "nsfw_threshold": result["grids"][1][index[1]],
+            "toxicity_threshold": result["grids"][2][index[2]],
+            "quality_threshold": result["grids"][3][index[3]],
+        }
+        keeps = [select(a, ["gopher", *filters], config)[0] for a in annotations]
+        assert result["documents"][index] == sum(int(keep.sum()) for keep in keeps)
+        assert result["tokens"][index] == sum(int(a["num_bytes"][keep].sum()) for a, keep in zip(annotations, keeps))
+
+
+def test_pareto_mask():
+    tokens = np.array([[10, 8, 8], [7, 7, 3], [7, 2, 0]])
+    assert pareto_mask(tokens).tolist() == [
+        [True, False, True],
+        [False, True, True],
+        [True, True, True],
+    ]
+    result = {"filters": ["nsfw"], "grids": [np.array([0.9, 0.7])], "documents": np.array([3, 3]), "tokens": np.array([30, 30])}
+    assert sweep_table(result, pareto_only=True) == [{"nsfw_threshold": 0.7, "documents": 3, "tokens": 30, "pareto": True}]
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from cs336_data.tokenization import tokenize_to_shards
+
+from .test_pipeline import ByteTokenizer
+
+
+def read_documents(output_dir, shards):
+    documents = []
+    for shard in shards:
+        tokens = np.memmap(output_dir / shard["path"], dtype=np.uint16, mode="r")
+        ends = np.fromfile(output_dir / shard["path"].replace(".bin", ".idx"), dtype=np.uint64)
+        assert len(tokens) == shard["tokens"] == ends[-1]
+        assert len(ends) == shard["documents"]
+        starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+        for start, end in zip(starts, ends.astype(np.int64)):
+            assert tokens[end - 1] == ByteTokenizer.eot_token
+            documents.append(bytes(tokens[start:end - 1].astype(np.uint8)).decode("utf-8"))
+    return documents
+
+
+def test_tokenize_to_shards_with_index(tmp_path):
+    texts = [f"document {i} " + "é" * (i % 7) * 10 for i in range(500)]
+    shards = tokenize_to_shards(
+        iter(texts), tmp_path, prefix="train", tokenizer=ByteTokenizer(), num_workers=2, shard_tokens=1000, batch_size=16
+    )
+    assert len(shards) > 1
+    assert all(shard["tokens"] <= 1000 for shard in shards)
+    assert sum(shard["documents"] for shard in shards) == len(texts)
+    # Order is preserved across workers, and no document is split between shards.
+    assert read_documents(tmp_path, shards) == texts
+
+
+def test_tokenize_document_larger_than_shard(tmp_path):
+    texts = ["short", "x" * 5000, "also short"]
+    shards = tokenize_to_shards(texts, tmp_path, tokenizer=ByteTokenizer(), num_workers=1, shard_tokens=100)
+    assert [shard["documents"] for shard in shards] == [1, 1, 1]
+    assert read_documents(tmp_path, shards) == texts
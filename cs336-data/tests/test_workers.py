@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import gc
+import logging
+import multiprocessing
+
+import pytest
+
+from cs336_data import workers
+from cs336_data.quality_classifier import gopher_quality_filters
+from cs336_data.workers import FilterPool, memory_usage
+
+logger = logging.getLogger(__name__)
+
+
+def test_memory_usage():
+    usage = memory_usage()
+    assert usage["max_rss"] > 0
+    if "rss" in usage:
+        assert usage["rss"] >= usage["private"]
+
+
+def test_filter_pool_map_and_memory_report():
+    texts = ["This is a perfectly normal sentence with words. " * 20, "no"] * 10
+    with FilterPool(num_workers=2, missing_ok=True) as pool:
+        assert pool.map(gopher_quality_filters, texts) == [gopher_quality_filters(t) for t in texts]
+        report = pool.memory_report()
+    assert len(report["workers"]) == 2
+    assert len({w["pid"] for w in report["workers"]}) == 2
+
+
+def test_filter_pool_unfreezes_gc_on_failed_start(monkeypatch):
+    class FailingContext:
+        Barrier = multiprocessing.get_context("fork").Barrier
+
+        def Pool(self, *args, **kwargs):
+            raise OSError("cannot fork")
+
+    monkeypatch.setattr(workers.multiprocessing, "get_context", lambda method: FailingContext())
+    assert gc.get_freeze_count() == 0
+    with pytest.raises(OSError):
+        FilterPool(2, share_models=False)
+    assert gc.get_freeze_count() == 0